@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+Micro-benchmarks of the ``SafeDeleteQueryset`` hot paths compared to a plain Django ``QuerySet``.
+
+Nothing is sent to the database, only the Python overhead is measured.
+
+    python benchmarks/queryset.py [number]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# name -> statement run against a queryset named `qs`
+BENCHMARKS = [
+    ('attribute access (qs.model)', 'qs.model'),
+    ('attribute access (qs.query)', 'qs.query'),
+    ('method lookup (qs.filter)', 'qs.filter'),
+    ('clone (qs._clone())', 'qs._clone()'),
+    ('chain (qs.filter().exclude())', 'qs.filter(name="a").exclude(pk=1)'),
+]
+
+
+def run(number):
+    from django.db.models import QuerySet
+    from safedelete.tests.models import Category
+
+    querysets = [
+        ('QuerySet', QuerySet(Category)),
+        ('SafeDeleteQueryset', Category.objects.all()),
+    ]
+    print('{:<32} {:>20} {:>20} {:>8}'.format('', *[name for name, _ in querysets] + ['ratio']))
+    for name, statement in BENCHMARKS:
+        timings = [
+            min(timeit.repeat(statement, globals={'qs': qs}, number=number, repeat=5)) / number * 1e9
+            for _, qs in querysets
+        ]
+        print('{:<32} {:>17.0f} ns {:>17.0f} ns {:>8.2f}'.format(name, timings[0], timings[1], timings[1] / timings[0]))
+
+
+if __name__ == '__main__':
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'safedelete.tests.settings'
+    django.setup()
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Benchmarks of the tombstone encodings (see ``safedelete.tombstones``) on SQLite: size of the index of the ``deleted``
+field and latency of the lookups of the objects that are not deleted.
+
+The tables are filled with `rows` objects, 80% of them deleted.
+
+    python benchmarks/tombstones.py [rows] [number]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DELETED_RATIO = 0.8
+
+
+def get_models():
+    from django.db import models
+    from safedelete.models import SafeDeleteModel
+    from safedelete.tombstones import BooleanTombstone, EpochTombstone, NullTombstone, SentinelTombstone
+
+    result = []
+    for tombstone in (SentinelTombstone(), NullTombstone(), BooleanTombstone(), EpochTombstone()):
+        name = 'Benchmark{}'.format(tombstone.__class__.__name__)
+        attrs = {
+            '__module__': __name__,
+            'Meta': type('Meta', (), {'app_label': 'safedelete'}),
+            'deleted': tombstone.field(),
+            'owner': models.IntegerField(),
+        }
+        result.append((tombstone, type(str(name), (SafeDeleteModel,), attrs)))
+    return result
+
+
+def get_index_size(connection, model):
+    """
+    Return the size in bytes of the indexes of `model` on the ``deleted`` field, from the ``dbstat`` table.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT SUM(pgsize) FROM dbstat WHERE name IN ("
+            "    SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND sql LIKE %s"
+            ")",
+            [model._meta.db_table, '%"deleted"%'],
+        )
+        return cursor.fetchone()[0] or 0
+
+
+def fill(model, tombstone, rows):
+    from django.utils import timezone
+
+    deleted = tombstone.deleted_value(timezone.now())
+    model.all_objects.bulk_create([
+        model(owner=i % 100, deleted=deleted if i < rows * DELETED_RATIO else tombstone.live_value)
+        for i in range(rows)
+    ], batch_size=500)
+
+
+def run(rows, number):
+    from django.db import connection
+
+    print('{:<20} {:>12} {:>18} {:>18}'.format('', 'index size', 'count live', 'filter live'))
+    for tombstone, model in get_models():
+        with connection.schema_editor() as editor:
+            editor.create_model(model)
+        fill(model, tombstone, rows)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        statements = [
+            lambda: model.objects.count(),
+            lambda: list(model.objects.filter(owner=42).values_list('pk', flat=True)),
+        ]
+        timings = [min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e6 for statement in statements]
+        print('{:<20} {:>9.0f} kB {:>15.0f} us {:>15.0f} us'.format(
+            tombstone.__class__.__name__, get_index_size(connection, model) / 1024.0, *timings))
+
+
+if __name__ == '__main__':
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'safedelete.tests.settings'
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = ':memory:'
+    django.setup()
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000, int(sys.argv[2]) if len(sys.argv) > 2 else 100)
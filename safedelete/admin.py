@@ -1,7 +1,5 @@
 from __future__ import unicode_literals
 
-import django
-from distutils.version import LooseVersion
 from django.contrib import admin, messages
 from django.contrib.admin import helpers
 from django.contrib.admin.models import CHANGE, LogEntry
@@ -14,7 +12,9 @@ from django.utils.html import conditional_escape, format_html
 from django.utils.six import text_type
 from django.utils.translation import ugettext_lazy as _
 
-from .utils import get_objects_to_delete
+from .compat import MESSAGE_USER_TAKES_LEVEL, TEMPLATE_RESPONSE_TAKES_CURRENT_APP
+from .tombstones import get_tombstone
+from .utils import get_objects_to_delete, is_deleted
 
 
 def highlight_deleted(obj):
@@ -22,7 +22,7 @@ def highlight_deleted(obj):
         Display in red lines when object is deleted.
     """
     obj_str = conditional_escape(text_type(obj))
-    if not getattr(obj, 'deleted', False):
+    if not is_deleted(obj):
         return obj_str
     else:
         return format_html('<span class="deleted">{0}</span>', obj_str)
@@ -93,7 +93,7 @@ class SafeDeleteAdmin(admin.ModelAdmin):
         assert hasattr(queryset, 'undelete')
 
         # Remove not deleted item from queryset
-        queryset = queryset.filter(deleted__isnull=False)
+        queryset = queryset.filter(get_tombstone(queryset.model).deleted_q())
         # Undeletion confirmed
         if request.POST.get('post'):
             n = queryset.count()
@@ -102,12 +102,13 @@ class SafeDeleteAdmin(admin.ModelAdmin):
                     obj_display = force_text(obj)
                     self.log_undeletion(request, obj, obj_display)
                 queryset.undelete()
-                if django.VERSION[1] <= 4:
+                if MESSAGE_USER_TAKES_LEVEL:
                     self.message_user(
                         request,
                         _("Successfully undeleted %(count)d %(items)s.") % {
                             "count": n, "items": model_ngettext(self.opts, n)
                         },
+                        messages.SUCCESS,
                     )
                 else:
                     self.message_user(
@@ -115,7 +116,6 @@ class SafeDeleteAdmin(admin.ModelAdmin):
                         _("Successfully undeleted %(count)d %(items)s.") % {
                             "count": n, "items": model_ngettext(self.opts, n)
                         },
-                        messages.SUCCESS,
                     )
                 # Return None to display the change list page again.
                 return None
@@ -144,7 +144,7 @@ class SafeDeleteAdmin(admin.ModelAdmin):
             'related_list': related_list
         }
 
-        if LooseVersion(django.get_version()) < LooseVersion('1.10'):
+        if TEMPLATE_RESPONSE_TAKES_CURRENT_APP:
             return TemplateResponse(
                 request,
                 self.undelete_selected_confirmation_template,
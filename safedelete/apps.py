@@ -7,4 +7,15 @@ class SafeDeleteConfig(AppConfig):
     verbose_name = 'Safe Delete'
 
     def ready(self):
-        pass
+        from django.apps import apps
+
+        from .collector import get_cascade_plan
+        from .registry import get_safedelete_models, register_model
+
+        # The models are registered when they are prepared, this catches the ones that could have been prepared
+        # before the registry was imported.
+        for model in apps.get_models():
+            register_model(model)
+        # Build the cascade plans now rather than during the first deletes
+        for model in get_safedelete_models():
+            get_cascade_plan(model)
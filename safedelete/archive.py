@@ -0,0 +1,336 @@
+"""
+Archive tables: the deleted objects of a model are moved to another table instead of staying in its table.
+
+>>> class Article(SafeDeleteModel):
+...     _safedelete_archive = True
+
+The model gets an archive model (``ArticleArchive``) with the same fields, stored in the ``<table>_archive`` table
+which is created by the migrations like the tables of the other models. When an object is soft deleted, its row is
+copied to the archive table and deleted from the table of the model in the same transaction, and undeleting it moves
+it back. The table of the model only contains the objects that are not deleted, so:
+
+- ``objects`` does not filter on the ``deleted`` field at all;
+- ``deleted_objects`` reads the archive table;
+- ``all_objects`` reads both tables with a ``UNION ALL``. Like for any union, the ordering can only use the selected
+  columns.
+
+The querysets reading the archive table cannot be updated (the objects have to be undeleted first). The joins of a
+query still read the tables of the related models, so they do not find the archived objects they point to.
+
+The archive table can be in another database by setting ``_safedelete_archive`` to its alias: the rows are then
+moved through Python, the transactions of the two databases are nested but not atomic together, and ``all_objects``
+cannot be used. ``deleted_objects`` cannot follow the relations in that case.
+
+As the rows leave the table of the model, the foreign keys pointing to an archived model must not be checked by the
+database (``db_constraint=False``) unless the objects referencing it are archived with it (from an archived model
+with ``on_delete=CASCADE`` when the archived model has the ``SOFT_DELETE_CASCADE`` policy) or are updated when it is
+deleted (``SET_NULL``, ``SET_DEFAULT``, ``SET()``). This is verified by the ``safedelete.E001`` check.
+
+The archive models do not support the multi-table inheritance.
+"""
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, models, transaction
+from django.db.models.deletion import CASCADE, DO_NOTHING, PROTECT
+from django.db.models.sql.datastructures import BaseTable
+
+from .collector import get_cascade_plan
+from .config import SOFT_DELETE_CASCADE
+from .dispatch import send_post_softdelete, send_post_undelete
+from .signals import pre_bulk_softdelete
+from .tombstones import get_tombstone
+
+ARCHIVE_TABLE_SUFFIX = '_archive'
+
+_archive_models = {}  # {model: archive model}
+
+
+def is_archived(model):
+    """
+    Return whether the deleted objects of `model` are moved to its archive table.
+    """
+    return bool(getattr(model, '_safedelete_archive', False))
+
+
+def get_archive_using(model, using):
+    """
+    Return the alias of the database of the archive table of `model` when the model is on `using`.
+    """
+    archive = getattr(model, '_safedelete_archive', False)
+    return archive if isinstance(archive, str) else using
+
+
+def get_archive_model(model):
+    """
+    Return the archive model of `model`.
+    """
+    return _archive_models[model]
+
+
+def _get_archive_field(field):
+    """
+    Return the field of the archive model matching `field`: the relations are not checked by the database and have no
+    reverse accessor, and nothing is unique but the primary key (the values can be reused by the objects that are not
+    deleted).
+    """
+    name, path, args, kwargs = field.deconstruct()
+    field_class = field.__class__
+    if isinstance(field, models.AutoField):
+        # The primary keys are copied, they are not generated
+        field_class = models.BigIntegerField if isinstance(field, models.BigAutoField) else models.IntegerField
+    elif isinstance(field, models.OneToOneField):
+        field_class = models.ForeignKey
+        kwargs.pop('parent_link', None)
+    if field.is_relation:
+        kwargs.update(related_name='+', db_constraint=False, on_delete=DO_NOTHING)
+    if not field.primary_key:
+        kwargs['unique'] = False
+    return field_class(*args, **kwargs)
+
+
+def create_archive_model(model):
+    """
+    Create the archive model of `model` (in the same application).
+    """
+    if model._meta.parents:
+        raise ImproperlyConfigured(
+            "{} cannot be archived, the archive tables do not support the multi-table inheritance.".format(
+                model._meta.label))
+    attrs = {
+        '__module__': model.__module__,
+        'Meta': type('Meta', (), {
+            'app_label': model._meta.app_label,
+            'apps': model._meta.apps,
+            'db_table': model._meta.db_table + ARCHIVE_TABLE_SUFFIX,
+            'managed': model._meta.managed,
+            'default_permissions': (),
+        }),
+    }
+    for field in model._meta.concrete_fields:
+        attrs[field.name] = _get_archive_field(field)
+    archive_model = type(str(model.__name__ + 'Archive'), (models.Model,), attrs)
+    archive_model.archived_model = model
+    _archive_models[model] = archive_model
+    return archive_model
+
+
+class ArchiveTable(BaseTable):
+    """
+    The base table of a query reading the archive table with the alias of the table of the model, so the rest of the
+    query (the columns, the conditions and the joins) is unchanged.
+    """
+
+    def __init__(self, table_name, alias, archive_table_name):
+        super(ArchiveTable, self).__init__(table_name, alias)
+        self.archive_table_name = archive_table_name
+
+    def as_sql(self, compiler, connection):
+        return '{} {}'.format(
+            connection.ops.quote_name(self.archive_table_name), connection.ops.quote_name(self.table_alias)
+        ), []
+
+    def relabeled_clone(self, change_map):
+        return self.__class__(
+            self.table_name, change_map.get(self.table_alias, self.table_alias), self.archive_table_name
+        )
+
+
+def read_archive(query):
+    """
+    Make `query` (a query of an archived model) read the archive table instead of the table of the model.
+    """
+    alias = query.get_initial_alias()
+    base_table = query.alias_map[alias]
+    query.alias_map[alias] = ArchiveTable(
+        base_table.table_name, alias, get_archive_model(query.model)._meta.db_table
+    )
+
+
+def union_with_archive(query):
+    """
+    Return a query reading the rows of `query` (a query of an archived model) in both the table of the model and its
+    archive table.
+    """
+    live_query = query.clone()
+    archive_query = query.clone()
+    read_archive(archive_query)
+    for combined_query in (live_query, archive_query):
+        combined_query.clear_ordering(True)
+        combined_query.clear_limits()
+    union_query = query.clone()
+    union_query.combined_queries = (live_query, archive_query)
+    union_query.combinator = 'union'
+    union_query.combinator_all = True
+    return union_query
+
+
+def _get_copied_fields(model, excluded_field_names):
+    return [field for field in model._meta.concrete_fields if field.name not in excluded_field_names]
+
+
+def _move_rows(model, from_model, to_model, pks, values, using, to_using):
+    """
+    Copy the rows of `from_model` with the primary keys `pks` to the table of `to_model` with the fields in `values`
+    changed, and delete them from the table of `from_model`.
+
+    Return the number of moved rows.
+    """
+    from_queryset = from_model._base_manager.using(using).filter(pk__in=pks)
+    copied_fields = _get_copied_fields(model, values)
+    changed_fields = [model._meta.get_field(name) for name in values]
+    if to_using == using:
+        connection = connections[using]
+        qn = connection.ops.quote_name
+        sql, params = from_queryset.order_by().values_list(
+            *[field.attname for field in copied_fields]).query.sql_with_params()
+        columns = [field.column for field in copied_fields + changed_fields]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {} ({}) SELECT {}{} FROM ({}) sub'.format(
+                    qn(to_model._meta.db_table),
+                    ', '.join(qn(column) for column in columns),
+                    ', '.join('sub.' + qn(field.column) for field in copied_fields),
+                    ''.join(', %s' for _ in changed_fields),
+                    sql,
+                ),
+                # The changed values come first in the statement
+                [field.get_db_prep_save(values[field.name], connection) for field in changed_fields] + list(params),
+            )
+            nb_objects = cursor.rowcount
+    else:
+        # The rows go through Python
+        objs = []
+        for row in from_queryset.values_list(*[field.attname for field in copied_fields]):
+            obj = to_model(**dict(zip([field.attname for field in copied_fields], row)))
+            for name, value in values.items():
+                setattr(obj, name, value)
+            objs.append(obj)
+        to_model._base_manager.using(to_using).bulk_create(objs)
+        nb_objects = len(objs)
+    from_queryset._raw_delete(using)
+    return nb_objects
+
+
+def archive_rows(model, pks, deleted, using):
+    """
+    Move the objects of `model` with the primary keys `pks` to its archive table, as deleted at `deleted`, without
+    sending any signal.
+
+    Return the number of moved objects.
+    """
+    if len(pks) == 0:
+        return 0
+    archive_using = get_archive_using(model, using)
+    with transaction.atomic(using=using), transaction.atomic(using=archive_using):
+        return _move_rows(model, model, get_archive_model(model), pks, get_tombstone(model).delete_kwargs(deleted),
+                          using, archive_using)
+
+
+def archive_objects(model, pks, deleted, using):
+    """
+    Move the objects of `model` with the primary keys `pks` to its archive table, as deleted at `deleted`, and send
+    the ``pre_bulk_softdelete`` and ``post_bulk_softdelete`` signals.
+
+    Return the same value as a delete.
+    """
+    if len(pks) == 0:
+        return (0, {})
+    pre_bulk_softdelete.send(sender=model, queryset=model._base_manager.using(using).filter(pk__in=pks), using=using)
+    nb_objects = archive_rows(model, pks, deleted, using)
+    send_post_softdelete(model, using, pks=list(pks))
+    if nb_objects == 0:
+        return (0, {})
+    return (nb_objects, {model._meta.label: nb_objects})
+
+
+def restore_objects(model, pks, using):
+    """
+    Move the objects of `model` with the primary keys `pks` from its archive table back to its table and send the
+    ``post_bulk_undelete`` signal.
+
+    Return the same value as a delete.
+    """
+    if len(pks) == 0:
+        return (0, {})
+    archive_using = get_archive_using(model, using)
+    with transaction.atomic(using=using), transaction.atomic(using=archive_using):
+        nb_objects = _move_rows(model, get_archive_model(model), model, pks, get_tombstone(model).undelete_kwargs(),
+                                archive_using, using)
+    send_post_undelete(model, using, pks=list(pks))
+    if nb_objects == 0:
+        return (0, {})
+    return (nb_objects, {model._meta.label: nb_objects})
+
+
+def get_archived_pks(model, using, *args, **kwargs):
+    """
+    Return the primary keys of the archived objects of `model` matching the filters in `args` and `kwargs`.
+    """
+    archive_model = get_archive_model(model)
+    return list(archive_model._base_manager.using(get_archive_using(model, using)).filter(
+        *args, **kwargs).values_list('pk', flat=True))
+
+
+def undelete_archived_related(model, pks, using):
+    """
+    Undelete the archived objects related by cascade to the objects of `model` with the primary keys `pks`, and the
+    objects related to them (which may not be archived).
+
+    Return the same value as a delete.
+    """
+    from .utils import concatenate_delete_returns
+
+    undelete_returns = []
+    for edge in get_cascade_plan(model).cascade_edges:
+        if not edge.is_safedelete or not is_archived(edge.model):
+            continue
+        related_pks = get_archived_pks(edge.model, using, **{edge.field.attname + '__in': pks})
+        undelete_returns.append(restore_related(edge.model, related_pks, using))
+    return concatenate_delete_returns(*undelete_returns)
+
+
+def restore_related(model, pks, using, force_policy=None):
+    """
+    Restore the archived objects of `model` with the primary keys `pks` and, with the ``SOFT_DELETE_CASCADE``
+    policy, the objects related to them. It is called inside an undelete on `using`, whose atomic block the undeletes
+    of these objects join.
+
+    Return the same value as a delete.
+    """
+    from .utils import concatenate_delete_returns
+
+    undelete_returns = [restore_objects(model, pks, using)]
+    if model._get_safelete_policy(force_policy=force_policy) == SOFT_DELETE_CASCADE:
+        undelete_returns.append(undelete_archived_related(model, pks, using))
+        for edge in get_cascade_plan(model).cascade_edges:
+            if edge.is_safedelete and not is_archived(edge.model):
+                undelete_returns.append(
+                    edge.model.deleted_objects.filter(**{edge.field.attname + '__in': pks}).undelete(_nested=True)
+                )
+    return concatenate_delete_returns(*undelete_returns)
+
+
+@checks.register(checks.Tags.models)
+def check_archive_relations(app_configs=None, **kwargs):
+    """
+    Check that the rows of the archived models can leave their table (see the module documentation).
+    """
+    errors = []
+    for model in list(_archive_models):
+        if app_configs is not None and model._meta.app_config not in app_configs:
+            continue
+        for edge in get_cascade_plan(model).edges:
+            if not edge.field.db_constraint or edge.on_delete not in (CASCADE, PROTECT):
+                continue
+            archived_with_it = model._safedelete_policy == SOFT_DELETE_CASCADE and is_archived(edge.model)
+            if edge.on_delete == CASCADE and archived_with_it:
+                continue
+            errors.append(checks.Error(
+                "The deleted objects of {} are archived but {}.{} references them with a database constraint.".format(
+                    model._meta.label, edge.model._meta.label, edge.field.name),
+                hint="Set db_constraint=False on the field, or archive {} with the SOFT_DELETE_CASCADE policy "
+                     "on {}.".format(edge.model._meta.label, model._meta.label),
+                obj=edge.field,
+                id='safedelete.E001',
+            ))
+    return errors
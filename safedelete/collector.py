@@ -1,8 +1,55 @@
+from collections import namedtuple
+
 from django.db import router
-from django.db.models.deletion import Collector
+from django.db.models.deletion import CASCADE, DO_NOTHING, PROTECT, Collector, get_candidate_relations_to_delete
+from django.db.models.signals import class_prepared
+from django.utils.functional import cached_property
+
+from .registry import is_safedelete_cls
+from .tombstones import get_tombstone
+
+
+class SafeDeleteCollector(Collector):
+    """
+    Collector that does not load what a soft delete does not need.
 
+    - If `skip_deleted` is set, the soft-deleted objects are filtered out in SQL instead of being loaded and filtered
+      out afterwards. This is only done when it does not change what is collected next: when the relation does not
+      cascade, or when it does but nothing is related to the related model (to keep cascading through the objects
+      that were soft-deleted without cascade).
+    - If `only_keys` is set, the related objects are loaded with their primary key, foreign keys and `deleted` field
+      only (see :func:`get_key_fields`).
+    """
+
+    def __init__(self, using, skip_deleted=False, only_keys=False):
+        super(SafeDeleteCollector, self).__init__(using)
+        self.skip_deleted = skip_deleted
+        self.only_keys = only_keys
+
+    def related_objects(self, related, objs):
+        related_objects_qs = super(SafeDeleteCollector, self).related_objects(related, objs)
+        model = related.related_model
+        if self.skip_deleted and is_safedelete_cls(model) and (
+                related.field.remote_field.on_delete != CASCADE or not get_cascade_plan(model).needs_collector):
+            related_objects_qs = related_objects_qs.filter(get_tombstone(model).live_q())
+        if self.only_keys:
+            related_objects_qs = related_objects_qs.only(*get_key_fields(model))
+        return related_objects_qs
 
-def get_collector(objs):
+
+def get_key_fields(model):
+    """
+    Return the names of the fields of `model` needed to follow its relations: its primary key, its foreign keys and
+    its `deleted` field if it is a safedelete model.
+    """
+    key_fields = [model._meta.pk.name]
+    key_fields.extend(field.name for field in model._meta.concrete_fields if field.is_relation)
+    if is_safedelete_cls(model):
+        key_fields.extend(get_tombstone(model).field_names)
+    return key_fields
+
+
+def get_collector(objs, skip_deleted=False, only_keys=False):
     """
     Create a collector for the given objects.
     The collector contains all the objects related to the objects given as input that would need to be modified if we
@@ -15,9 +62,114 @@ def get_collector(objs):
     Note that by doing that it does not call the model delete/save methods.
 
     Note that `collector.data` also contains the object itself.
+
+    See :class:`SafeDeleteCollector` for `skip_deleted` and `only_keys`.
     """
     # Assume we have at least one object (which is fine since we control where this method is called)
-    collector = Collector(using=router.db_for_write(objs[0]))
+    collector = SafeDeleteCollector(using=router.db_for_write(objs[0]), skip_deleted=skip_deleted,
+                                    only_keys=only_keys)
     collector.collect(objs)
     collector.sort()
     return collector
+
+
+# A relation to follow when objects of a model are deleted:
+#  - related: the relation object (from `model._meta.related_objects`)
+#  - field: the field of the related model pointing at the deleted model
+#  - model: the related model
+#  - on_delete: the `on_delete` handler of the field (CASCADE, PROTECT, SET_NULL, ...)
+#  - is_safedelete: whether the related model is a safedelete model
+CascadeEdge = namedtuple('CascadeEdge', ['related', 'field', 'model', 'on_delete', 'is_safedelete'])
+
+
+class CascadePlan(object):
+    """
+    What happens to the related objects when objects of `model` are deleted.
+    This is what Django's `Collector` rediscovers from the model metadata each time it collects objects.
+
+    :attribute edges: the relations of the model that are not ``DO_NOTHING`` (see :data:`CascadeEdge`), the cascades
+        first, then the protected relations and then the ones that update the related objects.
+    :attribute cascade_models: the models reached by cascade from the model (including itself), each one before the
+        models it cascades to (unless there is a loop in the relations).
+    :attribute needs_collector: whether a `Collector` would find anything to delete or update for the model.
+    :attribute has_implicit_relations: whether the `Collector` also follows relations of the model that are not
+        edges: the parents of multi-table inheritance and the generic relations.
+    :attribute has_cascade: whether deleting the model cascades to other models.
+    :attribute has_field_updates: whether deleting the model (or the models it cascades to) updates related objects
+        (for example in case of a relation `on_delete=models.SET_NULL`).
+    """
+
+    def __init__(self, model):
+        self.model = model
+        edges = []
+        for related in get_candidate_relations_to_delete(model._meta):
+            on_delete = related.field.remote_field.on_delete
+            if on_delete == DO_NOTHING:
+                continue
+            edges.append(CascadeEdge(
+                related=related,
+                field=related.field,
+                model=related.related_model,
+                on_delete=on_delete,
+                is_safedelete=is_safedelete_cls(related.related_model),
+            ))
+        edges.sort(key=lambda edge: 0 if edge.on_delete == CASCADE else 1 if edge.on_delete == PROTECT else 2)
+        self.edges = edges
+        self.has_cascade = any(edge.on_delete == CASCADE for edge in edges)
+        # The collector also collects the parents of multi-table inheritance and the generic relations
+        self.has_implicit_relations = bool(model._meta.parents) or any(
+            hasattr(field, 'bulk_related_objects') for field in model._meta.private_fields
+        )
+        self.needs_collector = bool(edges) or self.has_implicit_relations
+
+    @property
+    def cascade_edges(self):
+        return [edge for edge in self.edges if edge.on_delete == CASCADE]
+
+    @cached_property
+    def cascade_models(self):
+        # Depth-first, each model is added once the models it cascades to are (the edges closing a loop are not
+        # followed), the reverse order is topological
+        cascade_models = []
+
+        def visit(model):
+            visited.add(model)
+            for edge in get_cascade_plan(model).cascade_edges:
+                if edge.model not in visited:
+                    visit(edge.model)
+            cascade_models.append(model)
+
+        visited = set()
+        visit(self.model)
+        return cascade_models[::-1]
+
+    @cached_property
+    def has_field_updates(self):
+        return any(
+            edge.on_delete not in (CASCADE, PROTECT)
+            for model in self.cascade_models
+            for edge in get_cascade_plan(model).edges
+        )
+
+
+_plans = {}  # {model: CascadePlan}
+
+
+def get_cascade_plan(model):
+    """
+    Return the :class:`CascadePlan` of `model`.
+    Plans are built once (in :py:meth:`safedelete.apps.SafeDeleteConfig.ready` for the safedelete models) and rebuilt
+    if a new model is prepared since it could add relations to the existing ones.
+    """
+    try:
+        return _plans[model]
+    except KeyError:
+        plan = _plans[model] = CascadePlan(model)
+        return plan
+
+
+def _clear_cascade_plans(sender, **kwargs):
+    _plans.clear()
+
+
+class_prepared.connect(_clear_cascade_plans)
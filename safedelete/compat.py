@@ -0,0 +1,22 @@
+"""
+Compatibility between the supported Django versions.
+
+Everything is resolved once when the module is imported so the hot paths (like ``SafeDeleteQueryset._clone``) only
+have to test a boolean.
+"""
+import django
+
+# QuerySet._clone() takes a ``klass`` argument before Django 1.9
+CLONE_TAKES_KLASS = django.VERSION < (1, 9)
+
+# TemplateResponse takes a ``current_app`` argument before Django 1.10
+TEMPLATE_RESPONSE_TAKES_CURRENT_APP = django.VERSION < (1, 10)
+
+# ModelAdmin.message_user() takes a ``level`` argument since Django 1.5
+MESSAGE_USER_TAKES_LEVEL = django.VERSION >= (1, 5)
+
+# Index and UniqueConstraint take a ``condition`` (partial indexes) since Django 2.2
+INDEX_TAKES_CONDITION = django.VERSION >= (2, 2)
+
+# Query.chain() returns a copy of a query as another query class since Django 2.0, it was Query.clone(klass)
+QUERY_HAS_CHAIN = django.VERSION >= (2, 0)
@@ -0,0 +1,144 @@
+"""
+Deferred dispatch of the signals sent after the soft deletes and the undeletes.
+
+By default the ``post_softdelete``, ``post_undelete``, ``post_bulk_softdelete`` and ``post_bulk_undelete`` signals are
+sent as soon as the objects are changed, inside the transaction of the delete: slow receivers hold the locks of the
+cascade longer, and they are called even if the transaction is rolled back afterwards. With::
+
+    SAFE_DELETE_DEFERRED_SIGNALS = True
+
+in the settings, the objects soft deleted and undeleted by a delete or an undelete (including its cascade) are
+collected per model and sent when the transaction commits (``transaction.on_commit``), with one
+``post_bulk_softdelete`` and one ``post_bulk_undelete`` per model. In this mode ``post_softdelete`` and
+``post_undelete`` are not sent: the objects deleted or undeleted one by one are in the bulk signals of their model.
+Nothing is sent if the transaction (or the savepoint of the delete) is rolled back. The ``pre_*`` signals are still
+sent synchronously.
+
+With ``SAFE_DELETE_SIGNAL_WORKERS`` set to a number of threads, the signals are sent from a pool of that many
+threads instead of the thread that commits (the receivers then use their own database connections, which are closed
+once the signals are sent, and their exceptions are logged).
+"""
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+
+from .signals import post_bulk_softdelete, post_bulk_undelete, post_softdelete, post_undelete
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def is_deferred():
+    """
+    Return whether the signals sent after the soft deletes and the undeletes are deferred to the commit.
+    """
+    return getattr(settings, 'SAFE_DELETE_DEFERRED_SIGNALS', False)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            try:
+                from concurrent.futures import ThreadPoolExecutor
+            except ImportError:
+                raise ImproperlyConfigured("SAFE_DELETE_SIGNAL_WORKERS requires the futures package on Python 2.")
+            _executor = ThreadPoolExecutor(max_workers=settings.SAFE_DELETE_SIGNAL_WORKERS)
+        return _executor
+
+
+def _send_all(pending, using, robust=False):
+    for (signal, model), pks in pending.items():
+        if robust:
+            for receiver, response in signal.send_robust(sender=model, pks=pks, using=using):
+                if isinstance(response, Exception):
+                    logger.error("Error in the receiver %r of a safedelete signal", receiver, exc_info=response)
+        else:
+            signal.send(sender=model, pks=pks, using=using)
+
+
+def _send_in_worker(pending, using):
+    try:
+        _send_all(pending, using, robust=True)
+    finally:
+        # The connections opened by the receivers belong to the thread of the worker, nothing else would close them
+        connections.close_all()
+
+
+def _deliver(pending, using):
+    if getattr(settings, 'SAFE_DELETE_SIGNAL_WORKERS', None):
+        _get_executor().submit(_send_in_worker, pending, using)
+    else:
+        _send_all(pending, using)
+
+
+def _get_pending():
+    """
+    Return the signals collected in this thread, per database alias.
+    """
+    if not hasattr(_local, 'pending'):
+        _local.pending = {}
+    return _local.pending
+
+
+@contextmanager
+def collect_signals(using):
+    """
+    Collect the signals sent in the block (see :func:`send_post_softdelete` and :func:`send_post_undelete`) and
+    send them when the transaction of `using` commits, coalesced per model.
+
+    It must be used inside the atomic block of the operation, so the signals are dropped if it is rolled back. The
+    nested blocks on the same database add their signals to the outermost one, the ones on another database collect
+    theirs until its own transaction commits.
+    """
+    if not is_deferred() or using in _get_pending():
+        yield
+        return
+    _local.pending[using] = pending = OrderedDict()
+    try:
+        yield
+    finally:
+        del _local.pending[using]
+    if pending:
+        transaction.on_commit(partial(_deliver, pending, using), using=using)
+
+
+def _send(signal, bulk_signal, model, using, pks=None, instance=None):
+    if not is_deferred():
+        if instance is not None:
+            signal.send(sender=model, instance=instance, using=using)
+        else:
+            bulk_signal.send(sender=model, pks=pks, using=using)
+        return
+    pks = [instance.pk] if instance is not None else list(pks)
+    pending = _get_pending().get(using)
+    if pending is not None:
+        pending.setdefault((bulk_signal, model), []).extend(pks)
+    else:
+        # Outside of a delete or an undelete (or in another thread): deferred but not coalesced
+        transaction.on_commit(partial(_deliver, OrderedDict([((bulk_signal, model), pks)]), using), using=using)
+
+
+def send_post_softdelete(model, using, pks=None, instance=None):
+    """
+    Send ``post_softdelete`` for `instance`, or ``post_bulk_softdelete`` for the primary keys `pks`, now or when the
+    transaction commits (see the module documentation).
+    """
+    _send(post_softdelete, post_bulk_softdelete, model, using, pks=pks, instance=instance)
+
+
+def send_post_undelete(model, using, pks=None, instance=None):
+    """
+    Send ``post_undelete`` for `instance`, or ``post_bulk_undelete`` for the primary keys `pks`, now or when the
+    transaction commits (see the module documentation).
+    """
+    _send(post_undelete, post_bulk_undelete, model, using, pks=pks, instance=instance)
@@ -1,9 +1,10 @@
 from django.db import models
+from django.db.models import Q
 from django.db.models.fields.related_descriptors import ManyToManyDescriptor
 from django.utils.functional import cached_property
 
+from .tombstones import get_tombstone
 from .utils import is_safedelete_cls
-from .config import DEFAULT_DELETED
 
 __all__ = ["SafeDeleteManyToManyField"]
 
@@ -77,28 +78,27 @@ class SafeDeleteManyToManyDescriptor(ManyToManyDescriptor):
             def _apply_rel_filters(self, queryset):
                 """Filter queryset for not deleted instances"""
                 queryset = super(SafeDeleteRelatedManager, self)._apply_rel_filters(queryset)
-                return queryset.filter(**self._get_safedelete_filter())
+                return queryset.filter(self._get_safedelete_filter())
 
             def _get_safedelete_filter(self):
-                """Build related filter dict
+                """Build related filter
                 Filter by the ``deleted`` attribute when relation uses an intermediate model
 
                 Example:
-                    {'membership__deleted': datetime(1970, 1, 1)}
+                    Q(membership__deleted=datetime(1970, 1, 1))
                 """
                 field_name = self.query_field_name
                 if is_safedelete_cls(self.through):
                     field_name = self.target_field.related_query_name()
-                    filter_key = "{}__deleted".format(field_name)
-                    return {filter_key: DEFAULT_DELETED}
+                    return get_tombstone(self.through).live_q(prefix="{}__".format(field_name))
                 else:
-                    return {}
+                    return Q()
 
             def get_prefetch_queryset(self, instances, queryset=None):
                 if queryset is None:
                     queryset = super(cls, self).get_queryset()
 
-                queryset = queryset.filter(**self._get_safedelete_filter()).distinct()
+                queryset = queryset.filter(self._get_safedelete_filter()).distinct()
 
                 return super(SafeDeleteRelatedManager, self).get_prefetch_queryset(instances, queryset)
 
@@ -0,0 +1,193 @@
+"""
+Partial indexes restricted to the objects that are not deleted.
+
+Nearly every query on a safedelete model filters on ``deleted = '1970-01-01'`` (or the condition of its tombstone, see
+:mod:`safedelete.tombstones`). A model can list the fields it is
+looked up by in ``_safedelete_live_indexes``: each entry (a field name or a tuple of field names) gets an index that
+only covers the objects that are not deleted. These indexes replace the index of the ``deleted`` field: its
+``db_index`` is set to False, so ``makemigrations`` generates an ``AlterField`` dropping it (see
+:class:`safedelete.operations.SwapDeletedIndex` to drop it only once the live indexes exist).
+
+>>> class Article(SafeDeleteModel):
+...     _safedelete_live_indexes = ['slug', ('author', 'published')]
+...     slug = models.SlugField()
+...     author = models.ForeignKey(Author, on_delete=models.CASCADE)
+...     published = models.DateTimeField()
+
+The same way, each entry of ``_safedelete_unique`` gets a unique constraint that only applies to the objects that are
+not deleted. Unlike with ``unique=True``, a deleted object does not prevent from creating a new one with the same
+values, so ``SafeDeleteManager.update_or_create`` does not need to look for a deleted object first.
+
+>>> class Member(SafeDeleteModel):
+...     _safedelete_unique = ['email']
+...     email = models.EmailField()
+
+The indexes and constraints are added to the ``indexes`` and ``constraints`` of the model so they are picked up by
+``makemigrations``, see :class:`safedelete.operations.SwapDeletedIndex` to replace the index of the ``deleted`` field
+of an existing table.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Index
+
+try:
+    from django.db.models import UniqueConstraint
+except ImportError:  # Django < 2.2
+    UniqueConstraint = object
+
+from .compat import INDEX_TAKES_CONDITION
+from .tombstones import get_tombstone
+
+
+def _get_fields_list(model, attribute):
+    """
+    Return the tuples of field names declared in the `attribute` of `model` (which can contain field names).
+    """
+    return [
+        (fields,) if isinstance(fields, str) else tuple(fields)
+        for fields in getattr(model, attribute, None) or ()
+    ]
+
+
+def _check_can_declare(model, attribute):
+    if not INDEX_TAKES_CONDITION:
+        raise ImproperlyConfigured("{} requires Django 2.2 or later.".format(attribute))
+    deleted_field = model._meta.get_field('deleted')
+    if deleted_field.model is not model:
+        raise ImproperlyConfigured(
+            "{} cannot declare {}, its deleted field is on {}.".format(
+                model.__name__, attribute, deleted_field.model.__name__)
+        )
+
+
+class LiveIndex(Index):
+    """
+    Index with the condition of the objects that are not deleted (``deleted = '1970-01-01'`` by default).
+
+    The databases that do not support partial indexes (MySQL for example) get a full index on the fields followed
+    by the field of the tombstone of the model instead, which can be used by the same queries.
+    """
+    suffix = 'liv'
+
+    def create_sql(self, model, schema_editor, using=''):
+        if self.condition is not None and not schema_editor.connection.features.supports_partial_indexes:
+            index = Index(
+                fields=list(self.fields) + [get_tombstone(model).field_name], name=self.name,
+                db_tablespace=self.db_tablespace
+            )
+            return index.create_sql(model, schema_editor, using=using)
+        return super(LiveIndex, self).create_sql(model, schema_editor, using=using)
+
+
+def _get_name(model, fields, suffix):
+    """
+    Return the name Django would generate for an index of `model` on `fields` with `suffix`.
+    The conditions require the name upfront, before the index is added to the model.
+    """
+    index = Index(fields=list(fields))
+    index.suffix = suffix
+    index.set_name_with_model(model)
+    return index.name
+
+
+def live_index(model, fields):
+    """
+    Return the :class:`LiveIndex` of `model` on `fields`.
+    """
+    return LiveIndex(
+        fields=list(fields), name=_get_name(model, fields, LiveIndex.suffix), condition=get_tombstone(model).live_q()
+    )
+
+
+def get_live_indexes(model):
+    """
+    Return the :class:`LiveIndex` declared by `model` in ``_safedelete_live_indexes``.
+    """
+    return [live_index(model, fields) for fields in _get_fields_list(model, '_safedelete_live_indexes')]
+
+
+def add_live_indexes(model):
+    """
+    Add the indexes declared by `model` in ``_safedelete_live_indexes`` to its ``indexes`` and remove the index of
+    its ``deleted`` field (its ``db_index`` is set to False).
+    """
+    if not getattr(model, '_safedelete_live_indexes', None):
+        return
+    _check_can_declare(model, '_safedelete_live_indexes')
+    names = set(index.name for index in model._meta.indexes)
+    indexes = [index for index in get_live_indexes(model) if index.name not in names]
+    if indexes:
+        model._meta.indexes = list(model._meta.indexes) + indexes
+        # The migrations only look at the options declared in Meta
+        model._meta.original_attrs['indexes'] = model._meta.indexes
+    model._meta.get_field('deleted').db_index = False
+
+
+class LiveUniqueConstraint(UniqueConstraint):
+    """
+    Unique constraint with the condition of the objects that are not deleted (``deleted = '1970-01-01'`` by default):
+    the objects that are not deleted are unique, and a deleted object does not prevent from creating a new one.
+
+    The databases that do not support partial indexes (MySQL for example) get a unique constraint on the fields
+    followed by the field of the tombstone of the model instead: the objects that are not deleted all have the same
+    value in it.
+    This does not work with the :class:`safedelete.tombstones.NullTombstone` (``NULL`` values are never equal) nor
+    the :class:`safedelete.tombstones.BooleanTombstone` (only one object could be deleted).
+    """
+    suffix = 'luq'
+
+    def _get_fallback(self, model, schema_editor):
+        if self.condition is not None and not schema_editor.connection.features.supports_partial_indexes:
+            return UniqueConstraint(fields=list(self.fields) + [get_tombstone(model).field_name], name=self.name)
+        return None
+
+    def constraint_sql(self, model, schema_editor):
+        fallback = self._get_fallback(model, schema_editor)
+        if fallback is not None:
+            return fallback.constraint_sql(model, schema_editor)
+        return super(LiveUniqueConstraint, self).constraint_sql(model, schema_editor)
+
+    def create_sql(self, model, schema_editor):
+        fallback = self._get_fallback(model, schema_editor)
+        if fallback is not None:
+            return fallback.create_sql(model, schema_editor)
+        return super(LiveUniqueConstraint, self).create_sql(model, schema_editor)
+
+    def remove_sql(self, model, schema_editor):
+        fallback = self._get_fallback(model, schema_editor)
+        if fallback is not None:
+            return fallback.remove_sql(model, schema_editor)
+        return super(LiveUniqueConstraint, self).remove_sql(model, schema_editor)
+
+
+def live_unique_constraint(model, fields):
+    """
+    Return the :class:`LiveUniqueConstraint` of `model` on `fields`.
+    """
+    return LiveUniqueConstraint(
+        fields=list(fields), name=_get_name(model, fields, LiveUniqueConstraint.suffix),
+        condition=get_tombstone(model).live_q()
+    )
+
+
+def get_live_unique_constraints(model):
+    """
+    Return the :class:`LiveUniqueConstraint` declared by `model` in ``_safedelete_unique``.
+    """
+    return [live_unique_constraint(model, fields) for fields in _get_fields_list(model, '_safedelete_unique')]
+
+
+def add_live_unique_constraints(model):
+    """
+    Add the unique constraints declared by `model` in ``_safedelete_unique`` to its ``constraints``.
+    """
+    if not getattr(model, '_safedelete_unique', None):
+        return
+    _check_can_declare(model, '_safedelete_unique')
+    names = set(constraint.name for constraint in model._meta.constraints)
+    constraints = [
+        constraint for constraint in get_live_unique_constraints(model) if constraint.name not in names
+    ]
+    if constraints:
+        model._meta.constraints = list(model._meta.constraints) + constraints
+        # The migrations only look at the options declared in Meta
+        model._meta.original_attrs['constraints'] = model._meta.constraints
@@ -0,0 +1,44 @@
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from ...tombstones import convert_tombstones
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill the new field of the DualWriteTombstone of a model from its old field, by chunks of objects ordered "
+        "by primary key. The conversion can be resumed with --start-after."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help="The model to convert, as app_label.ModelName.")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="The number of objects converted per transaction (default: 1000).")
+        parser.add_argument('--sleep', type=float, default=0,
+                            help="The number of seconds to wait between two chunks (default: 0).")
+        parser.add_argument('--start-after', default=None,
+                            help="Only convert the objects with a primary key greater than this one.")
+        parser.add_argument('--database', default=None, help="The database to use.")
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model(options['model'])
+        except (LookupError, ValueError) as e:
+            raise CommandError(str(e))
+        start = time.time()
+
+        def report(last_pk, nb_objects):
+            if options['verbosity'] >= 1:
+                self.stdout.write("{} objects converted ({:.0f}/s), last primary key: {}".format(
+                    nb_objects, nb_objects / max(time.time() - start, 1e-6), last_pk))
+
+        try:
+            nb_objects = convert_tombstones(
+                model, batch_size=options['batch_size'], sleep=options['sleep'], start_after=options['start_after'],
+                using=options['database'], batch_callback=report,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS("{} objects of {} converted.".format(nb_objects, model._meta.label)))
@@ -0,0 +1,57 @@
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from ...purge import get_retention, purge_models
+
+
+class Command(BaseCommand):
+    help = (
+        "Hard delete the objects soft deleted for longer than the _safedelete_retention of their model, by chunks of "
+        "objects ordered by primary key."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*',
+                            help="The models to purge, as app_label.ModelName (default: all the models with a "
+                                 "_safedelete_retention).")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="The number of objects deleted per transaction (default: 1000).")
+        parser.add_argument('--sleep', type=float, default=0,
+                            help="The number of seconds to wait between two chunks (default: 0).")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only count the objects that would be deleted (without the cascade).")
+        parser.add_argument('--loop', type=float, default=None, metavar='SECONDS',
+                            help="Keep running and purge again every SECONDS seconds.")
+        parser.add_argument('--database', default=None, help="The database to use.")
+
+    def handle(self, *args, **options):
+        models = None
+        if options['models']:
+            try:
+                models = [apps.get_model(label) for label in options['models']]
+            except (LookupError, ValueError) as e:
+                raise CommandError(str(e))
+            for model in models:
+                if get_retention(model) is None:
+                    raise CommandError("{} has no _safedelete_retention.".format(model._meta.label))
+        verb = 'would be deleted' if options['dry_run'] else 'deleted'
+
+        def report(batch):
+            if options['verbosity'] >= 1:
+                self.stdout.write("{}: {} objects {} in {:.0f} ms, last primary key: {}".format(
+                    batch.model._meta.label, batch.result[0], verb, batch.duration * 1000, batch.last_pk))
+
+        while True:
+            try:
+                nb_objects, _ = purge_models(
+                    models, batch_size=options['batch_size'], sleep=options['sleep'], dry_run=options['dry_run'],
+                    using=options['database'], batch_callback=report,
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS("{} objects {}.".format(nb_objects, verb)))
+            if options['loop'] is None:
+                break
+            time.sleep(options['loop'])
@@ -1,9 +1,10 @@
 from django.conf import settings
 from django.db import models
 
-from .config import DEFAULT_DELETED, DELETED_INVISIBLE, DELETED_ONLY_VISIBLE, DELETED_VISIBLE, SOFT_DELETE, \
-    SOFT_DELETE_CASCADE
+from .config import DELETED_INVISIBLE, DELETED_ONLY_VISIBLE, DELETED_VISIBLE, SOFT_DELETE, SOFT_DELETE_CASCADE
+from .archive import is_archived, restore_objects
 from .queryset import SafeDeleteQueryset
+from .tombstones import get_tombstone
 
 
 class SafeDeleteManager(models.Manager):
@@ -123,12 +124,16 @@ class SafeDeleteManager(models.Manager):
         revived_soft_deleted_object = False
         if self.model.has_unique_fields():
             # Check if object is already soft-deleted
-            deleted_object = self.all_with_deleted().filter(**kwargs).exclude(deleted=DEFAULT_DELETED).first()
+            tombstone = get_tombstone(self.model)
+            deleted_object = self.all_with_deleted().filter(tombstone.deleted_q(), **kwargs).first()
 
             # If object is soft-deleted, reset delete-state...
             if deleted_object and deleted_object._safedelete_policy in self.get_soft_delete_policies():
-                deleted_object.deleted = DEFAULT_DELETED
-                deleted_object.save()
+                if is_archived(self.model):
+                    restore_objects(self.model, [deleted_object.pk], self.db)
+                else:
+                    tombstone.set_live(deleted_object)
+                    deleted_object.save()
                 revived_soft_deleted_object = True
 
         # Do the standard logic
@@ -3,15 +3,22 @@ import logging
 import warnings
 
 from django.db import models, router, transaction
+from django.db.models.signals import post_save, pre_save
 from django.utils import timezone
 
+from .archive import archive_rows, get_archive_model, get_archive_using, is_archived, undelete_archived_related
+from .collector import get_cascade_plan
 from .config import (HARD_DELETE, HARD_DELETE_NOCASCADE, NO_DELETE,
                      SOFT_DELETE, SOFT_DELETE_CASCADE, DEFAULT_DELETED)
+from .indexes import LiveUniqueConstraint
 from .managers import (SafeDeleteAllManager, SafeDeleteDeletedManager,
                        SafeDeleteManager)
-from .signals import post_softdelete, post_undelete, pre_softdelete
-from .utils import can_hard_delete, concatenate_delete_returns, get_objects_to_delete, is_deleted, is_safedelete_cls,\
-    perform_updates
+from .dispatch import collect_signals, is_deferred, send_post_softdelete, send_post_undelete
+from .signals import post_softdelete, pre_softdelete
+from .tombstones import get_tombstone
+from .utils import (can_hard_delete, concatenate_delete_returns, get_objects_to_delete, get_related_changes, is_deleted,
+                    is_safedelete_cls, operation_atomic, perform_updates, soft_delete_scope,
+                    undelete_operation, undelete_related_in_sql)
 
 
 logger = logging.getLogger(__name__)
@@ -38,6 +45,29 @@ class SafeDeleteModel(models.Model):
         ...
         >>> # Now you have your model (with its ``deleted`` field, and custom manager and delete method)
 
+    :attribute _safedelete_live_indexes: the fields (or tuples of fields) to index for the objects that are not
+        deleted only (see :mod:`safedelete.indexes`). The ``deleted`` field is then not indexed (its ``db_index`` is
+        set to False).
+
+    :attribute _safedelete_unique: the fields (or tuples of fields) that are unique among the objects that are not
+        deleted (see :mod:`safedelete.indexes`).
+
+    :attribute _safedelete_tombstone: how the ``deleted`` field records the deletion, found from the type of the field
+        by default (see :mod:`safedelete.tombstones`).
+
+    :attribute _safedelete_retention: the ``timedelta`` the deleted objects are kept before being hard deleted by
+        ``safedelete_purge`` (see :mod:`safedelete.purge`). Defaults to None, they are kept forever.
+
+    :attribute _safedelete_archive: move the deleted objects to an archive table (True, or the alias of the database of
+        the archive table) so the table of the model only contains the objects that are not deleted (see
+        :mod:`safedelete.archive`). Defaults to False.
+
+    :attribute _safedelete_direct_update: soft delete an object with an ``UPDATE`` of its ``deleted`` field filtered on
+        its primary key and on it not being deleted, instead of saving it: the ``pre_save`` and ``post_save`` signals
+        are not sent and the ``pre_save`` of the fields is not called. The ``pre_softdelete`` signal is sent once the
+        ``UPDATE`` is done. Deleting an object that is already deleted changes nothing (neither in the database nor on
+        the instance) and returns ``(0, {})`` without cascade nor signal. Defaults to False.
+
     :attribute objects:
         The :class:`safedelete.managers.SafeDeleteManager` that returns the non-deleted models.
 
@@ -50,6 +80,7 @@ class SafeDeleteModel(models.Model):
     """
 
     _safedelete_policy = SOFT_DELETE
+    _safedelete_direct_update = False
 
     deleted = models.DateTimeField(editable=False, default=DEFAULT_DELETED, db_index=True)
 
@@ -80,32 +111,51 @@ class SafeDeleteModel(models.Model):
         if not keep_deleted:
             if is_deleted(self) and self.pk:
                 was_undeleted = True
-            self.deleted = DEFAULT_DELETED
-
-        super(SafeDeleteModel, self).save(**kwargs)
+            get_tombstone(self.__class__).set_live(self)
+
+        using = kwargs.get('using') or router.db_for_write(self.__class__, instance=self)
+        if was_undeleted and is_archived(self.__class__):
+            # The row is not in the table (the save inserts it), it is moved back from the archive table
+            archive_using = get_archive_using(self.__class__, using)
+            with operation_atomic(using), transaction.atomic(using=archive_using):
+                super(SafeDeleteModel, self).save(**kwargs)
+                get_archive_model(self.__class__)._base_manager.using(archive_using).filter(
+                    pk=self.pk)._raw_delete(archive_using)
+        else:
+            super(SafeDeleteModel, self).save(**kwargs)
 
         if was_undeleted:
             # send undelete signal
-            using = kwargs.get('using') or router.db_for_write(self.__class__, instance=self)
-            post_undelete.send(sender=self.__class__, instance=self, using=using)
+            send_post_undelete(self.__class__, using, instance=self)
 
-    def undelete(self, force_policy=None, **kwargs):
+    def undelete(self, force_policy=None, set_based=False, _nested=False, **kwargs):
         """Undelete a soft-deleted model.
 
         Args:
             force_policy: Force a specific undelete policy. (default: {None})
+            set_based: For ``SOFT_DELETE_CASCADE``, undelete the related objects with one ``UPDATE`` per relation
+                instead of undeleting them one by one (their ``save`` is not called). (default: {False})
             kwargs: Passed onto :func:`save`.
 
+        Returns the number of undeleted objects (like :func:`delete`).
+
         .. note::
             Will raise a :class:`AssertionError` if the model was not soft-deleted.
         """
-        with transaction.atomic():
+        undelete_returns = []
+        using = kwargs.get('using') or router.db_for_write(self.__class__, instance=self)
+        with operation_atomic(using, nested=_nested), collect_signals(using):
             current_policy = force_policy or self._safedelete_policy
 
             assert is_deleted(self)
             self.save(keep_deleted=False, **kwargs)
+            undelete_returns.append((1, {self._meta.label: 1}))
 
-            if current_policy == SOFT_DELETE_CASCADE:
+            if current_policy == SOFT_DELETE_CASCADE and set_based:
+                undelete_returns.append(undelete_related_in_sql(
+                    self.__class__._base_manager.using(using).filter(pk=self.pk)
+                ))
+            elif current_policy == SOFT_DELETE_CASCADE:
                 # We get all the related objects (deleted or not) and we undelete the ones that are deleted
                 fast_deletes, objects_to_delete = get_objects_to_delete([self], return_deleted=True)
                 for related_objects_qs in fast_deletes:
@@ -113,13 +163,37 @@ class SafeDeleteModel(models.Model):
                     if is_safedelete_cls(model):
                         # This could be done way more efficiently as we could not go through each object save
                         # but I don't really care about undelete
-                        for related in related_objects_qs.exclude(deleted=DEFAULT_DELETED):
-                            related.undelete()
+                        for related in related_objects_qs.filter(get_tombstone(model).deleted_q()):
+                            undelete_returns.append(related.undelete(_nested=True))
                 for model, related_objects in objects_to_delete.items():
                     if is_safedelete_cls(model):
                         for related in related_objects:
                             if is_deleted(related):
-                                related.undelete()
+                                undelete_returns.append(related.undelete(_nested=True))
+                # The archived related objects are not in the tables the collector looks at
+                undelete_returns.append(undelete_archived_related(self.__class__, [self.pk], using))
+        return concatenate_delete_returns(*undelete_returns)
+
+    @classmethod
+    def _needs_instance_delete(cls):
+        """
+        Return whether the objects of this model have to be soft deleted one by one by their ``delete`` when they are
+        deleted by cascade: when it is overridden or when something listens to the signals sent for each object.
+        Otherwise they are soft deleted with a single ``UPDATE``.
+
+        The receivers of the signals are cached by Django per sender (and the cache is cleared when a receiver is
+        connected or disconnected), so this is cheap.
+        """
+        delete = getattr(cls.delete, '__func__', cls.delete)
+        if delete is not getattr(SafeDeleteModel.delete, '__func__', SafeDeleteModel.delete):
+            return True
+        signals = [pre_softdelete]
+        if not cls._safedelete_direct_update:
+            signals += [pre_save, post_save]
+        if not is_deferred():
+            # Otherwise the objects are sent with post_bulk_softdelete
+            signals.append(post_softdelete)
+        return any(signal.has_listeners(cls) for signal in signals)
 
     @classmethod
     def _get_safelete_policy(cls, force_policy=None):
@@ -128,17 +202,23 @@ class SafeDeleteModel(models.Model):
         """
         return cls._safedelete_policy if (force_policy is None) else force_policy
 
-    def delete(self, force_policy=None, **kwargs):
+    def delete(self, force_policy=None, deleted=None, _nested=False, **kwargs):
         """
         Overrides Django's delete behaviour based on the model's delete policy.
 
         Args:
             force_policy: Force a specific delete policy. (default: {None})
+            deleted: The deletion time to set if soft deleted, it is shared by all the objects deleted by cascade so
+                they can be undeleted together (see :func:`undelete_operation`). (default: {now})
             kwargs: Passed onto :func:`save` if soft deleted.
         """
-        # Wrap everything in a transaction to make sure that if something fails everything gets rolled back
+        # Wrap everything in a transaction to make sure that if something fails everything gets rolled back (`_nested` is
+        # only passed by the deletes done inside another one, see :func:`operation_atomic`)
         delete_returns = []
-        with transaction.atomic():
+        if deleted is None:
+            deleted = timezone.now()
+        using = kwargs.get('using') or router.db_for_write(self.__class__, instance=self)
+        with operation_atomic(using, nested=_nested), collect_signals(using):
 
             current_policy = self._get_safelete_policy(force_policy=force_policy)
 
@@ -153,50 +233,126 @@ class SafeDeleteModel(models.Model):
             elif current_policy == HARD_DELETE_NOCASCADE:
                 # Hard-delete the object only if nothing would be deleted with it
                 if not can_hard_delete(self):
-                    return self.delete(force_policy=SOFT_DELETE, **kwargs)
+                    return self.delete(force_policy=SOFT_DELETE, deleted=deleted, _nested=True, **kwargs)
                 else:
-                    return self.delete(force_policy=HARD_DELETE, **kwargs)
+                    return self.delete(force_policy=HARD_DELETE, _nested=True, **kwargs)
 
             elif current_policy in [SOFT_DELETE_CASCADE, SOFT_DELETE]:
                 # Soft-delete the object, marking it as deleted. Don't do anything for cascade so it might lead to
                 # broken foreign key relationships for the ORM (pointing to objects that virtually don't exist any more)
-                self.deleted = timezone.now()
-                using = kwargs.get('using') or router.db_for_write(self.__class__, instance=self)
+                tombstone = get_tombstone(self.__class__)
+                direct_update = self._safedelete_direct_update and not is_archived(self.__class__)
+                if direct_update and not self.__class__._base_manager.using(using).filter(
+                        tombstone.live_q(), pk=self.pk).update(**tombstone.delete_kwargs(deleted)):
+                    # Already deleted (or not in the database): the instance is left unchanged and nothing is sent
+                    return (0, {})
+                tombstone.set_deleted(self, deleted)
                 # send pre_softdelete signal
                 pre_softdelete.send(sender=self.__class__, instance=self, using=using)
-                super(SafeDeleteModel, self).save(update_fields=["deleted"])
+                if is_archived(self.__class__):
+                    # Archived after the cascade (see below), the rows referencing it have to leave their table first
+                    pass
+                elif not direct_update:
+                    super(SafeDeleteModel, self).save(update_fields=tombstone.field_names)
                 delete_returns.append((1, {self._meta.label: 1}))
-                # send softdelete signal
-                post_softdelete.send(sender=self.__class__, instance=self, using=using)
+                if not is_archived(self.__class__):
+                    # send softdelete signal
+                    send_post_softdelete(self.__class__, using, instance=self)
 
             if current_policy == SOFT_DELETE_CASCADE:
                 # Soft-delete on related objects
                 logger.info("Delete {} {}".format(self.__class__.__name__, self.pk))
-                fast_deletes, objects_to_delete = get_objects_to_delete([self])
+                # Collect once the objects to delete and to update, only their keys if no instance is needed
+                pks_only = not any(
+                    model._needs_instance_delete()
+                    for model in get_cascade_plan(self.__class__).cascade_models if is_safedelete_cls(model)
+                )
+                fast_deletes, objects_to_delete, field_updates = get_related_changes([self], pks_only=pks_only)
                 for related_objects_qs in fast_deletes:
                     model = related_objects_qs.model
-                    if is_safedelete_cls(model):
-                        # This could be done way more efficiently as we could not go through each object delete
-                        # but in case they have some custom logic in the delete it's better to do it that way
+                    if not is_safedelete_cls(model):
+                        continue
+                    if model._needs_instance_delete():
+                        # In case they have some custom logic in the delete or signal receivers, go through each
+                        # object delete
                         for related in related_objects_qs:
-                            delete_returns.append(related.delete(force_policy=SOFT_DELETE, **kwargs))
+                            delete_returns.append(
+                                related.delete(force_policy=SOFT_DELETE, deleted=deleted, _nested=True, **kwargs))
+                    else:
+                        nb_objects = soft_delete_scope(related_objects_qs, deleted)
+                        if nb_objects:
+                            delete_returns.append((nb_objects, {model._meta.label: nb_objects}))
                 for model, related_objects in objects_to_delete.items():
-                    if is_safedelete_cls(model):
+                    if not is_safedelete_cls(model):
+                        continue
+                    if model._needs_instance_delete():
                         for related in related_objects:
-                            delete_returns.append(related.delete(force_policy=SOFT_DELETE, **kwargs))
+                            delete_returns.append(
+                                related.delete(force_policy=SOFT_DELETE, deleted=deleted, _nested=True, **kwargs))
+                    else:
+                        related_pks = related_objects if pks_only else [related.pk for related in related_objects]
+                        nb_objects = soft_delete_scope(
+                            model._base_manager.using(using).filter(pk__in=related_pks), deleted)
+                        if nb_objects:
+                            delete_returns.append((nb_objects, {model._meta.label: nb_objects}))
 
                 # We don't do anything if it is not a safedelete model which means that we can leave some dangling
                 # objects if they are not safe delete models...
 
                 # Do the updates that the delete implies.
                 # (for example in case of a relation `on_delete=models.SET_NULL`)
-                perform_updates([self])
+                perform_updates([self], field_updates=field_updates)
+
+            if current_policy in [SOFT_DELETE_CASCADE, SOFT_DELETE] and is_archived(self.__class__):
+                archive_rows(self.__class__, [self.pk], deleted, using)
+                send_post_softdelete(self.__class__, using, instance=self)
         return concatenate_delete_returns(*delete_returns)
 
+    @classmethod
+    def undelete_operation(cls, deleted, using=None):
+        """Undelete the objects deleted by the same delete operation as the objects of this model deleted at `deleted`.
+
+        All the objects soft deleted by a delete (including its cascade) share the same deletion time: the objects of
+        this model and of the models it cascades to that were deleted at `deleted` are undeleted with one ``UPDATE``
+        per model, without walking the relations. Unlike the cascade undelete, the objects deleted before by another
+        operation stay deleted.
+
+        Like :py:func:`safedelete.queryset.SafeDeleteQueryset.undelete`, the ``save`` of the objects is not called
+        and the ``post_bulk_undelete`` signal is sent.
+
+        >>> article = Article.deleted_objects.get(pk=1)
+        >>> Article.undelete_operation(article.deleted)
+
+        Args:
+            deleted: The deletion time of the objects to undelete.
+            using: The database to use. (default: {None})
+
+        Returns the number of undeleted objects (like :func:`delete`).
+        """
+        assert deleted != get_tombstone(cls).live_value
+        return undelete_operation(cls, deleted, using=using or router.db_for_write(cls))
+
+    def _get_unique_checks(self, exclude=None):
+        """
+        Add the unique constraints of ``_safedelete_unique`` to the checks of :func:`validate_unique`.
+
+        Django does not validate the unique constraints with a condition, but these ones only apply to the objects
+        that are not deleted, which are the objects the checks look at (through the default manager).
+        """
+        unique_checks, date_checks = super(SafeDeleteModel, self)._get_unique_checks(exclude=exclude)
+        for constraint in getattr(self._meta, 'constraints', ()):
+            if isinstance(constraint, LiveUniqueConstraint) and \
+                    not any(name in (exclude or ()) for name in constraint.fields):
+                unique_checks.append((self.__class__, constraint.fields))
+        return unique_checks, date_checks
+
     @classmethod
     def has_unique_fields(cls):
         """Checks if one of the fields of this model has a unique constraint set (unique=True)
 
+        The unique constraints of ``_safedelete_unique`` are not taken into account as they do not apply to the
+        deleted objects (see :mod:`safedelete.indexes`).
+
         Args:
             model: Model instance to check
         """
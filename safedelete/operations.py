@@ -0,0 +1,190 @@
+"""
+Migration operations for the safedelete models.
+"""
+import time
+
+from django.db import transaction
+from django.db.migrations.operations import AddField, AddIndex, AlterField
+from django.db.migrations.operations.base import Operation
+
+from .tombstones import get_tombstone_for_field
+
+
+class SwapDeletedIndex(Operation):
+    """
+    Replace the index of the ``deleted`` field of a model by its live indexes (see :mod:`safedelete.indexes`).
+
+    ``makemigrations`` generates an ``AlterField`` removing the index of the ``deleted`` field and an ``AddIndex`` per
+    live index, in that order. This operation can replace them: the live indexes are created first so the queries on
+    the model always have an index to use, even while the migration is running.
+
+    >>> operations = [
+    ...     SwapDeletedIndex('article', indexes=[
+    ...         LiveIndex(fields=['slug'], name='app_article_slug_3c2e5e_liv', condition=Q(deleted=DEFAULT_DELETED)),
+    ...     ]),
+    ... ]
+
+    Args:
+        model_name: The name of the model.
+        indexes: The live indexes of the model.
+    """
+    reduces_to_sql = True
+    reversible = True
+
+    def __init__(self, model_name, indexes):
+        self.model_name = model_name
+        self.indexes = indexes
+
+    @property
+    def model_name_lower(self):
+        return self.model_name.lower()
+
+    def _operations(self, app_label, state):
+        """
+        Return the operations to apply in order, starting from `state`, with the state after each of them.
+        """
+        operations = []
+        for index in self.indexes:
+            operations.append(AddIndex(self.model_name, index))
+        deleted_field = state.models[app_label, self.model_name_lower].get_field_by_name('deleted').clone()
+        deleted_field.db_index = False
+        operations.append(AlterField(self.model_name, 'deleted', deleted_field))
+        states = []
+        for operation in operations:
+            state = state.clone()
+            operation.state_forwards(app_label, state)
+            states.append(state)
+        return list(zip(operations, states))
+
+    def state_forwards(self, app_label, state):
+        for operation, _ in self._operations(app_label, state):
+            operation.state_forwards(app_label, state)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        state = from_state
+        for operation, new_state in self._operations(app_label, from_state):
+            operation.database_forwards(app_label, schema_editor, state, new_state)
+            state = new_state
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        # `to_state` is the state before the operation
+        operations = self._operations(app_label, to_state)
+        states = [to_state] + [state for _, state in operations]
+        for i, (operation, _) in reversed(list(enumerate(operations))):
+            operation.database_backwards(app_label, schema_editor, states[i + 1], states[i])
+
+    def describe(self):
+        return 'Replace the index of the deleted field of {} by {}'.format(
+            self.model_name, ', '.join(index.name for index in self.indexes))
+
+
+class AddDeletedField(Operation):
+    """
+    Add the ``deleted`` field to an existing table without rewriting it under a lock.
+
+    When a model starts inheriting from ``SafeDeleteModel``, ``makemigrations`` generates an ``AddField`` adding the
+    ``deleted`` field with its default. Some databases (PostgreSQL before 11, MySQL before 8.0) rewrite the whole table
+    for it and then build the index of the field while the writes are blocked. This operation can replace the
+    ``AddField``, with the same arguments:
+
+    1. The column is added as nullable and without index, which does not rewrite the table.
+    2. The objects are set as not deleted by chunks of ``batch_size`` objects, ordered by primary key.
+    3. The column is made ``NOT NULL`` (the objects created meanwhile are set as not deleted in the same statement).
+    4. The index is built, with ``CREATE INDEX CONCURRENTLY`` on PostgreSQL.
+
+    The migration must not be atomic (``atomic = False``) for each chunk to be committed in its own transaction and
+    for the index to be built concurrently, otherwise the whole operation runs in the transaction of the migration.
+
+    >>> class Migration(migrations.Migration):
+    ...     atomic = False
+    ...     operations = [
+    ...         AddDeletedField('article', 'deleted', models.DateTimeField(
+    ...             editable=False, default=DEFAULT_DELETED, db_index=True)),
+    ...     ]
+
+    Args:
+        model_name: The name of the model.
+        name: The name of the field.
+        field: The field to add.
+        batch_size: The number of objects updated per chunk. (default: {1000})
+        sleep: The number of seconds to wait between two chunks, to throttle the backfill. (default: {0})
+    """
+    reduces_to_sql = False
+    reversible = True
+
+    def __init__(self, model_name, name, field, batch_size=1000, sleep=0):
+        self.model_name = model_name
+        self.name = name
+        self.field = field
+        self.batch_size = batch_size
+        self.sleep = sleep
+
+    @property
+    def model_name_lower(self):
+        return self.model_name.lower()
+
+    def state_forwards(self, app_label, state):
+        AddField(self.model_name, self.name, self.field).state_forwards(app_label, state)
+
+    def _clone_field(self, model, **kwargs):
+        """
+        Return a copy of the field bound to `model`, with the attributes in `kwargs` changed.
+        """
+        name, path, args, field_kwargs = self.field.deconstruct()
+        field_kwargs.update(kwargs)
+        field = self.field.__class__(*args, **field_kwargs)
+        field.set_attributes_from_name(self.name)
+        field.model = model
+        return field
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        field = model._meta.get_field(self.name)
+        live_value = get_tombstone_for_field(field).live_value
+        if live_value is None:
+            # Nothing to backfill
+            nullable_field = self._clone_field(model, db_index=False)
+        else:
+            nullable_field = self._clone_field(model, null=True, db_index=False, default=None)
+        schema_editor.add_field(model, nullable_field)
+        if live_value is not None:
+            self._backfill(schema_editor, model, live_value)
+            schema_editor.alter_field(model, nullable_field, self._clone_field(model, db_index=False))
+        if field.db_index:
+            schema_editor.execute(create_index_sql(schema_editor, model, field))
+
+    def _backfill(self, schema_editor, model, live_value):
+        using = schema_editor.connection.alias
+        queryset = model._base_manager.using(using).filter(**{self.name + '__isnull': True})
+        last_pk = None
+        while True:
+            remaining_qs = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            pks = list(remaining_qs.order_by('pk').values_list('pk', flat=True)[:self.batch_size])
+            if len(pks) == 0:
+                break
+            with transaction.atomic(using=using):
+                queryset.filter(pk__gte=pks[0], pk__lte=pks[-1]).update(**{self.name: live_value})
+            last_pk = pks[-1]
+            if self.sleep:
+                time.sleep(self.sleep)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_field(model, model._meta.get_field(self.name))
+
+    def describe(self):
+        return 'Add field {} to {} and backfill it by chunks'.format(self.name, self.model_name)
+
+
+def create_index_sql(schema_editor, model, field):
+    """
+    Return the statement creating the index of `field`, without blocking the writes where it is supported (outside of
+    a transaction on PostgreSQL).
+    """
+    sql = None
+    if schema_editor.connection.vendor == 'postgresql' and not schema_editor.atomic_migration:
+        sql = schema_editor.sql_create_index.replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1)
+    return schema_editor._create_index_sql(model, [field], sql=sql)
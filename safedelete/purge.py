@@ -0,0 +1,147 @@
+"""
+Hard delete the objects that have been soft deleted for longer than the retention of their model.
+
+A model declares how long its deleted objects are kept with ``_safedelete_retention``:
+
+>>> class Article(SafeDeleteModel):
+...     _safedelete_retention = timedelta(days=90)
+
+The ``safedelete_purge`` management command (or :func:`purge_models`) then deletes the expired objects by chunks of
+primary keys, each chunk in its own transaction. The models are purged in the order of the cascade relations, the
+related objects before the objects they point to, and the objects that still have dependents that are not deleted
+or not expired yet (even through deleted dependents) or that are protected are kept: deleting them would delete or be
+blocked by other objects. The deleted objects of a model without retention never expire.
+
+The tombstone of the model must record the deletion time (see :mod:`safedelete.tombstones`). The expired objects of
+an archived model are deleted from its archive table (see :mod:`safedelete.archive`), which nothing references.
+"""
+import time
+from collections import namedtuple
+
+from django.db import router, transaction
+from django.utils import timezone
+
+from .archive import get_archive_model, get_archive_using, is_archived
+from .collector import get_cascade_plan
+from .registry import get_safedelete_models
+from .tombstones import get_tombstone
+from .utils import concatenate_delete_returns, get_dependents_q
+
+# A chunk of purged objects:
+#  - model: the purged model
+#  - last_pk: the primary key of the last object of the chunk
+#  - result: the result of the delete of the chunk (with the objects deleted by cascade)
+#  - duration: the duration of the chunk in seconds
+PurgeBatch = namedtuple('PurgeBatch', ['model', 'last_pk', 'result', 'duration'])
+
+
+def get_retention(model):
+    """
+    Return the ``_safedelete_retention`` of `model`, None if its deleted objects are kept forever.
+    """
+    return getattr(model, '_safedelete_retention', None)
+
+
+def get_purge_order(models):
+    """
+    Return `models` ordered so that the models are purged after the models they cascade to.
+    """
+    order = []
+
+    def visit(model):
+        if model in order:
+            return
+        # Added before its relations to stop on the loops
+        order.append(model)
+        for edge in get_cascade_plan(model).cascade_edges:
+            visit(edge.model)
+        order.remove(model)
+        order.append(model)
+
+    for model in models:
+        visit(model)
+    return [model for model in order if model in models]
+
+
+def get_expired_queryset(model, retention=None, now=None, using=None):
+    """
+    Return the objects of `model` deleted for longer than `retention` (default to its ``_safedelete_retention``) and
+    that can be hard deleted: the objects that have dependents that are not deleted or not expired (deleted for less
+    than the retention of their model, or without retention), directly or through deleted dependents, and the objects
+    that are protected by other objects (deleted or not) are excluded.
+    """
+    tombstone = get_tombstone(model)
+    if not tombstone.records_time:
+        raise ValueError("{} does not record the deletion time of its objects.".format(model.__name__))
+    retention = retention or get_retention(model)
+    using = using or router.db_for_write(model)
+    now = now or timezone.now()
+    expired_q = tombstone.deleted_before_q(now - retention)
+    if is_archived(model):
+        return get_archive_model(model)._base_manager.using(get_archive_using(model, using)).filter(expired_q)
+    queryset = model._base_manager.using(using).filter(expired_q)
+    dependents_q = get_dependents_q(model, using, purge_time=now)
+    if dependents_q is not None:
+        queryset = queryset.exclude(dependents_q)
+    return queryset
+
+
+def purge(model, retention=None, now=None, batch_size=1000, sleep=0, dry_run=False, using=None,
+          batch_callback=None):
+    """
+    Hard delete the objects of `model` deleted for longer than its retention, by chunks ordered by primary key.
+
+    Args:
+        model: The model to purge.
+        retention: The ``timedelta`` the deleted objects are kept. (default: {the ``_safedelete_retention`` of the
+            model})
+        now: The time the retention is counted from. (default: {now})
+        batch_size: The number of objects deleted per transaction (not counting the objects deleted by cascade).
+            (default: {1000})
+        sleep: The number of seconds to wait between two chunks, to throttle the purge. (default: {0})
+        dry_run: Only count the objects that would be deleted (without the cascade). (default: {False})
+        using: The database to use. (default: {None})
+        batch_callback: Called after each chunk with a :data:`PurgeBatch`. (default: {None})
+
+    Returns the number of deleted objects (like the deletes).
+    """
+    retention = retention or get_retention(model)
+    if retention is None:
+        return (0, {})
+    using = using or router.db_for_write(model)
+    queryset = get_expired_queryset(model, retention=retention, now=now or timezone.now(), using=using)
+    purge_returns = []
+    last_pk = None
+    while True:
+        start = time.time()
+        remaining_qs = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        pks = list(remaining_qs.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if len(pks) == 0:
+            break
+        if dry_run:
+            result = (len(pks), {model._meta.label: len(pks)})
+        else:
+            with transaction.atomic(using=queryset.db):
+                # Filtered again in case an object has been undeleted or has a new dependent since it was selected
+                result = queryset.filter(pk__in=pks).delete()
+            if is_archived(model):
+                # Counted as objects of the model, not of its archive model
+                result = (result[0], {model._meta.label: result[0]}) if result[0] else (0, {})
+        purge_returns.append(result)
+        last_pk = pks[-1]
+        if batch_callback is not None:
+            batch_callback(PurgeBatch(model=model, last_pk=last_pk, result=result, duration=time.time() - start))
+        if sleep:
+            time.sleep(sleep)
+    return concatenate_delete_returns(*purge_returns)
+
+
+def purge_models(models=None, **kwargs):
+    """
+    Purge `models` (default to all the safedelete models with a ``_safedelete_retention``), in the order of the
+    cascade relations. The keyword arguments are passed to :func:`purge`.
+    """
+    if models is None:
+        models = [model for model in get_safedelete_models() if get_retention(model) is not None]
+    kwargs.setdefault('now', timezone.now())
+    return concatenate_delete_returns(*[purge(model, **kwargs) for model in get_purge_order(models)])
@@ -1,17 +1,20 @@
-from distutils.version import LooseVersion
-
-import django
 from django.conf import settings
-from django.db import DatabaseError, transaction
+from django.db import DatabaseError, NotSupportedError
 from django.db.models import query
 from django.db.models.fields.related import ForeignKey
-from django.db.models.query_utils import Q
 from django.utils import timezone
 
-from .config import (DEFAULT_DELETED, DELETED_INVISIBLE, DELETED_ONLY_VISIBLE, DELETED_VISIBLE,
-                     DELETED_VISIBLE_BY_FIELD, HARD_DELETE, HARD_DELETE_NOCASCADE, NO_DELETE, SOFT_DELETE_CASCADE,
-                     SOFT_DELETE)
-from .utils import concatenate_delete_returns, get_objects_to_delete, is_safedelete_cls, perform_updates
+from .archive import (archive_objects, get_archive_model, get_archive_using, is_archived, read_archive,
+                      restore_related, undelete_archived_related, union_with_archive)
+from .collector import get_cascade_plan, get_key_fields
+from .compat import CLONE_TAKES_KLASS
+from .config import (DELETED_INVISIBLE, DELETED_ONLY_VISIBLE, DELETED_VISIBLE, DELETED_VISIBLE_BY_FIELD, HARD_DELETE,
+                     HARD_DELETE_NOCASCADE, NO_DELETE, SOFT_DELETE_CASCADE, SOFT_DELETE)
+from .dispatch import collect_signals, send_post_undelete
+from .tombstones import get_tombstone
+from .utils import (concatenate_delete_returns, get_dependents_q, get_related_changes, is_deleted, is_safedelete_cls,
+                    operation_atomic, perform_updates, soft_delete_cascade_in_sql, soft_delete_scope,
+                    undelete_related_in_sql, undelete_scope)
 
 
 class SafeDeleteIntegrityError(DatabaseError):
@@ -28,18 +31,53 @@ class SafeDeleteQueryset(query.QuerySet):
     """
     _safedelete_filter_applied = False
 
-    def delete(self, force_policy=None):
+    def delete(self, force_policy=None, set_based=False, batch_size=None, start_after=None, batch_callback=None,
+               deleted=None, return_pks=False, _nested=False):
         """
         Overrides bulk delete behaviour.
         Note that like Django implementation we don't call the custom delete of each models so if they have any magic
         in them it won't be applied.
 
+        Args:
+            force_policy: Force a specific delete policy. (default: {None})
+            set_based: For ``SOFT_DELETE_CASCADE``, do the cascade with one ``UPDATE`` per relation (using subqueries)
+                instead of loading the objects to delete in memory. (default: {False})
+            batch_size: Delete the objects by chunks of ``batch_size`` objects (ordered by primary key), each chunk in
+                its own transaction. (default: {None})
+            start_after: With ``batch_size``, only delete the objects with a primary key greater than this one.
+                This allows to resume an interrupted delete. (default: {None})
+            batch_callback: With ``batch_size``, called after each chunk has been deleted with the primary key of the
+                last object of the chunk and the result of the chunk delete. (default: {None})
+            deleted: The deletion time to set if soft deleted, it is shared by all the objects deleted (including by
+                cascade and with ``batch_size``). (default: {now})
+            return_pks: Also return the primary keys of the soft deleted objects of the queryset (not the ones
+                deleted by cascade), as a third element: ``(total, {label: count}, pks)``. They come from the
+                ``UPDATE ... RETURNING`` on PostgreSQL and SQLite 3.35+. Only for the ``SOFT_DELETE`` and
+                ``SOFT_DELETE_CASCADE`` policies. (default: {False})
+
+        With the ``SOFT_DELETE`` policy, the objects are soft deleted with a single ``UPDATE`` and its row count is
+        returned.
+
         .. seealso::
             :py:func:`safedelete.models.SafeDeleteModel.delete`
         """
         assert self.query.can_filter(), "Cannot use 'limit' or 'offset' with delete."
-        with transaction.atomic():
-            current_policy = self.model._get_safelete_policy(force_policy=force_policy)
+        current_policy = self.model._get_safelete_policy(force_policy=force_policy)
+        if return_pks and current_policy not in (SOFT_DELETE, SOFT_DELETE_CASCADE):
+            raise ValueError("return_pks is only supported by the SOFT_DELETE and SOFT_DELETE_CASCADE policies.")
+        if deleted is None:
+            deleted = timezone.now()
+        if self._reads_archive():
+            return self._delete_archived(force_policy=force_policy, set_based=set_based, batch_size=batch_size,
+                                         start_after=start_after, batch_callback=batch_callback, deleted=deleted,
+                                         return_pks=return_pks, _nested=_nested)
+        self._filter_visibility()
+        if batch_size is not None:
+            return self._delete_in_batches(batch_size, force_policy=force_policy, set_based=set_based,
+                                           start_after=start_after, batch_callback=batch_callback, deleted=deleted,
+                                           return_pks=return_pks, _nested=_nested)
+        deleted_pks = []
+        with operation_atomic(self.db, nested=_nested), collect_signals(self.db):
             delete_returns = []
             if current_policy == NO_DELETE:
                 # Don't do anything.
@@ -48,60 +86,227 @@ class SafeDeleteQueryset(query.QuerySet):
                 # Normally hard-delete the objects (bulk delete from Django)
                 return super(SafeDeleteQueryset, self).delete()
             elif current_policy == HARD_DELETE_NOCASCADE:
-                # This is not optimised but we don't use it for now anyway
-                for obj in self.all():
-                    delete_returns.append(obj.delete(force_policy=force_policy))
-                self._result_cache = None
+                dependents_q = get_dependents_q(self.model, self.db)
+                if get_cascade_plan(self.model).has_implicit_relations:
+                    # The relations that are not in the cascade plan are only found by the collector of each object
+                    for obj in self.all():
+                        delete_returns.append(obj.delete(force_policy=force_policy, deleted=deleted, _nested=True))
+                    self._result_cache = None
+                elif dependents_q is None:
+                    # Nothing can depend on the objects
+                    return super(SafeDeleteQueryset, self).delete()
+                else:
+                    # The objects that other objects depend on are soft deleted. They still have dependents once
+                    # deleted (the deleted objects with dependents count as dependents), so the same condition
+                    # excludes them from the hard delete of the other ones
+                    nb_objects = soft_delete_scope(self.filter(dependents_q), deleted)
+                    if nb_objects:
+                        delete_returns.append((nb_objects, {self.model._meta.label: nb_objects}))
+                    delete_returns.append(self.exclude(dependents_q).delete(force_policy=HARD_DELETE, _nested=True))
             elif current_policy == SOFT_DELETE:
-                nb_objects = self.count()
-                self.update(deleted=timezone.now())
-                delete_returns.append((nb_objects, {self.model._meta.label: nb_objects}))
+                # A single statement: the count is the one of the update, not of a previous select
+                if return_pks:
+                    deleted_pks = soft_delete_scope(self, deleted, return_pks=True)
+                    nb_objects = len(deleted_pks)
+                else:
+                    nb_objects = soft_delete_scope(self, deleted)
+                if nb_objects:
+                    delete_returns.append((nb_objects, {self.model._meta.label: nb_objects}))
+            elif current_policy == SOFT_DELETE_CASCADE and set_based:
+                return soft_delete_cascade_in_sql(self, deleted, return_pks=return_pks)
             elif current_policy == SOFT_DELETE_CASCADE:
-                queryset_objects = list(self.all())
-                nb_objects = len(queryset_objects)
-                if nb_objects == 0:
+                # We only need the keys of the objects to find their related objects
+                queryset_objects = list(self.all().only(*get_key_fields(self.model)))
+                if len(queryset_objects) == 0:
                     # Don't do anything since the queryset is empty
-                    return (0, {})
-                self.update(deleted=timezone.now())
-                delete_returns.append((nb_objects, {self.model._meta.label: nb_objects}))
+                    return (0, {}, []) if return_pks else (0, {})
+                deleted_pks = [obj.pk for obj in queryset_objects]
+                if not is_archived(self.model):
+                    # Archived models are archived once the related objects are found, as they are found through the
+                    # table
+                    nb_objects = soft_delete_scope(self, deleted)
+                    delete_returns.append((nb_objects, {self.model._meta.label: nb_objects}))
                 # Do the cascade soft-delete on related objects
-                fast_deletes, objects_to_delete = get_objects_to_delete(queryset_objects)
+                # Collect once the objects to delete and to update
+                fast_deletes, objects_to_delete, field_updates = get_related_changes(queryset_objects, pks_only=True)
                 for related_objects_qs in fast_deletes:
                     model = related_objects_qs.model
                     if is_safedelete_cls(model):
                         # Note that the fast delete query sets are not safedelete query sets
-                        nb_objects = related_objects_qs.count()
-                        related_objects_qs.update(deleted=timezone.now())
-                        delete_returns.append((nb_objects, {model._meta.label: nb_objects}))
-                for model, related_objects in objects_to_delete.items():
+                        nb_objects = soft_delete_scope(related_objects_qs, deleted)
+                        if nb_objects:
+                            delete_returns.append((nb_objects, {model._meta.label: nb_objects}))
+                for model, related_pks in objects_to_delete.items():
                     if is_safedelete_cls(model):
                         # For the other instances we create the query set so we can just call the delete again and it
                         # will go in the previous if
-                        related_instances_qs = model.objects.filter(pk__in=[o.pk for o in related_objects])
-                        delete_returns.append(related_instances_qs.delete(force_policy=SOFT_DELETE))
+                        related_instances_qs = model.objects.filter(pk__in=related_pks)
+                        delete_returns.append(
+                            related_instances_qs.delete(force_policy=SOFT_DELETE, deleted=deleted, _nested=True))
                 # Do the updates that the delete implies.
                 # (for example in case of a relation `on_delete=models.SET_NULL`)
-                perform_updates(queryset_objects)
+                perform_updates(queryset_objects, field_updates=field_updates)
+                if is_archived(self.model):
+                    delete_returns.insert(0, archive_objects(self.model, deleted_pks, deleted, self.db))
+        if return_pks:
+            return concatenate_delete_returns(*delete_returns) + (deleted_pks,)
         return concatenate_delete_returns(*delete_returns)
     delete.alters_data = True
 
-    def undelete(self, force_policy=None):
+    def _delete_archived(self, force_policy=None, return_pks=False, _nested=False, **kwargs):
+        """
+        Delete the objects of a queryset reading the archive table of an archived model (see :mod:`safedelete.archive`).
+
+        The archived objects are already deleted, they are only removed with the ``HARD_DELETE`` policy. The objects
+        that are not deleted (with ``all_objects``) are deleted as usual.
+        """
+        delete_returns = []
+        deleted_pks = []
+        with operation_atomic(self.db, nested=_nested), collect_signals(self.db):
+            if self._get_visibility() == DELETED_VISIBLE:
+                live_qs = self._clone()
+                live_qs._safedelete_force_visibility = DELETED_INVISIBLE
+                live_return = live_qs.delete(force_policy=force_policy, return_pks=return_pks, _nested=True, **kwargs)
+                if return_pks:
+                    deleted_pks = live_return[2]
+                delete_returns.append(live_return[:2])
+            if self.model._get_safelete_policy(force_policy=force_policy) == HARD_DELETE:
+                archived_qs = self._clone()
+                archived_qs._safedelete_force_visibility = DELETED_ONLY_VISIBLE
+                pks = list(archived_qs.values_list('pk', flat=True))
+                archive_using = get_archive_using(self.model, self.db)
+                nb_objects, _ = get_archive_model(self.model)._base_manager.using(archive_using).filter(
+                    pk__in=pks).delete()
+                if nb_objects:
+                    delete_returns.append((nb_objects, {self.model._meta.label: nb_objects}))
+        if return_pks:
+            return concatenate_delete_returns(*delete_returns) + (deleted_pks,)
+        return concatenate_delete_returns(*delete_returns)
+
+    def _delete_in_batches(self, batch_size, force_policy=None, set_based=False, start_after=None,
+                           batch_callback=None, deleted=None, return_pks=False, _nested=False):
+        """
+        Delete the objects of the queryset by chunks, see :py:func:`delete`.
+
+        The chunks are selected by primary key ranges (and not with an offset) so the objects already deleted are
+        never read again, even if they are still visible in the queryset (for example with ``all_objects``).
+        Note that if this is called in a transaction, the chunks are only savepoints in that transaction (and they
+        join the atomic block of the current operation if safedelete does this delete inside another one, see
+        :func:`safedelete.utils.operation_atomic`).
+        """
+        if self.model._get_safelete_policy(force_policy=force_policy) == NO_DELETE:
+            return (0, {})
+        delete_returns = []
+        deleted_pks = []
+        last_pk = start_after
+        while True:
+            remaining_qs = self if last_pk is None else self.filter(pk__gt=last_pk)
+            pks = list(remaining_qs.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if len(pks) == 0:
+                break
+            # Each delete is done in its own transaction
+            chunk_return = self.filter(pk__in=pks).delete(force_policy=force_policy, set_based=set_based,
+                                                          deleted=deleted, return_pks=return_pks, _nested=_nested)
+            if return_pks:
+                deleted_pks.extend(chunk_return[2])
+            delete_returns.append(chunk_return[:2])
+            last_pk = pks[-1]
+            if batch_callback is not None:
+                batch_callback(last_pk, chunk_return)
+        if return_pks:
+            return concatenate_delete_returns(*delete_returns) + (deleted_pks,)
+        return concatenate_delete_returns(*delete_returns)
+
+    def undelete(self, force_policy=None, bulk=True, set_based=False, _nested=False):
         """Undelete all soft deleted models.
 
-        .. note::
-            The current implementation loses performance on bulk undeletes in
-            order to call the pre/post-save signals.
+        By default the objects are undeleted with one ``UPDATE`` per model, so like for
+        :py:func:`delete` the custom ``save`` of each model is not called and neither are the pre/post-save and
+        ``post_undelete`` signals. Instead, a single ``post_bulk_undelete`` signal is sent per model with the primary
+        keys of the undeleted objects.
+
+        Args:
+            force_policy: Force a specific undelete policy. (default: {None})
+            bulk: If False, undelete each object with :py:func:`safedelete.models.SafeDeleteModel.undelete`, for
+                models with custom logic in their ``save``. (default: {True})
+            set_based: For ``SOFT_DELETE_CASCADE``, do the cascade with one ``UPDATE`` per relation (using subqueries)
+                instead of loading the related objects. (default: {False})
+
+        Returns the number of undeleted objects (like :py:func:`delete`).
 
         .. seealso::
             :py:func:`safedelete.models.SafeDeleteModel.undelete`
         """
         assert self.query.can_filter(), "Cannot use 'limit' or 'offset' with undelete."
-        # TODO: Replace this by bulk update if we can (need to call pre/post-save signal)
-        for obj in self.all():
-            obj.undelete(force_policy=force_policy)
+        if is_archived(self.model):
+            return self._undelete_archived(force_policy=force_policy, bulk=bulk, _nested=_nested)
+        self._filter_visibility()
+        undelete_returns = []
+        with operation_atomic(self.db, nested=_nested), collect_signals(self.db):
+            if not bulk:
+                for obj in self.all():
+                    undelete_returns.append(obj.undelete(force_policy=force_policy, _nested=True))
+                self._result_cache = None
+                return concatenate_delete_returns(*undelete_returns)
+
+            current_policy = self.model._get_safelete_policy(force_policy=force_policy)
+            tombstone = get_tombstone(self.model)
+            deleted_qs = self.filter(tombstone.deleted_q())
+            if current_policy == SOFT_DELETE_CASCADE and set_based:
+                # The related objects first, the scopes of their updates are built on the deleted objects
+                undelete_returns.append(undelete_related_in_sql(deleted_qs))
+                undelete_returns.insert(0, undelete_scope(deleted_qs))
+                return concatenate_delete_returns(*undelete_returns)
+            # We only need the keys of the objects to find their related objects
+            queryset_objects = list(deleted_qs.only(*get_key_fields(self.model)))
+            if len(queryset_objects) == 0:
+                return (0, {})
+            pks = [obj.pk for obj in queryset_objects]
+            nb_objects = deleted_qs.update(**tombstone.undelete_kwargs())
+            undelete_returns.append((nb_objects, {self.model._meta.label: nb_objects}))
+            send_post_undelete(self.model, self.db, pks=pks)
+
+            if current_policy == SOFT_DELETE_CASCADE:
+                # We get all the related objects (deleted or not) and we undelete the ones that are deleted
+                fast_deletes, objects_to_delete, _ = get_related_changes(
+                    queryset_objects, return_deleted=True, pks_only=True
+                )
+                for related_objects_qs in fast_deletes:
+                    model = related_objects_qs.model
+                    if is_safedelete_cls(model):
+                        related_pks = list(related_objects_qs.values_list('pk', flat=True))
+                        undelete_returns.append(model.deleted_objects.filter(pk__in=related_pks).undelete(_nested=True))
+                for model, related_pks in objects_to_delete.items():
+                    if is_safedelete_cls(model):
+                        undelete_returns.append(model.deleted_objects.filter(pk__in=related_pks).undelete(_nested=True))
+                # The archived related objects are not in the tables the collector looks at
+                undelete_returns.append(undelete_archived_related(self.model, pks, self.db))
         self._result_cache = None
+        return concatenate_delete_returns(*undelete_returns)
     undelete.alters_data = True
 
+    def _undelete_archived(self, force_policy=None, bulk=True, _nested=False):
+        """
+        Undelete the objects of an archived model, moving them back from its archive table (see
+        :mod:`safedelete.archive`).
+
+        The objects are moved with one ``INSERT`` and one ``DELETE`` per model, the cascade always loads the primary
+        keys (there is no ``set_based`` variant).
+        """
+        with operation_atomic(self.db, nested=_nested), collect_signals(self.db):
+            if not bulk:
+                undelete_returns = [
+                    obj.undelete(force_policy=force_policy, _nested=True) for obj in self.all() if is_deleted(obj)
+                ]
+                self._result_cache = None
+                return concatenate_delete_returns(*undelete_returns)
+            if self._get_visibility() not in (DELETED_VISIBLE, DELETED_ONLY_VISIBLE):
+                # No archived object can be in the queryset
+                return (0, {})
+            pks = [obj.pk for obj in self.all() if is_deleted(obj)]
+            self._result_cache = None
+            return restore_related(self.model, pks, self.db, force_policy=force_policy)
+
     def all(self, force_visibility=None):
         """Override so related managers can also see the deleted models.
 
@@ -175,16 +380,47 @@ class SafeDeleteQueryset(query.QuerySet):
         self._check_field_filter(**kwargs)
         return super(SafeDeleteQueryset, self).get(*args, **kwargs)
 
+    def _get_visibility(self):
+        force_visibility = getattr(self, '_safedelete_force_visibility', None)
+        return force_visibility if force_visibility is not None else self._safedelete_visibility
+
+    def _reads_archive(self):
+        """
+        Return whether the queryset reads the archive table of an archived model (see :mod:`safedelete.archive`).
+        """
+        return is_archived(self.model) and self._get_visibility() in (DELETED_VISIBLE, DELETED_ONLY_VISIBLE)
+
+    @staticmethod
+    def _filter_archive_visibility(queryset, visibility, subquery=False):
+        """
+        Apply the visibility to a queryset of an archived model: it reads the table of the model, the archive table
+        or both.
+
+        With `subquery`, the queryset is used as the value of a lookup (like ``__in``): Django only selects the
+        primary key of the query, not of the queries of a union, so both of them select it.
+        """
+        if visibility == DELETED_ONLY_VISIBLE:
+            read_archive(queryset.query)
+        elif visibility == DELETED_VISIBLE:
+            if get_archive_using(queryset.model, queryset.db) != queryset.db:
+                raise NotSupportedError(
+                    "The objects of {} cannot be read with the archived ones, they are in another database.".format(
+                        queryset.model.__name__))
+            query = queryset.query
+            if subquery and queryset._fields is None:
+                query = queryset.values('pk').query
+            queryset.query = union_with_archive(query)
+        queryset._safedelete_filter_applied = True
+
     def _filter_visibility(self):
         """Add deleted filters to the current QuerySet.
 
         Unlike QuerySet.filter, this does not return a clone.
         This is because QuerySet._fetch_all cannot work with a clone.
         """
-        force_visibility = getattr(self, '_safedelete_force_visibility', None)
-        visibility = force_visibility \
-            if force_visibility is not None \
-            else self._safedelete_visibility
+        visibility = self._get_visibility()
+        if not self._safedelete_filter_applied and is_archived(self.model):
+            self._filter_archive_visibility(self, visibility)
         if not self._safedelete_filter_applied and \
            visibility in (DELETED_INVISIBLE, DELETED_VISIBLE_BY_FIELD, DELETED_ONLY_VISIBLE):
             assert self.query.can_filter(), \
@@ -193,9 +429,9 @@ class SafeDeleteQueryset(query.QuerySet):
             # Add a query manually, QuerySet.filter returns a clone.
             # QuerySet._fetch_all cannot work with clones.
             if visibility in [DELETED_INVISIBLE, DELETED_VISIBLE_BY_FIELD]:
-                self.query.add_q(Q(deleted=DEFAULT_DELETED))
+                self.query.add_q(get_tombstone(self.model).live_q())
             else:
-                self.query.add_q(~Q(deleted=DEFAULT_DELETED))
+                self.query.add_q(get_tombstone(self.model).deleted_q())
 
             self._safedelete_filter_applied = True
 
@@ -206,18 +442,17 @@ class SafeDeleteQueryset(query.QuerySet):
         Unlike QuerySet.filter, this does not return a clone.
         This is because QuerySet._fetch_all cannot work with a clone.
         """
-        force_visibility = getattr(sub_queryset, '_safedelete_force_visibility', None)
-        visibility = force_visibility \
-            if force_visibility is not None \
-            else sub_queryset._safedelete_visibility
+        visibility = sub_queryset._get_visibility()
+        if not sub_queryset._safedelete_filter_applied and is_archived(sub_queryset.model):
+            sub_queryset._filter_archive_visibility(sub_queryset, visibility, subquery=True)
         if not sub_queryset._safedelete_filter_applied and \
            visibility in (DELETED_INVISIBLE, DELETED_VISIBLE_BY_FIELD, DELETED_ONLY_VISIBLE):
             assert sub_queryset.query.can_filter(), \
                 "Cannot filter a query once a slice has been taken."
             if visibility in (DELETED_INVISIBLE, DELETED_VISIBLE_BY_FIELD):
-                sub_queryset.query.add_q(Q(deleted=DEFAULT_DELETED))
+                sub_queryset.query.add_q(get_tombstone(sub_queryset.model).live_q())
             else:
-                sub_queryset.query.add_q(~Q(deleted=DEFAULT_DELETED))
+                sub_queryset.query.add_q(get_tombstone(sub_queryset.model).deleted_q())
 
             sub_queryset._safedelete_filter_applied = True
 
@@ -241,25 +476,64 @@ class SafeDeleteQueryset(query.QuerySet):
         self._filter_visibility()
         return super(SafeDeleteQueryset, self).__getitem__(key)
 
-    def __getattribute__(self, name):
-        """Methods that do not return a QuerySet should call ``_filter_visibility`` first."""
-        attr = object.__getattribute__(self, name)
-        # These methods evaluate the queryset and therefore need to filter the
-        # visiblity set.
-        evaluation_methods = (
-            '_fetch_all', 'count', 'exists', 'aggregate', 'update', '_update',
-            'delete', 'undelete', 'iterator', 'first', 'last', 'latest', 'earliest'
-        )
-        if hasattr(attr, '__call__') and name in evaluation_methods:
-            def decorator(*args, **kwargs):
-                self._filter_visibility()
-                return attr(*args, **kwargs)
-            return decorator
-        return attr
+    # The following methods evaluate the queryset and therefore need to filter the visibility set first.
+
+    def _fetch_all(self):
+        self._filter_visibility()
+        return super(SafeDeleteQueryset, self)._fetch_all()
+
+    def count(self):
+        self._filter_visibility()
+        return super(SafeDeleteQueryset, self).count()
+
+    def exists(self):
+        self._filter_visibility()
+        return super(SafeDeleteQueryset, self).exists()
+
+    def aggregate(self, *args, **kwargs):
+        self._filter_visibility()
+        return super(SafeDeleteQueryset, self).aggregate(*args, **kwargs)
+
+    def _check_can_update(self):
+        if self._reads_archive():
+            raise NotSupportedError(
+                "The archived objects of {} cannot be updated, undelete them first.".format(self.model.__name__))
+
+    def update(self, **kwargs):
+        self._check_can_update()
+        self._filter_visibility()
+        return super(SafeDeleteQueryset, self).update(**kwargs)
+    update.alters_data = True
+
+    def _update(self, values):
+        self._check_can_update()
+        self._filter_visibility()
+        return super(SafeDeleteQueryset, self)._update(values)
+    _update.alters_data = True
+
+    def iterator(self, *args, **kwargs):
+        self._filter_visibility()
+        return super(SafeDeleteQueryset, self).iterator(*args, **kwargs)
+
+    def first(self):
+        self._filter_visibility()
+        return super(SafeDeleteQueryset, self).first()
+
+    def last(self):
+        self._filter_visibility()
+        return super(SafeDeleteQueryset, self).last()
+
+    def latest(self, *args, **kwargs):
+        self._filter_visibility()
+        return super(SafeDeleteQueryset, self).latest(*args, **kwargs)
+
+    def earliest(self, *args, **kwargs):
+        self._filter_visibility()
+        return super(SafeDeleteQueryset, self).earliest(*args, **kwargs)
 
     def _clone(self, klass=None, **kwargs):
         """Called by django when cloning a QuerySet."""
-        if LooseVersion(django.get_version()) < LooseVersion('1.9'):
+        if CLONE_TAKES_KLASS:
             clone = super(SafeDeleteQueryset, self)._clone(klass, **kwargs)
         else:
             clone = super(SafeDeleteQueryset, self)._clone(**kwargs)
@@ -0,0 +1,93 @@
+"""
+Registry of the safedelete models.
+
+The models inheriting from :class:`safedelete.models.SafeDeleteModel` are registered when Django prepares them (and
+again in :py:meth:`safedelete.apps.SafeDeleteConfig.ready`) so their safedelete metadata can be looked up without
+walking their class hierarchy each time.
+This is also when their live indexes and unique constraints are added (see :mod:`safedelete.indexes`) and their
+archive models created (see :mod:`safedelete.archive`).
+"""
+from collections import OrderedDict, namedtuple
+
+from django.db.models.signals import class_prepared
+
+from .indexes import add_live_indexes, add_live_unique_constraints
+from .tombstones import get_tombstone
+
+# The safedelete metadata of a model:
+#  - model: the model class
+#  - policy: its ``_safedelete_policy``
+#  - visibility: the ``_safedelete_visibility`` of its default manager
+#  - deleted_field: its ``deleted`` field
+#  - tombstone: how its ``deleted`` field records the deletion (see :mod:`safedelete.tombstones`)
+SafeDeleteModelInfo = namedtuple('SafeDeleteModelInfo', ['model', 'policy', 'visibility', 'deleted_field', 'tombstone'])
+
+_models = OrderedDict()  # {model: SafeDeleteModelInfo}
+_safedelete_classes = {}  # {class: bool}, memoized result of is_safedelete_cls
+
+
+def is_safedelete_cls(cls):
+    """
+    Return whether `cls` inherits from one of the classes of `safedelete.models`.
+    The result is memoized, so this is a dict lookup after the first call for a given class.
+    """
+    try:
+        return _safedelete_classes[cls]
+    except KeyError:
+        pass
+    # This used to check if it startswith 'safedelete', but that masks the issue inside of a test. Other clients
+    # create models that are outside of the safedelete package.
+    result = any(
+        base.__module__.startswith('safedelete.models') or is_safedelete_cls(base)
+        for base in cls.__bases__
+    )
+    _safedelete_classes[cls] = result
+    return result
+
+
+def register_model(model):
+    """
+    Add `model` to the registry if it is a safedelete model.
+    """
+    if model._meta.abstract or not is_safedelete_cls(model):
+        return
+    _models[model] = SafeDeleteModelInfo(
+        model=model,
+        policy=model._safedelete_policy,
+        visibility=getattr(model._meta.default_manager, '_safedelete_visibility', None),
+        deleted_field=model._meta.get_field('deleted'),
+        tombstone=get_tombstone(model),
+    )
+
+
+def get_model_info(model):
+    """
+    Return the :data:`SafeDeleteModelInfo` of `model`, or None if it is not a safedelete model.
+    """
+    try:
+        return _models[model]
+    except KeyError:
+        pass
+    register_model(model)
+    return _models.get(model)
+
+
+def get_safedelete_models():
+    """
+    Return the list of all the safedelete models (in the order they have been prepared).
+    """
+    return list(_models)
+
+
+def _prepare_model(sender, **kwargs):
+    register_model(sender)
+    if sender in _models:
+        add_live_indexes(sender)
+        add_live_unique_constraints(sender)
+        # Imported here as it depends on the cascade plans, which depend on the registry
+        from .archive import create_archive_model, is_archived
+        if is_archived(sender):
+            create_archive_model(sender)
+
+
+class_prepared.connect(_prepare_model)
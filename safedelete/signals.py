@@ -3,3 +3,6 @@ from django.db.models.signals import ModelSignal
 pre_softdelete = ModelSignal(providing_args=["instance", "using"], use_caching=True)
 post_softdelete = ModelSignal(providing_args=["instance", "using"], use_caching=True)
 post_undelete = ModelSignal(providing_args=["instance", "using"], use_caching=True)
+post_bulk_undelete = ModelSignal(providing_args=["pks", "using"], use_caching=True)
+pre_bulk_softdelete = ModelSignal(providing_args=["queryset", "using"], use_caching=True)
+post_bulk_softdelete = ModelSignal(providing_args=["pks", "using"], use_caching=True)
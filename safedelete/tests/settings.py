@@ -7,7 +7,10 @@ DEBUG = True
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-    }
+    },
+    'other': {
+        'ENGINE': 'django.db.backends.sqlite3',
+    },
 }
 
 MIDDLEWARE_CLASSES = (
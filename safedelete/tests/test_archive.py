@@ -0,0 +1,177 @@
+from datetime import timedelta
+
+from django.db import NotSupportedError, connection, models
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, isolate_apps
+from django.utils import timezone
+
+from .. import archive, registry
+from ..archive import check_archive_relations, get_archive_model
+from ..config import HARD_DELETE, SOFT_DELETE, SOFT_DELETE_CASCADE
+from ..models import SafeDeleteModel
+from ..purge import purge
+
+
+class ArchivedAuthor(SafeDeleteModel):
+    _safedelete_policy = SOFT_DELETE_CASCADE
+    _safedelete_archive = True
+    _safedelete_retention = timedelta(days=30)
+    name = models.CharField(max_length=100, unique=True)
+
+
+class ArchivedBook(SafeDeleteModel):
+    _safedelete_archive = True
+    author = models.ForeignKey(ArchivedAuthor, on_delete=models.CASCADE)
+
+
+class ArchivedAuthorNote(SafeDeleteModel):
+    # Not archived: the rows stay in the table and may reference an archived author
+    author = models.ForeignKey(ArchivedAuthor, on_delete=models.CASCADE, db_constraint=False)
+
+
+class ArchiveTestCase(TestCase):
+
+    def setUp(self):
+        self.authors = [ArchivedAuthor.objects.create(name='author{}'.format(i)) for i in range(3)]
+        self.books = [ArchivedBook.objects.create(author=author) for author in self.authors for _ in range(2)]
+        self.note = ArchivedAuthorNote.objects.create(author=self.authors[0])
+
+    def assertArchived(self, model, pks):
+        self.assertEqual(sorted(get_archive_model(model).objects.values_list('pk', flat=True)), sorted(pks))
+        self.assertFalse(model._base_manager.filter(pk__in=pks).exists())
+
+    def test_archive_model(self):
+        archive_model = get_archive_model(ArchivedBook)
+        self.assertEqual(archive_model._meta.db_table, 'safedelete_archivedbook_archive')
+        self.assertFalse(archive_model._meta.get_field('author').db_constraint)
+        self.assertFalse(get_archive_model(ArchivedAuthor)._meta.get_field('name').unique)
+        self.assertEqual(check_archive_relations(), [])
+
+    def test_delete(self):
+        self.assertEqual(self.authors[0].delete(), (4, {
+            'safedelete.ArchivedAuthor': 1, 'safedelete.ArchivedBook': 2, 'safedelete.ArchivedAuthorNote': 1,
+        }))
+        self.assertArchived(ArchivedAuthor, [self.authors[0].pk])
+        self.assertArchived(ArchivedBook, [book.pk for book in self.books[:2]])
+        self.assertEqual(ArchivedAuthorNote.deleted_objects.count(), 1)
+
+    def test_delete_order(self):
+        with CaptureQueriesContext(connection) as context:
+            self.authors[0].delete()
+        deletes = [query['sql'] for query in context.captured_queries if query['sql'].startswith('DELETE')]
+        # The books referencing the author leave their table first
+        self.assertEqual(len(deletes), 2)
+        self.assertIn('safedelete_archivedbook', deletes[0])
+        self.assertIn('safedelete_archivedauthor', deletes[1])
+
+    def test_queryset_delete(self):
+        ArchivedBook.objects.filter(author=self.authors[1]).delete()
+        self.assertArchived(ArchivedBook, [book.pk for book in self.books[2:4]])
+        ArchivedAuthor.objects.filter(pk__in=[self.authors[0].pk, self.authors[2].pk]).delete()
+        self.assertArchived(ArchivedAuthor, [self.authors[0].pk, self.authors[2].pk])
+        self.assertArchived(ArchivedBook, [book.pk for book in self.books])
+
+    def test_set_based_delete(self):
+        self.assertEqual(ArchivedAuthor.objects.filter(pk=self.authors[0].pk).delete(set_based=True), (4, {
+            'safedelete.ArchivedAuthor': 1, 'safedelete.ArchivedBook': 2, 'safedelete.ArchivedAuthorNote': 1,
+        }))
+        self.assertArchived(ArchivedAuthor, [self.authors[0].pk])
+        self.assertArchived(ArchivedBook, [book.pk for book in self.books[:2]])
+
+    def test_visibility(self):
+        self.authors[0].delete()
+        with self.assertNumQueries(1):
+            # Nothing to filter on
+            self.assertEqual(ArchivedAuthor.objects.count(), 2)
+        self.assertEqual(ArchivedAuthor.deleted_objects.count(), 1)
+        self.assertEqual(ArchivedAuthor.deleted_objects.get().pk, self.authors[0].pk)
+        self.assertTrue(ArchivedAuthor.deleted_objects.filter(name='author0').exists())
+        self.assertEqual(ArchivedAuthor.all_objects.count(), 3)
+        self.assertEqual(list(ArchivedAuthor.all_objects.order_by('pk')), self.authors)
+        self.assertEqual(ArchivedAuthor.all_objects.order_by('-pk').first(), self.authors[2])
+        self.assertEqual(ArchivedAuthor.all_objects.get(pk=self.authors[0].pk).name, 'author0')
+        self.assertEqual(ArchivedBook.deleted_objects.filter(author=self.authors[0]).count(), 2)
+        # The joins read the tables of the related models
+        self.assertEqual(ArchivedBook.deleted_objects.filter(author__name='author0').count(), 0)
+
+    def test_subquery(self):
+        self.authors[0].delete()
+        self.assertEqual(ArchivedAuthorNote.all_objects.filter(author__in=ArchivedAuthor.all_objects.all()).count(), 1)
+        self.assertEqual(ArchivedAuthorNote.all_objects.filter(
+            author__in=ArchivedAuthor.all_objects.filter(name='author0')).count(), 1)
+        self.assertEqual(ArchivedAuthorNote.all_objects.filter(
+            author__in=ArchivedAuthor.all_objects.values('pk')).count(), 1)
+        self.assertEqual(ArchivedAuthorNote.all_objects.filter(author__in=ArchivedAuthor.objects.all()).count(), 0)
+
+    def test_update(self):
+        self.authors[0].delete()
+        self.assertRaises(NotSupportedError, ArchivedAuthor.deleted_objects.update, name='other')
+        self.assertRaises(NotSupportedError, ArchivedAuthor.all_objects.update, name='other')
+        self.assertEqual(ArchivedAuthor.objects.filter(pk=self.authors[1].pk).update(name='other'), 1)
+
+    def test_hard_delete(self):
+        self.authors[0].delete()
+        self.assertEqual(ArchivedAuthor.all_objects.filter(pk__lte=self.authors[1].pk).delete(
+            force_policy=HARD_DELETE)[0], 4)
+        self.assertEqual(ArchivedAuthor.all_objects.count(), 1)
+        self.assertEqual(get_archive_model(ArchivedAuthor).objects.count(), 0)
+
+    def test_undelete(self):
+        self.authors[0].delete()
+        self.assertEqual(ArchivedAuthor.deleted_objects.all().undelete(), (4, {
+            'safedelete.ArchivedAuthor': 1, 'safedelete.ArchivedBook': 2, 'safedelete.ArchivedAuthorNote': 1,
+        }))
+        self.assertEqual(ArchivedAuthor.objects.count(), 3)
+        self.assertEqual(ArchivedBook.objects.count(), 6)
+        self.assertEqual(ArchivedAuthorNote.objects.count(), 1)
+        self.assertEqual(get_archive_model(ArchivedBook).objects.count(), 0)
+        self.assertEqual(ArchivedAuthor.objects.all().undelete(), (0, {}))
+
+    def test_undelete_policy(self):
+        self.authors[0].delete()
+        ArchivedAuthor.deleted_objects.all().undelete(force_policy=SOFT_DELETE)
+        self.assertEqual(ArchivedAuthor.objects.count(), 3)
+        self.assertEqual(ArchivedBook.deleted_objects.count(), 2)
+
+    def test_instance_undelete(self):
+        self.authors[0].delete()
+        author = ArchivedAuthor.deleted_objects.get()
+        self.assertEqual(author.undelete(), (4, {
+            'safedelete.ArchivedAuthor': 1, 'safedelete.ArchivedBook': 2, 'safedelete.ArchivedAuthorNote': 1,
+        }))
+        self.assertEqual(ArchivedAuthor.objects.get(pk=author.pk).name, 'author0')
+        self.assertEqual(ArchivedBook.objects.count(), 6)
+        self.assertEqual(get_archive_model(ArchivedAuthor).objects.count(), 0)
+
+    def test_undelete_operation(self):
+        deleted = timezone.now()
+        self.authors[0].delete(deleted=deleted)
+        self.books[2].delete(deleted=deleted - timedelta(days=1))
+        self.assertEqual(ArchivedAuthor.undelete_operation(deleted)[0], 4)
+        self.assertEqual(ArchivedBook.objects.count(), 5)
+
+    def test_update_or_create(self):
+        self.authors[0].delete()
+        author, created = ArchivedAuthor.objects.update_or_create(name='author0')
+        self.assertFalse(created)
+        self.assertEqual(author.pk, self.authors[0].pk)
+        self.assertEqual(get_archive_model(ArchivedAuthor).objects.count(), 0)
+
+    def test_purge(self):
+        self.authors[0].delete(deleted=timezone.now() - timedelta(days=40))
+        self.authors[1].delete()
+        self.assertEqual(purge(ArchivedAuthor), (1, {'safedelete.ArchivedAuthor': 1}))
+        self.assertEqual(ArchivedAuthor.deleted_objects.get(), ArchivedAuthor(pk=self.authors[1].pk))
+
+    @isolate_apps('safedelete')
+    def test_check(self):
+        class ArchivedShelf(SafeDeleteModel):
+            _safedelete_archive = True
+
+        class ShelvedBook(models.Model):
+            shelf = models.ForeignKey(ArchivedShelf, on_delete=models.CASCADE)
+
+        self.addCleanup(archive._archive_models.pop, ArchivedShelf)
+        self.addCleanup(registry._models.pop, ArchivedShelf)
+        errors = [error for error in check_archive_relations() if error.obj.model is ShelvedBook]
+        self.assertEqual([error.id for error in errors], ['safedelete.E001'])
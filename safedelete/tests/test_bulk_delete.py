@@ -1,8 +1,14 @@
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
 from django.db import models
 from django.test import TestCase
 
-from ..config import SOFT_DELETE_CASCADE
+from ..config import HARD_DELETE, SOFT_DELETE, SOFT_DELETE_CASCADE
 from ..models import SafeDeleteModel
+from ..signals import post_bulk_softdelete, post_softdelete, pre_bulk_softdelete
 
 
 class Reference(SafeDeleteModel):
@@ -68,17 +74,15 @@ class BulkDeleteTestCase(TestCase):
         self.assertEqual(Document1.deleted_objects.count(), 1)
         self.assertEqual(Document2.deleted_objects.count(), 0)
 
-        with self.assertNumQueries(8):
+        with self.assertNumQueries(6):
             # Delete the second reference, should not delete any document but should set the reference in the
             # corresponding document to None.
-            # The 8 queries are:
+            # The 6 queries are:
             #   - 2 for the transaction (savepoint and release savepoint)
             #   - 1 for the actual delete
-            #   - 2 for the select on documents to check which ones need to be cascade deleted
-            #   - 2 for the select on documents to check which ones need to be updated (for the SET_NULL)
+            #   - 2 for the select on documents to check which ones need to be cascade deleted or updated (for the
+            #     SET_NULL), the objects are collected only once for both
             #   - 1 for the update of the reference to None
-            # The 2 times request to get the objects to cascade delete and then update should be merged to be honest
-            # but they are left like that for now for sake of simplicity
             self.refs[1].delete()
 
         self.assertIsNone(Document2.objects.get(id=self.docs[2].id).reference)
@@ -92,11 +96,11 @@ class BulkDeleteTestCase(TestCase):
         self.assertEqual(Document1.deleted_objects.count(), 1)
         self.assertEqual(Document2.deleted_objects.count(), 0)
 
-        with self.assertNumQueries(11):
+        with self.assertNumQueries(9):
             # Delete the second reference, should not delete any document but should set the reference in the
             # corresponding document to None.
-            # The 11 queries are:
-            #   - 8 for the reference delete
+            # The 9 queries are:
+            #   - 6 for the reference delete
             #   - 3 for the document delete
             self.refs[2].delete()
             self.docs[4].delete()
@@ -125,18 +129,16 @@ class BulkDeleteTestCase(TestCase):
         self.assertEqual(Document1.deleted_objects.count(), 0)
         self.assertEqual(Document2.deleted_objects.count(), 0)
 
-        with self.assertNumQueries(10):
+        with self.assertNumQueries(8):
             # Delete all the references should not delete any document but should set the reference in the
             # corresponding documents to None.
-            # The 10 queries are:
+            # The 8 queries are:
             #   - 2 for the transaction (savepoint and release savepoint)s
             #   - 1 for select all the references that are not deleted
             #   - 1 for deleting them (update the deleted field on those references)
-            #   - 2 for the select on documents to check which ones need to be cascade deleted
-            #   - 2 for the select on documents to check which ones need to be updated (for the SET_NULL)
+            #   - 2 for the select on documents to check which ones need to be cascade deleted or updated (for the
+            #     SET_NULL), the objects are collected only once for both
             #   - 2 for the update of the reference to None in the 2 document tables
-            # The 2 times request to get the objects to cascade delete and then update should be merged to be honest
-            # but they are left like that for now for sake of simplicity
             Reference.objects.all().delete()
 
         self.assertEqual(Reference.objects.count(), 0)
@@ -223,3 +225,111 @@ class BulkDeleteTestCase(TestCase):
         self.assertEqual(Reference.objects.count(), 3)
         self.assertEqual(Document1.objects.count(), 2)
         self.assertEqual(Document2.objects.count(), 3)
+
+    def test_bulk_delete_in_batches(self):
+        """
+        Test the bulk delete by chunks: each chunk is deleted in its own transaction and the callback gets the cursor.
+        """
+        batches = []
+        with self.assertNumQueries(13):
+            # The 13 queries are:
+            #   - 3 for the select of the primary keys of each chunk (2 references, 1 reference and then none)
+            #   - 2 times 5 for the set based delete of the 2 chunks:
+            #       - 2 for the transaction (savepoint and release savepoint)
+            #       - 2 for the update of the reference to None in the 2 document tables
+            #       - 1 for the update of the references
+            result = Reference.objects.all().delete(
+                batch_size=2, set_based=True, batch_callback=lambda last_pk, result: batches.append((last_pk, result))
+            )
+        self.assertEqual(result, (3, {'safedelete.Reference': 3}))
+        self.assertEqual(batches, [
+            (self.refs[1].pk, (2, {'safedelete.Reference': 2})),
+            (self.refs[2].pk, (1, {'safedelete.Reference': 1})),
+        ])
+        self.assertEqual(Reference.objects.count(), 0)
+        self.assertEqual(Document1.objects.filter(reference__isnull=False).count(), 0)
+        self.assertEqual(Document2.objects.filter(reference__isnull=False).count(), 0)
+
+    def test_bulk_delete_in_batches_resume(self):
+        """
+        Test that a bulk delete by chunks can be resumed from the last primary key processed.
+        """
+        result = Document2.all_objects.all().delete(batch_size=2, start_after=self.docs[2].pk)
+        self.assertEqual(result, (2, {'safedelete.Document2': 2}))
+        self.assertEqual(list(Document2.objects.all()), [self.docs[2]])
+        self.assertEqual(Document1.objects.count(), 2)
+
+    def test_bulk_soft_delete_single_query(self):
+        """
+        Test that a soft delete is a single update and returns its row count.
+        """
+        with self.assertNumQueries(3):
+            # The 3 queries are:
+            #   - 2 for the transaction (savepoint and release savepoint)
+            #   - 1 for the update, there is no count before it
+            result = Document2.objects.all().delete(force_policy=SOFT_DELETE)
+        self.assertEqual(result, (3, {'safedelete.Document2': 3}))
+        self.assertEqual(Document2.objects.all().delete(force_policy=SOFT_DELETE), (0, {}))
+
+    def test_bulk_soft_delete_return_pks(self):
+        """
+        Test that the primary keys of the soft deleted objects are returned by the update.
+        """
+        with self.assertNumQueries(3):
+            result = Document2.objects.filter(reference__isnull=False).delete(force_policy=SOFT_DELETE, return_pks=True)
+        self.assertEqual(result[:2], (2, {'safedelete.Document2': 2}))
+        self.assertEqual(sorted(result[2]), [self.docs[2].pk, self.docs[4].pk])
+        self.assertEqual(Document2.objects.all().delete(force_policy=SOFT_DELETE, return_pks=True),
+                         (1, {'safedelete.Document2': 1}, [self.docs[3].pk]))
+
+    def test_bulk_soft_delete_return_pks_without_returning(self):
+        """
+        Test that the primary keys are selected first when the database does not support UPDATE ... RETURNING.
+        """
+        with mock.patch('safedelete.utils.supports_update_returning', return_value=False):
+            result = Document2.objects.all().delete(force_policy=SOFT_DELETE, return_pks=True)
+        self.assertEqual(result[:2], (3, {'safedelete.Document2': 3}))
+        self.assertEqual(sorted(result[2]), [doc.pk for doc in self.docs[2:]])
+        self.assertEqual(Document2.objects.count(), 0)
+
+    def test_bulk_delete_cascade_return_pks(self):
+        """
+        Test that the cascade deletes only return the primary keys of the objects of the queryset.
+        """
+        result = Reference.objects.filter(pk=self.refs[0].pk).delete(return_pks=True)
+        self.assertEqual(result, (1, {'safedelete.Reference': 1}, [self.refs[0].pk]))
+        result = Reference.objects.filter(pk=self.refs[1].pk).delete(set_based=True, return_pks=True)
+        self.assertEqual(result, (1, {'safedelete.Reference': 1}, [self.refs[1].pk]))
+        result = Reference.objects.all().delete(batch_size=2, return_pks=True)
+        self.assertEqual(result, (1, {'safedelete.Reference': 1}, [self.refs[2].pk]))
+        self.assertEqual(Reference.objects.all().delete(return_pks=True), (0, {}, []))
+
+    def test_bulk_hard_delete_return_pks(self):
+        """
+        Test that the primary keys can only be returned by the soft deletes.
+        """
+        self.assertRaises(ValueError, Reference.objects.all().delete, force_policy=HARD_DELETE, return_pks=True)
+
+    def test_bulk_soft_delete_signals(self):
+        """
+        Test that a soft delete sends the bulk signals once per model with the primary keys of the deleted objects.
+        """
+        pre_receiver = mock.Mock()
+        post_receiver = mock.Mock()
+        pre_bulk_softdelete.connect(pre_receiver, sender=Document2)
+        self.addCleanup(pre_bulk_softdelete.disconnect, pre_receiver, sender=Document2)
+        post_bulk_softdelete.connect(post_receiver, sender=Document2)
+        self.addCleanup(post_bulk_softdelete.disconnect, post_receiver, sender=Document2)
+        with mock.patch.object(post_softdelete, 'send') as mock_softdelete, self.assertNumQueries(3):
+            # The primary keys come from the update
+            Document2.objects.filter(reference__isnull=False).delete(force_policy=SOFT_DELETE)
+        mock_softdelete.assert_not_called()
+        self.assertEqual(pre_receiver.call_count, 1)
+        self.assertEqual(pre_receiver.call_args[1]['queryset'].model, Document2)
+        post_receiver.assert_called_once_with(
+            signal=post_bulk_softdelete, sender=Document2, pks=mock.ANY, using='default'
+        )
+        self.assertEqual(sorted(post_receiver.call_args[1]['pks']), [self.docs[2].pk, self.docs[4].pk])
+        # Nothing is sent after if nothing was deleted
+        Document2.objects.filter(pk=self.docs[2].pk).delete(force_policy=SOFT_DELETE)
+        self.assertEqual(post_receiver.call_count, 1)
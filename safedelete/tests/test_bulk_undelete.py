@@ -0,0 +1,155 @@
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from django.db import models
+from django.test import TestCase
+
+from ..config import SOFT_DELETE_CASCADE
+from ..models import SafeDeleteModel
+from ..signals import post_bulk_undelete, post_undelete
+
+
+class Shelf(SafeDeleteModel):
+    _safedelete_policy = SOFT_DELETE_CASCADE
+
+
+class Binder(SafeDeleteModel):
+    _safedelete_policy = SOFT_DELETE_CASCADE
+    shelf = models.ForeignKey(Shelf, on_delete=models.CASCADE)
+
+
+class Sheet(SafeDeleteModel):
+    binder = models.ForeignKey(Binder, on_delete=models.CASCADE)
+    parent = models.ForeignKey('self', null=True, on_delete=models.CASCADE)
+
+
+class BulkUndeleteTestCase(TestCase):
+
+    def setUp(self):
+        self.shelves = [Shelf.objects.create() for _ in range(2)]
+        self.binders = [Binder.objects.create(shelf=shelf) for shelf in self.shelves for _ in range(2)]
+        self.sheets = [Sheet.objects.create(binder=binder) for binder in self.binders for _ in range(3)]
+        Shelf.objects.all().delete()
+
+    def test_undelete(self):
+        with self.assertNumQueries(4):
+            # - 2 for the transaction (savepoint and release savepoint)
+            # - 1 to load the primary keys of the deleted objects
+            # - 1 update
+            result = Sheet.deleted_objects.filter(binder=self.binders[0]).undelete()
+        self.assertEqual(result, (3, {'safedelete.Sheet': 3}))
+        self.assertEqual(Sheet.objects.count(), 3)
+        self.assertEqual(Binder.objects.count(), 0)
+
+    def test_undelete_cascade(self):
+        result = Shelf.deleted_objects.filter(pk=self.shelves[0].pk).undelete()
+        self.assertEqual(result, (9, {'safedelete.Shelf': 1, 'safedelete.Binder': 2, 'safedelete.Sheet': 6}))
+        self.assertEqual(Shelf.objects.count(), 1)
+        self.assertEqual(Binder.objects.count(), 2)
+        self.assertEqual(Sheet.objects.count(), 6)
+
+    def test_undelete_only_deleted_objects(self):
+        Sheet.deleted_objects.filter(pk=self.sheets[0].pk).undelete()
+        result = Sheet.all_objects.all().undelete()
+        self.assertEqual(result[0], len(self.sheets) - 1)
+        self.assertEqual(Sheet.objects.count(), len(self.sheets))
+        self.assertEqual(Sheet.objects.all().undelete(), (0, {}))
+
+    def test_signals(self):
+        with mock.patch.object(post_undelete, 'send') as mock_undelete, \
+                mock.patch.object(post_bulk_undelete, 'send') as mock_bulk_undelete:
+            Binder.deleted_objects.filter(pk=self.binders[0].pk).undelete()
+        mock_undelete.assert_not_called()
+        self.assertEqual(mock_bulk_undelete.call_count, 2)
+        mock_bulk_undelete.assert_any_call(sender=Binder, pks=[self.binders[0].pk], using='default')
+        mock_bulk_undelete.assert_any_call(
+            sender=Sheet, pks=[sheet.pk for sheet in self.sheets[:3]], using='default'
+        )
+
+    def test_not_bulk(self):
+        with mock.patch.object(post_undelete, 'send') as mock_undelete, \
+                mock.patch.object(post_bulk_undelete, 'send') as mock_bulk_undelete:
+            result = Binder.deleted_objects.filter(pk=self.binders[0].pk).undelete(bulk=False)
+        self.assertEqual(result, (4, {'safedelete.Binder': 1, 'safedelete.Sheet': 3}))
+        self.assertEqual(mock_undelete.call_count, 4)
+        mock_bulk_undelete.assert_not_called()
+        self.assertEqual(Sheet.objects.count(), 3)
+
+    def test_not_bulk_without_savepoints(self):
+        with self.assertNumQueries(9):
+            # - 2 for the transaction (savepoint and release savepoint), the undeletes of the objects join it
+            # - 1 select of the deleted binders and 1 update for the binder
+            # - 2 selects of the related sheets
+            # - 1 update for each sheet
+            Binder.deleted_objects.filter(pk=self.binders[0].pk).undelete(bulk=False)
+
+
+class SetBasedUndeleteTestCase(TestCase):
+
+    def setUp(self):
+        self.shelves = [Shelf.objects.create() for _ in range(2)]
+        self.binders = [Binder.objects.create(shelf=shelf) for shelf in self.shelves for _ in range(2)]
+        self.sheets = [Sheet.objects.create(binder=binder) for binder in self.binders for _ in range(3)]
+        # An attachment in another binder, deleted with its parent
+        self.attachment = Sheet.objects.create(binder=self.binders[3], parent=self.sheets[0])
+        Shelf.objects.all().delete()
+
+    def test_same_result_as_default_cascade(self):
+        Shelf.deleted_objects.filter(pk=self.shelves[0].pk).undelete(set_based=True)
+        set_based_state = [
+            sorted(model.objects.values_list('pk', flat=True))
+            for model in (Shelf, Binder, Sheet)
+        ]
+        Shelf.objects.all().delete()
+        Shelf.deleted_objects.filter(pk=self.shelves[0].pk).undelete()
+        default_state = [
+            sorted(model.objects.values_list('pk', flat=True))
+            for model in (Shelf, Binder, Sheet)
+        ]
+        self.assertEqual(set_based_state, default_state)
+        self.assertIn(self.attachment.pk, set_based_state[2])
+
+    def test_result(self):
+        result = Shelf.deleted_objects.all().undelete(set_based=True)
+        self.assertEqual(result, (19, {'safedelete.Shelf': 2, 'safedelete.Binder': 4, 'safedelete.Sheet': 13}))
+        self.assertEqual(Sheet.deleted_objects.count(), 0)
+        self.assertEqual(Shelf.deleted_objects.all().undelete(set_based=True), (0, {}))
+
+    def test_number_of_queries_does_not_depend_on_the_number_of_objects(self):
+        Sheet.all_objects.bulk_create([
+            Sheet(binder_id=self.binders[0].pk, deleted=self.sheets[0].deleted) for _ in range(10)
+        ])
+        with self.assertNumQueries(8):
+            # - 2 for the transaction (savepoint and release savepoint)
+            # - 3 updates (binder, sheet and shelf)
+            # - 2 to load the primary keys for the self-referencing relation (the attachment, then nothing)
+            # - 1 update for the attachment
+            Shelf.deleted_objects.all().undelete(set_based=True)
+        self.assertEqual(Sheet.deleted_objects.count(), 0)
+
+    def test_signals(self):
+        with mock.patch.object(post_undelete, 'send') as mock_undelete, \
+                mock.patch.object(post_bulk_undelete, 'send') as mock_bulk_undelete:
+            Binder.deleted_objects.filter(pk=self.binders[0].pk).undelete(set_based=True)
+        mock_undelete.assert_not_called()
+        # Without receivers the primary keys are not loaded and no signal is sent
+        mock_bulk_undelete.assert_not_called()
+
+        receiver = mock.Mock()
+        post_bulk_undelete.connect(receiver, sender=Sheet)
+        self.addCleanup(post_bulk_undelete.disconnect, receiver, sender=Sheet)
+        Binder.deleted_objects.filter(pk=self.binders[1].pk).undelete(set_based=True)
+        receiver.assert_called_once_with(
+            signal=post_bulk_undelete, sender=Sheet, pks=[sheet.pk for sheet in self.sheets[3:6]], using='default'
+        )
+
+    def test_instance(self):
+        binder = Binder.deleted_objects.get(pk=self.binders[0].pk)
+        with mock.patch.object(post_undelete, 'send') as mock_undelete:
+            result = binder.undelete(set_based=True)
+        self.assertEqual(result, (5, {'safedelete.Binder': 1, 'safedelete.Sheet': 4}))
+        # Only the instance is saved
+        self.assertEqual(mock_undelete.call_count, 1)
+        self.assertEqual(Sheet.objects.count(), 4)
@@ -0,0 +1,75 @@
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from django.db import models
+from django.test import TestCase
+
+from ..collector import get_cascade_plan
+from ..config import SOFT_DELETE_CASCADE
+from ..models import SafeDeleteModel
+from .test_set_based_cascade import Badge, BadgeScan, Company, Contract, Department, Employee, Folder, Invoice
+
+
+class PlannedProject(SafeDeleteModel):
+    pass
+
+
+class PlannedNote(SafeDeleteModel):
+    # Related to the project before the task, and to the task
+    project = models.ForeignKey(PlannedProject, on_delete=models.CASCADE)
+    task = models.ForeignKey('PlannedTask', on_delete=models.CASCADE)
+
+
+class PlannedTask(SafeDeleteModel):
+    project = models.ForeignKey(PlannedProject, on_delete=models.CASCADE)
+
+
+class CascadePlanTestCase(TestCase):
+
+    def test_edges(self):
+        plan = get_cascade_plan(Company)
+        self.assertEqual(
+            [(edge.model, edge.on_delete) for edge in plan.edges],
+            [
+                (Department, models.CASCADE),
+                (Folder, models.CASCADE),
+                (Invoice, models.PROTECT),
+                (Contract, models.SET_NULL),
+            ]
+        )
+        self.assertTrue(all(edge.is_safedelete for edge in plan.edges))
+        self.assertTrue(plan.has_cascade)
+        self.assertTrue(plan.needs_collector)
+
+        plan = get_cascade_plan(Employee)
+        self.assertEqual([edge.field.name for edge in plan.edges], ['employee', 'mentor'])
+        self.assertFalse(plan.edges[0].is_safedelete)
+
+    def test_cascade_models(self):
+        self.assertEqual(
+            get_cascade_plan(Company).cascade_models,
+            [Company, Folder, Department, Employee, Badge, BadgeScan]
+        )
+        self.assertEqual(get_cascade_plan(Contract).cascade_models, [Contract])
+        # Each model is before the models it cascades to
+        self.assertEqual(get_cascade_plan(PlannedProject).cascade_models, [PlannedProject, PlannedTask, PlannedNote])
+
+    def test_has_field_updates(self):
+        self.assertTrue(get_cascade_plan(Company).has_field_updates)
+        # Through the employee mentor
+        self.assertTrue(get_cascade_plan(Department).has_field_updates)
+        self.assertFalse(get_cascade_plan(Folder).has_field_updates)
+
+    def test_plan_is_reused(self):
+        self.assertIs(get_cascade_plan(Company), get_cascade_plan(Company))
+
+    @mock.patch('safedelete.utils.get_collector')
+    def test_no_collector_without_relations(self, mock_get_collector):
+        contract = Contract.objects.create()
+        result = contract.delete(force_policy=SOFT_DELETE_CASCADE)
+        self.assertEqual(result, (1, {'safedelete.Contract': 1}))
+        contract.undelete(force_policy=SOFT_DELETE_CASCADE)
+        Contract.objects.all().delete(force_policy=SOFT_DELETE_CASCADE)
+        self.assertEqual(mock_get_collector.call_count, 0)
@@ -0,0 +1,73 @@
+from django.db import connection, models
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..collector import get_collector, get_key_fields
+from ..config import HARD_DELETE_NOCASCADE, SOFT_DELETE_CASCADE
+from ..models import SafeDeleteModel
+
+
+class Library(SafeDeleteModel):
+    _safedelete_policy = SOFT_DELETE_CASCADE
+
+
+class Book(SafeDeleteModel):
+    library = models.ForeignKey(Library, on_delete=models.CASCADE)
+    title = models.CharField(max_length=100)
+
+
+class Review(SafeDeleteModel):
+    book = models.ForeignKey(Book, null=True, on_delete=models.SET_NULL)
+    text = models.TextField()
+
+
+class SafeDeleteCollectorTestCase(TestCase):
+
+    def setUp(self):
+        self.library = Library.objects.create()
+        self.books = [Book.objects.create(library=self.library, title='Book {}'.format(i)) for i in range(3)]
+        self.review = Review.objects.create(book=self.books[0], text='Great')
+        self.deleted_review = Review.objects.create(book=self.books[0], text='Bad')
+        self.deleted_review.delete(force_policy=SOFT_DELETE_CASCADE)
+
+    def test_key_fields(self):
+        self.assertEqual(set(get_key_fields(Review)), {'id', 'book', 'deleted'})
+
+    def test_only_keys(self):
+        with CaptureQueriesContext(connection) as queries:
+            collector = get_collector([self.library], only_keys=True)
+        self.assertEqual(sorted(book.pk for book in collector.data[Book]), [book.pk for book in self.books])
+        selects = [query['sql'] for query in queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        for sql in selects:
+            self.assertNotIn('"title"', sql)
+            self.assertNotIn('"text"', sql)
+
+    def test_skip_deleted(self):
+        # The SET_NULL relation does not need to look at the soft deleted reviews
+        collector = get_collector([self.books[0]], skip_deleted=True)
+        updated = [
+            instance.pk
+            for (field, value), instances in collector.field_updates[Review].items()
+            for instance in instances
+        ]
+        self.assertEqual(updated, [self.review.pk])
+
+        collector = get_collector([self.books[0]])
+        updated = [
+            instance.pk
+            for (field, value), instances in collector.field_updates[Review].items()
+            for instance in instances
+        ]
+        self.assertEqual(sorted(updated), sorted([self.review.pk, self.deleted_review.pk]))
+
+    def test_queryset_delete_keeps_deleted_rows(self):
+        Library.objects.all().delete()
+        self.assertEqual(Book.objects.count(), 0)
+        self.assertEqual(Review.objects.get().book_id, None)
+        # The review deleted beforehand keeps its book
+        self.assertEqual(Review.all_objects.get(pk=self.deleted_review.pk).book_id, self.books[0].pk)
+
+    def test_hard_delete_still_collects_deleted_rows(self):
+        Book.all_objects.filter(pk=self.books[0].pk).delete(force_policy=HARD_DELETE_NOCASCADE)
+        self.assertEqual(Review.all_objects.filter(book__isnull=True).count(), 2)
@@ -0,0 +1,122 @@
+import threading
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from django.db import models, transaction
+from django.test import TransactionTestCase, override_settings
+
+from .. import dispatch
+from ..config import SOFT_DELETE_CASCADE
+from ..models import SafeDeleteModel
+from ..signals import post_bulk_softdelete, post_bulk_undelete, post_softdelete, pre_softdelete
+
+
+class DispatchedFolder(SafeDeleteModel):
+    _safedelete_policy = SOFT_DELETE_CASCADE
+
+
+class DispatchedFile(SafeDeleteModel):
+    folder = models.ForeignKey(DispatchedFolder, on_delete=models.CASCADE)
+
+
+@override_settings(SAFE_DELETE_DEFERRED_SIGNALS=True)
+class DeferredSignalsTestCase(TransactionTestCase):
+    multi_db = True  # Django < 2.2
+    databases = {'default', 'other'}
+
+    def setUp(self):
+        self.folders = [DispatchedFolder.objects.create() for _ in range(2)]
+        self.files = [DispatchedFile.objects.create(folder=folder) for folder in self.folders for _ in range(2)]
+        self.sent = []
+        for signal in (post_bulk_softdelete, post_bulk_undelete):
+            signal.connect(self.receiver)
+            self.addCleanup(signal.disconnect, self.receiver)
+
+    def receiver(self, signal, sender, pks, using, **kwargs):
+        self.sent.append((signal, sender, sorted(pks)))
+
+    def test_sent_on_commit(self):
+        with mock.patch.object(post_softdelete, 'send') as mock_softdelete:
+            with transaction.atomic():
+                for folder in self.folders:
+                    folder.delete()
+                self.assertEqual(self.sent, [])
+        mock_softdelete.assert_not_called()
+        # One per model and per delete
+        self.assertEqual(self.sent, [
+            (post_bulk_softdelete, DispatchedFolder, [self.folders[0].pk]),
+            (post_bulk_softdelete, DispatchedFile, [self.files[0].pk, self.files[1].pk]),
+            (post_bulk_softdelete, DispatchedFolder, [self.folders[1].pk]),
+            (post_bulk_softdelete, DispatchedFile, [self.files[2].pk, self.files[3].pk]),
+        ])
+
+    def test_coalesced_per_operation(self):
+        DispatchedFolder.objects.all().delete()
+        self.assertEqual(self.sent, [
+            (post_bulk_softdelete, DispatchedFolder, [folder.pk for folder in self.folders]),
+            (post_bulk_softdelete, DispatchedFile, [file.pk for file in self.files]),
+        ])
+        del self.sent[:]
+        DispatchedFolder.deleted_objects.all().undelete()
+        self.assertEqual(self.sent, [
+            (post_bulk_undelete, DispatchedFolder, [folder.pk for folder in self.folders]),
+            (post_bulk_undelete, DispatchedFile, [file.pk for file in self.files]),
+        ])
+
+    def test_not_sent_on_rollback(self):
+        with transaction.atomic():
+            self.folders[0].delete()
+            try:
+                with transaction.atomic():
+                    self.folders[1].delete()
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual([sender for _, sender, _ in self.sent], [DispatchedFolder, DispatchedFile])
+        self.assertEqual(self.sent[0][2], [self.folders[0].pk])
+
+    def test_outside_of_an_operation(self):
+        self.folders[0].delete()
+        del self.sent[:]
+        with transaction.atomic():
+            DispatchedFolder.deleted_objects.get().save()
+            self.assertEqual(self.sent, [])
+        self.assertEqual(self.sent, [(post_bulk_undelete, DispatchedFolder, [self.folders[0].pk])])
+
+    def test_per_database(self):
+        other_folder = DispatchedFolder.objects.using('other').create()
+
+        def delete_other_folder(instance, using, **kwargs):
+            if using == 'default':
+                other_folder.delete()
+
+        pre_softdelete.connect(delete_other_folder, sender=DispatchedFolder)
+        self.addCleanup(pre_softdelete.disconnect, delete_other_folder, sender=DispatchedFolder)
+        databases = []
+        receiver = mock.Mock(side_effect=lambda using, **kwargs: databases.append(using))
+        post_bulk_softdelete.connect(receiver, sender=DispatchedFolder)
+        self.addCleanup(post_bulk_softdelete.disconnect, receiver, sender=DispatchedFolder)
+        with transaction.atomic(using='other'):
+            self.folders[0].delete()
+            # The folder of the other database is sent when its own transaction commits
+            self.assertEqual(databases, ['default'])
+        self.assertEqual(databases, ['default', 'other'])
+        self.assertEqual(receiver.call_args_list[1][1]['pks'], [other_folder.pk])
+
+    @override_settings(SAFE_DELETE_SIGNAL_WORKERS=2)
+    def test_workers(self):
+        threads = []
+        receiver = mock.Mock(side_effect=lambda **kwargs: threads.append(threading.current_thread()))
+        post_bulk_softdelete.connect(receiver, sender=DispatchedFile)
+        self.addCleanup(post_bulk_softdelete.disconnect, receiver, sender=DispatchedFile)
+        self.addCleanup(setattr, dispatch, '_executor', None)
+        with mock.patch.object(dispatch.connections, 'close_all') as close_all:
+            self.folders[0].delete()
+            dispatch._get_executor().shutdown(wait=True)
+        self.assertEqual(receiver.call_count, 1)
+        self.assertNotEqual(threads, [threading.current_thread()])
+        # The connections of the worker are closed
+        self.assertEqual(close_all.call_count, 1)
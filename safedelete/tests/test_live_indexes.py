@@ -0,0 +1,188 @@
+from unittest import skipUnless
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, models, transaction
+from django.db.migrations.state import ModelState, ProjectState
+from django.test import TestCase, TransactionTestCase
+
+from ..compat import INDEX_TAKES_CONDITION
+from ..config import DEFAULT_DELETED
+from ..indexes import LiveIndex, LiveUniqueConstraint, live_index
+from ..models import SafeDeleteModel
+from ..operations import SwapDeletedIndex
+from .test_tombstones import ConvertedFile
+
+
+# The live indexes need Django 2.2, declaring them raises ImproperlyConfigured before
+if INDEX_TAKES_CONDITION:
+    class Writer(SafeDeleteModel):
+        pass
+
+    class IndexedArticle(SafeDeleteModel):
+        _safedelete_live_indexes = ['slug', ('author', 'published')]
+        slug = models.SlugField(db_index=False)
+        author = models.ForeignKey(Writer, on_delete=models.CASCADE)
+        published = models.DateTimeField(null=True)
+
+
+@skipUnless(INDEX_TAKES_CONDITION, "The partial indexes require Django 2.2 or later.")
+class LiveIndexesTestCase(TestCase):
+
+    def get_constraints(self, model):
+        with connection.cursor() as cursor:
+            return connection.introspection.get_constraints(cursor, model._meta.db_table)
+
+    def test_indexes(self):
+        indexes = [index for index in IndexedArticle._meta.indexes if isinstance(index, LiveIndex)]
+        self.assertEqual([index.fields for index in indexes], [['slug'], ['author', 'published']])
+        for index in indexes:
+            self.assertTrue(index.name.endswith('_liv'))
+            self.assertEqual(index.condition, models.Q(deleted=DEFAULT_DELETED))
+        # The live indexes replace the index of the deleted field
+        self.assertFalse(IndexedArticle._meta.get_field('deleted').db_index)
+        self.assertTrue(Writer._meta.get_field('deleted').db_index)
+
+    def test_indexes_are_created(self):
+        constraints = self.get_constraints(IndexedArticle)
+        for index in IndexedArticle._meta.indexes:
+            self.assertIn(index.name, constraints)
+        self.assertFalse(any(
+            constraint['columns'] == ['deleted'] for constraint in constraints.values() if constraint['index']
+        ))
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sql FROM sqlite_master WHERE name = %s", [IndexedArticle._meta.indexes[0].name])
+            self.assertIn('WHERE', cursor.fetchone()[0])
+
+    def test_migrations_state(self):
+        state = ModelState.from_model(IndexedArticle)
+        self.assertEqual(
+            [index.name for index in state.options['indexes']],
+            [index.name for index in IndexedArticle._meta.indexes]
+        )
+        path, args, kwargs = state.options['indexes'][0].deconstruct()
+        self.assertEqual(path, 'safedelete.indexes.LiveIndex')
+        self.assertEqual(kwargs['condition'], models.Q(deleted=DEFAULT_DELETED))
+
+    def test_fallback_without_partial_indexes(self):
+        index = IndexedArticle._meta.indexes[0]
+        editor = connection.schema_editor()
+        with mock.patch.object(connection.features, 'supports_partial_indexes', False):
+            sql = str(index.create_sql(IndexedArticle, editor))
+        self.assertNotIn('WHERE', sql)
+        self.assertIn('"slug", "deleted"', sql)
+
+    def test_fallback_with_tombstone_field(self):
+        # The tombstone of ConvertedFile reads the deleted_flag field
+        index = live_index(ConvertedFile, ['folder'])
+        editor = connection.schema_editor()
+        with mock.patch.object(connection.features, 'supports_partial_indexes', False):
+            sql = str(index.create_sql(ConvertedFile, editor))
+        self.assertIn('"folder_id", "deleted_flag"', sql)
+
+
+@skipUnless(INDEX_TAKES_CONDITION, "The partial indexes require Django 2.2 or later.")
+class SwapDeletedIndexTestCase(TransactionTestCase):
+    available_apps = ['safedelete']
+
+    def setUp(self):
+        self.state = ProjectState()
+        self.state.add_model(ModelState('safedelete', 'Page', [
+            ('id', models.AutoField(primary_key=True)),
+            ('deleted', models.DateTimeField(editable=False, default=DEFAULT_DELETED, db_index=True)),
+            ('slug', models.SlugField(db_index=False)),
+        ]))
+        with connection.schema_editor() as editor:
+            editor.create_model(self.state.apps.get_model('safedelete', 'Page'))
+        self.addCleanup(self.delete_model)
+
+    def delete_model(self):
+        with connection.schema_editor() as editor:
+            editor.delete_model(self.state.apps.get_model('safedelete', 'Page'))
+
+    def get_indexes(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, 'safedelete_page')
+        return sorted(constraint['columns'] for constraint in constraints.values() if constraint['index'])
+
+    def test_swap(self):
+        index = live_index(self.state.apps.get_model('safedelete', 'Page'), ['slug'])
+        operation = SwapDeletedIndex('Page', indexes=[index])
+        new_state = self.state.clone()
+        operation.state_forwards('safedelete', new_state)
+        self.assertFalse(new_state.models['safedelete', 'page'].get_field_by_name('deleted').db_index)
+        self.assertEqual(new_state.models['safedelete', 'page'].options['indexes'], [index])
+
+        self.assertEqual(self.get_indexes(), [['deleted']])
+        with connection.schema_editor() as editor:
+            operation.database_forwards('safedelete', editor, self.state, new_state)
+        self.assertEqual(self.get_indexes(), [['slug']])
+        with connection.schema_editor() as editor:
+            operation.database_backwards('safedelete', editor, new_state, self.state)
+        self.assertEqual(self.get_indexes(), [['deleted']])
+
+    def test_deconstruct(self):
+        index = live_index(self.state.apps.get_model('safedelete', 'Page'), ['slug'])
+        name, args, kwargs = SwapDeletedIndex('Page', indexes=[index]).deconstruct()
+        self.assertEqual(name, 'SwapDeletedIndex')
+        self.assertEqual(args, ('Page',))
+        self.assertEqual(kwargs, {'indexes': [index]})
+
+
+if INDEX_TAKES_CONDITION:
+    class Member(SafeDeleteModel):
+        _safedelete_unique = ['email', ('team', 'nickname')]
+        email = models.EmailField()
+        team = models.CharField(max_length=100)
+        nickname = models.CharField(max_length=100)
+
+
+@skipUnless(INDEX_TAKES_CONDITION, "The unique constraints with a condition require Django 2.2 or later.")
+class LiveUniqueConstraintsTestCase(TestCase):
+
+    def test_constraints(self):
+        constraints = Member._meta.constraints
+        self.assertEqual([constraint.fields for constraint in constraints], [('email',), ('team', 'nickname')])
+        for constraint in constraints:
+            self.assertIsInstance(constraint, LiveUniqueConstraint)
+            self.assertEqual(constraint.condition, models.Q(deleted=DEFAULT_DELETED))
+        self.assertFalse(Member.has_unique_fields())
+        self.assertEqual(len(ModelState.from_model(Member).options['constraints']), 2)
+
+    def test_unique_among_live_objects(self):
+        member = Member.objects.create(email='a@example.com', team='a', nickname='a')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Member.objects.create(email='a@example.com', team='b', nickname='b')
+        member.delete()
+        Member.objects.create(email='a@example.com', team='a', nickname='a')
+        self.assertEqual(Member.all_objects.filter(email='a@example.com').count(), 2)
+
+    def test_update_or_create(self):
+        Member.objects.create(email='a@example.com', team='a', nickname='a').delete()
+        with self.assertNumQueries(6):
+            # Like a model without safedelete, no query looks for the deleted objects:
+            # - 4 for the transactions (savepoints and release savepoints)
+            # - 1 select and 1 insert
+            member, created = Member.objects.update_or_create(email='a@example.com', defaults={'team': 'b'})
+        self.assertTrue(created)
+        self.assertEqual(Member.all_objects.count(), 2)
+
+    def test_validate_unique(self):
+        Member.objects.create(email='a@example.com', team='a', nickname='a')
+        self.assertRaises(ValidationError, Member(email='a@example.com', team='b', nickname='b').validate_unique)
+        self.assertRaises(ValidationError, Member(email='b@example.com', team='a', nickname='a').validate_unique)
+        Member(email='a@example.com', team='b', nickname='b').validate_unique(exclude=['email'])
+        Member.objects.get().delete()
+        Member(email='a@example.com', team='a', nickname='a').validate_unique()
+
+    def test_fallback_without_partial_indexes(self):
+        constraint = Member._meta.constraints[0]
+        editor = connection.schema_editor()
+        with mock.patch.object(connection.features, 'supports_partial_indexes', False):
+            sql = str(constraint.create_sql(Member, editor))
+        self.assertNotIn('WHERE', sql)
+        self.assertIn('"email", "deleted"', sql)
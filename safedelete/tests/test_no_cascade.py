@@ -1,9 +1,15 @@
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
 from django.db import models
 from django.db.models.deletion import ProtectedError
 
 from .testcase import SafeDeleteTestCase
 from ..config import HARD_DELETE_NOCASCADE
 from ..models import SafeDeleteModel
+from ..utils import can_hard_delete
 
 
 class NoCascadeModel(SafeDeleteModel):
@@ -41,6 +47,20 @@ class DefaultChild(models.Model):
     )
 
 
+class SafeCascadeChild(SafeDeleteModel):
+    parent = models.ForeignKey(
+        NoCascadeModel,
+        on_delete=models.CASCADE
+    )
+
+
+class CascadeGrandChild(models.Model):
+    parent = models.ForeignKey(
+        SafeCascadeChild,
+        on_delete=models.CASCADE
+    )
+
+
 def get_default():
     return None
 
@@ -97,3 +117,48 @@ class NoCascadeTestCase(SafeDeleteTestCase):
             parent=self.instance
         )
         self.assertHardDelete(self.instance)
+
+    def test_deleted_dependent(self):
+        child = SafeCascadeChild.objects.create(parent=self.instance)
+        child.delete()
+        with self.assertNumQueries(2):
+            # One query per relation cascading from the model, stopping at the first one with a related object
+            self.assertTrue(can_hard_delete(self.instance))
+        # The deleted child is hard deleted with its parent
+        self.assertEqual(self.instance.delete()[0], 2)
+        self.assertEqual(NoCascadeModel.all_objects.count(), 0)
+        self.assertEqual(SafeCascadeChild.all_objects.count(), 0)
+
+    def test_dependent_of_deleted_dependent(self):
+        child = SafeCascadeChild.objects.create(parent=self.instance)
+        CascadeGrandChild.objects.create(parent=child)
+        child.delete()
+        self.assertFalse(can_hard_delete(self.instance))
+        self.assertSoftDelete(self.instance)
+
+    def test_queryset(self):
+        instances = [self.instance] + [NoCascadeModel.objects.create() for _ in range(3)]
+        CascadeChild.objects.create(parent=instances[1])
+        SafeCascadeChild.objects.create(parent=instances[2])
+        SafeCascadeChild.objects.create(parent=instances[3]).delete()
+        NullChild.objects.create(parent=instances[3])
+        result = NoCascadeModel.objects.all().delete()
+        # The deleted child is hard deleted with its parent
+        self.assertEqual(result[0], 5)
+        self.assertEqual(result[1]["safedelete.NoCascadeModel"], 4)
+        self.assertEqual(result[1]["safedelete.SafeCascadeChild"], 1)
+        self.assertEqual(list(NoCascadeModel.deleted_objects.order_by('pk')), instances[1:3])
+        self.assertEqual(NoCascadeModel.all_objects.count(), 2)
+        self.assertEqual(NullChild.objects.get().parent, None)
+
+    def test_queryset_without_returning(self):
+        instances = [self.instance] + [NoCascadeModel.objects.create() for _ in range(2)]
+        CascadeChild.objects.create(parent=instances[1])
+        with mock.patch('safedelete.utils.update_returning_pks') as update_returning_pks:
+            # Nothing needs the primary keys of the soft deleted objects
+            result = NoCascadeModel.objects.all().delete()
+        update_returning_pks.assert_not_called()
+        self.assertEqual(result[0], 3)
+        self.assertEqual(result[1]["safedelete.NoCascadeModel"], 3)
+        self.assertEqual(list(NoCascadeModel.deleted_objects.all()), [instances[1]])
+        self.assertEqual(NoCascadeModel.all_objects.count(), 1)
@@ -0,0 +1,86 @@
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from django.db import connection, models
+from django.db.migrations.state import ModelState, ProjectState
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..config import DEFAULT_DELETED
+from ..operations import AddDeletedField, create_index_sql
+
+
+class AddDeletedFieldTestCase(TransactionTestCase):
+    available_apps = ['safedelete']
+
+    def setUp(self):
+        self.state = ProjectState()
+        self.state.add_model(ModelState('safedelete', 'Visit', [
+            ('id', models.AutoField(primary_key=True)),
+            ('url', models.CharField(max_length=100)),
+        ]))
+        model = self.state.apps.get_model('safedelete', 'Visit')
+        with connection.schema_editor() as editor:
+            editor.create_model(model)
+        model.objects.bulk_create([model(url=str(i)) for i in range(5)])
+        self.addCleanup(self.delete_model)
+        self.operation = AddDeletedField(
+            'Visit', 'deleted', models.DateTimeField(editable=False, default=DEFAULT_DELETED, db_index=True),
+            batch_size=2,
+        )
+        self.new_state = self.state.clone()
+        self.operation.state_forwards('safedelete', self.new_state)
+
+    def delete_model(self):
+        with connection.schema_editor() as editor:
+            editor.delete_model(self.state.apps.get_model('safedelete', 'Visit'))
+
+    def get_columns(self):
+        with connection.cursor() as cursor:
+            columns = connection.introspection.get_table_description(cursor, 'safedelete_visit')
+        return {column.name: column for column in columns}
+
+    def test_add(self):
+        self.assertEqual(
+            self.new_state.models['safedelete', 'visit'].get_field_by_name('deleted').default, DEFAULT_DELETED
+        )
+        with CaptureQueriesContext(connection) as context:
+            with connection.schema_editor(atomic=False) as editor:
+                self.operation.database_forwards('safedelete', editor, self.state, self.new_state)
+        queries = [query['sql'] for query in context.captured_queries]
+        # The column is added as nullable and backfilled by chunks before the index is built
+        updates = [i for i, sql in enumerate(queries) if sql.startswith('UPDATE')]
+        create_indexes = [i for i, sql in enumerate(queries) if sql.startswith('CREATE INDEX')]
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(len(create_indexes), 1)
+        self.assertGreater(create_indexes[0], updates[-1])
+        self.assertEqual(self.new_state.apps.get_model('safedelete', 'Visit').objects.filter(
+            deleted=DEFAULT_DELETED).count(), 5)
+        self.assertFalse(self.get_columns()['deleted'].null_ok)
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, 'safedelete_visit')
+        self.assertTrue(any(
+            constraint['columns'] == ['deleted'] for constraint in constraints.values() if constraint['index']
+        ))
+
+        with connection.schema_editor() as editor:
+            self.operation.database_backwards('safedelete', editor, self.new_state, self.state)
+        self.assertNotIn('deleted', self.get_columns())
+
+    def test_concurrent_index(self):
+        model = self.new_state.apps.get_model('safedelete', 'Visit')
+        field = model._meta.get_field('deleted')
+        editor = connection.schema_editor(atomic=False)
+        self.assertNotIn('CONCURRENTLY', str(create_index_sql(editor, model, field)))
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            self.assertIn('CREATE INDEX CONCURRENTLY', str(create_index_sql(editor, model, field)))
+            # Not possible in a transaction
+            self.assertNotIn('CONCURRENTLY', str(create_index_sql(connection.schema_editor(), model, field)))
+
+    def test_deconstruct(self):
+        name, args, kwargs = self.operation.deconstruct()
+        self.assertEqual(name, 'AddDeletedField')
+        self.assertEqual(args, ('Visit', 'deleted', self.operation.field))
+        self.assertEqual(kwargs, {'batch_size': 2})
@@ -0,0 +1,152 @@
+from datetime import timedelta
+
+from django.core.management import CommandError, call_command
+from django.db import models
+from django.test import TestCase
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from ..config import SOFT_DELETE, SOFT_DELETE_CASCADE
+from ..models import SafeDeleteModel
+from ..purge import get_purge_order, purge, purge_models
+from ..tombstones import BooleanTombstone
+
+
+class PurgedBlog(SafeDeleteModel):
+    _safedelete_policy = SOFT_DELETE_CASCADE
+    _safedelete_retention = timedelta(days=30)
+
+
+class PurgedPost(SafeDeleteModel):
+    _safedelete_retention = timedelta(days=30)
+    blog = models.ForeignKey(PurgedBlog, on_delete=models.CASCADE)
+
+
+class PurgedComment(models.Model):
+    post = models.ForeignKey(PurgedPost, on_delete=models.CASCADE)
+
+
+class PurgedTag(SafeDeleteModel):
+    # No retention: the deleted tags are kept forever
+    blog = models.ForeignKey(PurgedBlog, on_delete=models.CASCADE)
+
+
+class PurgedBanner(SafeDeleteModel):
+    blog = models.ForeignKey(PurgedBlog, on_delete=models.PROTECT)
+
+
+class FlaggedPage(SafeDeleteModel):
+    _safedelete_retention = timedelta(days=30)
+    deleted = BooleanTombstone().field()
+
+
+class PurgeTestCase(TestCase):
+
+    def assertPurged(self, result, expected):
+        # Django counts the models reached by cascade even if nothing was deleted
+        self.assertEqual((result[0], {label: count for label, count in result[1].items() if count}), expected)
+
+    def setUp(self):
+        self.long_ago = timezone.now() - timedelta(days=40)
+        self.blogs = [PurgedBlog.objects.create() for _ in range(3)]
+        self.posts = [PurgedPost.objects.create(blog=blog) for blog in self.blogs for _ in range(2)]
+
+    def test_purge_order(self):
+        self.assertEqual(get_purge_order([PurgedBlog, PurgedPost]), [PurgedPost, PurgedBlog])
+        self.assertEqual(get_purge_order([PurgedPost, PurgedBlog]), [PurgedPost, PurgedBlog])
+
+    def test_purge(self):
+        self.blogs[0].delete(deleted=self.long_ago)
+        self.blogs[1].delete()
+        self.posts[4].delete(deleted=self.long_ago)
+        self.assertPurged(purge_models([PurgedBlog, PurgedPost]), (4, {
+            'safedelete.PurgedPost': 3, 'safedelete.PurgedBlog': 1,
+        }))
+        self.assertEqual(PurgedBlog.all_objects.count(), 2)
+        self.assertEqual(PurgedPost.all_objects.count(), 3)
+        self.assertEqual(purge_models([PurgedBlog, PurgedPost]), (0, {}))
+
+    def test_keep_live_dependents(self):
+        # The posts are not deleted with the blog
+        PurgedBlog.objects.filter(pk=self.blogs[0].pk).delete(force_policy=SOFT_DELETE, deleted=self.long_ago)
+        self.assertEqual(purge(PurgedBlog), (0, {}))
+        self.posts[0].delete(deleted=self.long_ago)
+        self.assertEqual(purge(PurgedBlog), (0, {}))
+        self.posts[1].delete()
+        # The post has not expired yet
+        self.assertEqual(purge(PurgedBlog), (0, {}))
+        self.assertEqual(PurgedPost.all_objects.count(), 6)
+        PurgedPost.all_objects.filter(pk=self.posts[1].pk).update(deleted=self.long_ago)
+        self.assertPurged(purge(PurgedBlog), (3, {'safedelete.PurgedBlog': 1, 'safedelete.PurgedPost': 2}))
+
+    def test_keep_dependents_without_retention(self):
+        PurgedTag.objects.create(blog=self.blogs[0])
+        self.blogs[0].delete(deleted=self.long_ago)
+        self.blogs[1].delete(deleted=self.long_ago)
+        # The deleted tag is kept forever, and so is its blog
+        self.assertPurged(purge(PurgedBlog), (3, {'safedelete.PurgedBlog': 1, 'safedelete.PurgedPost': 2}))
+        self.assertTrue(PurgedBlog.all_objects.filter(pk=self.blogs[0].pk).exists())
+        self.assertEqual(PurgedTag.all_objects.count(), 1)
+
+    def test_keep_dependents_of_other_models(self):
+        PurgedComment.objects.create(post=self.posts[0])
+        self.posts[0].delete(deleted=self.long_ago)
+        self.posts[1].delete(deleted=self.long_ago)
+        self.assertPurged(purge(PurgedPost), (1, {'safedelete.PurgedPost': 1}))
+
+    def test_keep_deleted_dependents_of_live_objects(self):
+        PurgedComment.objects.create(post=self.posts[0])
+        self.blogs[0].delete(deleted=self.long_ago)
+        # The post is deleted but its comment is not, it would be deleted by cascade
+        self.assertEqual(purge(PurgedBlog), (0, {}))
+        self.assertPurged(purge(PurgedPost), (1, {'safedelete.PurgedPost': 1}))
+        self.assertEqual(PurgedComment.objects.count(), 1)
+        PurgedComment.objects.all().delete()
+        self.assertPurged(purge_models([PurgedBlog, PurgedPost]), (2, {
+            'safedelete.PurgedPost': 1, 'safedelete.PurgedBlog': 1,
+        }))
+
+    def test_keep_protected(self):
+        PurgedBanner.objects.create(blog=self.blogs[0]).delete(deleted=self.long_ago)
+        self.blogs[0].delete(deleted=self.long_ago)
+        self.blogs[1].delete(deleted=self.long_ago)
+        # The deleted banner still protects its blog
+        self.assertPurged(purge(PurgedBlog), (3, {'safedelete.PurgedBlog': 1, 'safedelete.PurgedPost': 2}))
+        self.assertTrue(PurgedBlog.all_objects.filter(pk=self.blogs[0].pk).exists())
+
+    def test_batches(self):
+        PurgedPost.objects.all().delete(deleted=self.long_ago)
+        batches = []
+        with self.assertNumQueries(3 * 6 + 1):
+            # Per chunk, 1 select for the keys, 2 for the transaction, 1 select for the objects and 2 deletes (the
+            # comments and the posts), then 1 select for the keys
+            result = purge(PurgedPost, batch_size=2, batch_callback=batches.append)
+        self.assertPurged(result, (6, {'safedelete.PurgedPost': 6}))
+        self.assertEqual([batch.last_pk for batch in batches], [post.pk for post in self.posts[1::2]])
+        self.assertEqual([batch.result[0] for batch in batches], [2, 2, 2])
+
+    def test_dry_run(self):
+        PurgedPost.objects.all().delete(deleted=self.long_ago)
+        self.assertEqual(purge(PurgedPost, dry_run=True), (6, {'safedelete.PurgedPost': 6}))
+        self.assertEqual(PurgedPost.all_objects.count(), 6)
+
+    def test_retention(self):
+        PurgedPost.objects.all().delete(deleted=self.long_ago)
+        self.assertEqual(purge(PurgedPost, retention=timedelta(days=50)), (0, {}))
+        self.assertEqual(purge(PurgedPost, now=self.long_ago + timedelta(days=20)), (0, {}))
+        self.assertEqual(purge(PurgedPost, retention=timedelta(days=10))[0], 6)
+
+    def test_deletion_time_not_recorded(self):
+        self.assertRaises(ValueError, purge, FlaggedPage)
+
+    def test_command(self):
+        PurgedPost.objects.all().delete(deleted=self.long_ago)
+        out = StringIO()
+        call_command('safedelete_purge', 'safedelete.PurgedPost', batch_size=4, dry_run=True, stdout=out)
+        self.assertIn('safedelete.PurgedPost: 4 objects would be deleted in', out.getvalue())
+        self.assertEqual(PurgedPost.all_objects.count(), 6)
+        call_command('safedelete_purge', 'safedelete.PurgedPost', 'safedelete.PurgedBlog', stdout=out)
+        self.assertIn('6 objects deleted.', out.getvalue())
+        self.assertEqual(PurgedPost.all_objects.count(), 0)
+        self.assertRaises(CommandError, call_command, 'safedelete_purge', 'safedelete.PurgedComment')
+        self.assertRaises(CommandError, call_command, 'safedelete_purge', 'safedelete.FlaggedPage')
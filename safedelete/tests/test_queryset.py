@@ -201,3 +201,7 @@ class QuerySetTestCase(SafeDeleteTestCase):
             instance.id,
             QuerySetModel.objects.filter(id=instance.id).values_list('pk', flat=True)[0]
         )
+
+    def test_no_attribute_access_hook(self):
+        """The visibility filter is applied by the evaluation methods, not on every attribute access."""
+        self.assertIs(type(QuerySetModel.objects.all()).__getattribute__, object.__getattribute__)
@@ -268,9 +268,9 @@ class CustomQuerySetTestCase(SafeDeleteTestCase):
             self.assertEqual(other_coffees.count(), self.expected_total - len(self.AS))
 
         # Check delete the region ASIA & this should delete all countries in this region
-        with self.assertNumQueries(6 * 3 + 2):
-            # it does that many queries because each delete is wrapped in a transaction
-            # that add a savepoint and the its release in unit tests
+        with self.assertNumQueries(5):
+            # The select of the region, the savepoint and its release, and one update per model: nothing listens
+            # to the signals of the countries, so they are not deleted one by one
             result = Region.objects.get(name="ASIA").delete()
         self.assertIsNotNone(result)
         self.assertEqual(result[0], 6)
@@ -371,9 +371,8 @@ class CustomQuerySetTestCase(SafeDeleteTestCase):
             country_count += len(self.country_by_region[region.name])
         self.assertEqual(countries.count(), country_count)
 
-        with self.assertNumQueries(4 * 3 + 2):
-            # it does that many queries because each delete is wrapped in a transaction
-            # that add a savepoint and the its release in unit tests
+        with self.assertNumQueries(5):
+            # The select of the region, the savepoint and its release, and one update per model
             result = Region.objects.get(name="NORTH AMERICA").delete()
         self.assertIsNotNone(result)
         self.assertEqual(result[0], 4)
@@ -0,0 +1,35 @@
+from django.test import TestCase
+
+from ..config import DELETED_INVISIBLE, DELETED_VISIBLE_BY_FIELD, HARD_DELETE, SOFT_DELETE
+from ..registry import get_model_info, get_safedelete_models, is_safedelete_cls
+from .models import Article, Category
+from .test_queryset import OtherModel, QuerySetModel
+
+
+class RegistryTestCase(TestCase):
+
+    def test_get_safedelete_models(self):
+        models = get_safedelete_models()
+        self.assertIn(Article, models)
+        self.assertIn(Category, models)
+        self.assertIn(QuerySetModel, models)
+        self.assertNotIn(OtherModel, models)
+
+    def test_get_model_info(self):
+        info = get_model_info(Category)
+        self.assertEqual(info.model, Category)
+        self.assertEqual(info.policy, SOFT_DELETE)
+        self.assertEqual(info.visibility, DELETED_INVISIBLE)
+        self.assertEqual(info.deleted_field, Category._meta.get_field('deleted'))
+
+        info = get_model_info(QuerySetModel)
+        self.assertEqual(info.visibility, DELETED_VISIBLE_BY_FIELD)
+
+        self.assertEqual(get_model_info(Article).policy, HARD_DELETE)
+        self.assertIsNone(get_model_info(OtherModel))
+
+    def test_is_safedelete_cls(self):
+        self.assertTrue(is_safedelete_cls(Category))
+        # SafeDeleteMixin subclass
+        self.assertTrue(is_safedelete_cls(QuerySetModel))
+        self.assertFalse(is_safedelete_cls(OtherModel))
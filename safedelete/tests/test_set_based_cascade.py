@@ -0,0 +1,180 @@
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from django.db import models
+from django.db.models.deletion import ProtectedError
+from django.test import TestCase
+
+from ..config import SOFT_DELETE_CASCADE
+from ..models import SafeDeleteModel
+from ..signals import post_bulk_softdelete, pre_bulk_softdelete
+
+
+class Company(SafeDeleteModel):
+    _safedelete_policy = SOFT_DELETE_CASCADE
+
+
+class Department(SafeDeleteModel):
+    _safedelete_policy = SOFT_DELETE_CASCADE
+    company = models.ForeignKey(Company, on_delete=models.CASCADE)
+
+
+class Employee(SafeDeleteModel):
+    department = models.ForeignKey(Department, on_delete=models.CASCADE)
+    mentor = models.ForeignKey('self', null=True, on_delete=models.SET_NULL, related_name='mentees')
+
+
+class Badge(models.Model):
+    # Not a safedelete model: it is not deleted but the walk goes through it
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
+
+
+class BadgeScan(SafeDeleteModel):
+    badge = models.ForeignKey(Badge, on_delete=models.CASCADE)
+
+
+class Contract(SafeDeleteModel):
+    company = models.ForeignKey(Company, null=True, on_delete=models.SET_NULL)
+
+
+class Folder(SafeDeleteModel):
+    _safedelete_policy = SOFT_DELETE_CASCADE
+    company = models.ForeignKey(Company, null=True, on_delete=models.CASCADE)
+    parent = models.ForeignKey('self', null=True, on_delete=models.CASCADE)
+
+
+class Invoice(SafeDeleteModel):
+    company = models.ForeignKey(Company, on_delete=models.PROTECT)
+
+
+class SetBasedCascadeTestCase(TestCase):
+
+    def setUp(self):
+        self.companies = [Company.objects.create() for _ in range(3)]
+        self.departments = [
+            Department.objects.create(company=self.companies[0]),
+            Department.objects.create(company=self.companies[0]),
+            Department.objects.create(company=self.companies[1]),
+        ]
+        self.employees = [
+            Employee.objects.create(department=self.departments[0]),
+            Employee.objects.create(department=self.departments[1]),
+            Employee.objects.create(department=self.departments[2]),
+        ]
+        self.employees[2].mentor = self.employees[0]
+        self.employees[2].save()
+        self.scan = BadgeScan.objects.create(badge=Badge.objects.create(employee=self.employees[0]))
+        self.contract = Contract.objects.create(company=self.companies[0])
+
+    def test_cascade(self):
+        result = Company.objects.filter(pk=self.companies[0].pk).delete(set_based=True)
+        self.assertEqual(result[0], 6)
+        self.assertEqual(result[1], {
+            'safedelete.Company': 1,
+            'safedelete.Department': 2,
+            'safedelete.Employee': 2,
+            'safedelete.BadgeScan': 1,
+        })
+        self.assertEqual(Company.objects.count(), 2)
+        self.assertEqual(Department.objects.count(), 1)
+        self.assertEqual(Employee.objects.count(), 1)
+        self.assertEqual(Badge.objects.count(), 1)
+        self.assertEqual(BadgeScan.objects.count(), 0)
+        # The SET_NULL relations are updated on the objects that are not deleted
+        self.assertIsNone(Contract.objects.get().company)
+        self.assertIsNone(Employee.objects.get().mentor)
+
+    def test_same_result_as_default_cascade(self):
+        Company.objects.filter(pk=self.companies[0].pk).delete(set_based=True)
+        set_based_state = [
+            sorted(model.deleted_objects.values_list('pk', flat=True))
+            for model in (Company, Department, Employee, BadgeScan)
+        ]
+        Company.deleted_objects.all().undelete()
+        self.assertEqual(Company.deleted_objects.count(), 0)
+        self.assertEqual(Employee.deleted_objects.count(), 0)
+        Company.objects.filter(pk=self.companies[0].pk).delete()
+        default_state = [
+            sorted(model.deleted_objects.values_list('pk', flat=True))
+            for model in (Company, Department, Employee, BadgeScan)
+        ]
+        self.assertEqual(set_based_state, default_state)
+
+    def test_number_of_queries_does_not_depend_on_the_number_of_objects(self):
+        for _ in range(10):
+            Employee.objects.create(department=self.departments[0])
+        with self.assertNumQueries(12):
+            # - 2 for the transaction (savepoint and release savepoint)
+            # - 7 updates (department, employee, badge scan, folder, employee mentor, contract and company)
+            # - 1 exists for the protected invoices
+            # - 2 to load the primary keys for the self-referencing relations (employee mentor and folder parent)
+            Company.objects.all().delete(set_based=True)
+        self.assertEqual(Employee.objects.count(), 0)
+
+    def test_signals(self):
+        sent = []
+
+        def receiver(signal, sender, **kwargs):
+            if signal is pre_bulk_softdelete:
+                # The queryset is not evaluated yet, the objects are not deleted
+                sent.append(('pre', sender, sorted(kwargs['queryset'].values_list('pk', flat=True))))
+            else:
+                sent.append(('post', sender, sorted(kwargs['pks'])))
+
+        for signal in (pre_bulk_softdelete, post_bulk_softdelete):
+            signal.connect(receiver)
+            self.addCleanup(signal.disconnect, receiver)
+        Company.objects.filter(pk=self.companies[0].pk).delete(set_based=True)
+        department_pks = [department.pk for department in self.departments[:2]]
+        self.assertIn(('pre', Department, department_pks), sent)
+        self.assertIn(('post', Department, department_pks), sent)
+        self.assertIn(('post', Employee, [employee.pk for employee in self.employees[:2]]), sent)
+        self.assertEqual(sent[-2:], [
+            ('pre', Company, [self.companies[0].pk]),
+            ('post', Company, [self.companies[0].pk]),
+        ])
+
+    def test_no_signal_listener(self):
+        # The contracts are only updated, and without listeners for the deleted models the primary keys are not loaded
+        receiver = mock.Mock()
+        post_bulk_softdelete.connect(receiver, sender=Contract)
+        self.addCleanup(post_bulk_softdelete.disconnect, receiver, sender=Contract)
+        with self.assertNumQueries(12):
+            Company.objects.all().delete(set_based=True)
+        receiver.assert_not_called()
+
+    def test_empty_queryset(self):
+        self.assertEqual(Company.objects.filter(pk__in=[]).delete(set_based=True), (0, {}))
+        self.assertEqual(Company.objects.count(), 3)
+
+    def test_self_referencing_relation(self):
+        root = Folder.objects.create(company=self.companies[2])
+        child = Folder.objects.create(parent=root)
+        Folder.objects.create(parent=child)
+        other = Folder.objects.create()
+
+        result = Company.objects.filter(pk=self.companies[2].pk).delete(set_based=True)
+        self.assertEqual(result[1], {'safedelete.Company': 1, 'safedelete.Folder': 3})
+        self.assertEqual(list(Folder.objects.all()), [other])
+
+    def test_protected(self):
+        Invoice.objects.create(company=self.companies[1])
+        self.assertRaises(
+            ProtectedError,
+            Company.objects.filter(pk=self.companies[1].pk).delete,
+            set_based=True
+        )
+        self.assertEqual(Company.objects.count(), 3)
+        self.assertEqual(Department.objects.count(), 3)
+
+    def test_objects_deleted_by_cascade_are_not_updated(self):
+        # The mentee is deleted with its mentor: it keeps its mentor so it can be restored as it was
+        self.employees[1].mentor = self.employees[0]
+        self.employees[1].save()
+        for set_based in (False, True):
+            Company.objects.filter(pk=self.companies[0].pk).delete(set_based=set_based)
+            self.assertEqual(Employee.all_objects.get(pk=self.employees[1].pk).mentor_id, self.employees[0].pk)
+            self.assertIsNone(Employee.objects.get(pk=self.employees[2].pk).mentor_id)
+            Company.deleted_objects.all().undelete()
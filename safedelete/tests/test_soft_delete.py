@@ -6,11 +6,12 @@ except ImportError:
 from unittest import skip
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.signals import pre_save
 from django.test import override_settings
 
 from ..models import SafeDeleteMixin
 from ..models import SafeDeleteModel
-from ..config import SOFT_DELETE_CASCADE
+from ..config import DEFAULT_DELETED, SOFT_DELETE_CASCADE
 from .testcase import SafeDeleteForceTestCase
 
 
@@ -28,6 +29,11 @@ class SoftDeleteMixinModel(SafeDeleteMixin):
     pass
 
 
+class DirectUpdateModel(SafeDeleteModel):
+    _safedelete_direct_update = True
+    name = models.CharField(max_length=100)
+
+
 class UniqueSoftDeleteModel(SafeDeleteModel):
 
     name = models.CharField(
@@ -53,7 +59,7 @@ class SoftDeleteTestCase(SafeDeleteForceTestCase):
         """
         self.assertSoftDelete(SoftDeleteMixinModel.objects.create())
 
-    @mock.patch('safedelete.models.post_undelete.send')
+    @mock.patch('safedelete.signals.post_undelete.send')
     @mock.patch('safedelete.models.post_softdelete.send')
     @mock.patch('safedelete.models.pre_softdelete.send')
     def test_signals(self, mock_presoftdelete, mock_softdelete, mock_undelete):
@@ -193,3 +199,31 @@ class SoftDeleteTestCase(SafeDeleteForceTestCase):
         self.assertEqual(obj.name, 'unique-test')
         # Settings flag is active so the revived object should be interpreted as created
         self.assertEqual(created, True)
+
+    def test_direct_update(self):
+        instance = DirectUpdateModel.objects.create(name='direct')
+        receiver = mock.Mock()
+        pre_save.connect(receiver, sender=DirectUpdateModel)
+        self.addCleanup(pre_save.disconnect, receiver, sender=DirectUpdateModel)
+        instance.name = 'not saved'
+        with self.assertNumQueries(3):
+            # The savepoint of the delete and the UPDATE
+            self.assertEqual(instance.delete(), (1, {"safedelete.DirectUpdateModel": 1}))
+        receiver.assert_not_called()
+        deleted = DirectUpdateModel.deleted_objects.get()
+        self.assertEqual(deleted.name, 'direct')
+        self.assertEqual(deleted.deleted, instance.deleted)
+
+    @mock.patch('safedelete.models.post_softdelete.send')
+    @mock.patch('safedelete.models.pre_softdelete.send')
+    def test_direct_update_already_deleted(self, mock_presoftdelete, mock_softdelete):
+        instance = DirectUpdateModel.objects.create(name='direct')
+        DirectUpdateModel.objects.all().delete()
+        deleted = DirectUpdateModel.deleted_objects.get().deleted
+        with self.assertNumQueries(3):
+            self.assertEqual(instance.delete(), (0, {}))
+        mock_presoftdelete.assert_not_called()
+        mock_softdelete.assert_not_called()
+        # The instance was loaded before the delete, it is still not deleted
+        self.assertEqual(instance.deleted, DEFAULT_DELETED)
+        self.assertEqual(DirectUpdateModel.deleted_objects.get().deleted, deleted)
@@ -1,8 +1,16 @@
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
 from django.db import models
+from django.db.models.deletion import ProtectedError
+from django.db.models.signals import pre_save
 from django.test import TestCase
 
-from safedelete import SOFT_DELETE_CASCADE
+from safedelete import HARD_DELETE, SOFT_DELETE_CASCADE
 from safedelete.models import SafeDeleteModel
+from safedelete.signals import post_softdelete, pre_softdelete
 from safedelete.tests.models import Article, Author, Category
 
 
@@ -28,6 +36,22 @@ class ArticleView(CustomAbstractModel):
     article = models.ForeignKey(Article, on_delete=models.CASCADE)
 
 
+class PressReview(SafeDeleteModel):
+    article = models.ForeignKey(Article, on_delete=models.CASCADE)
+
+    def delete(self, *args, **kwargs):
+        self.__class__.deleted_pks.append(self.pk)
+        return super(PressReview, self).delete(*args, **kwargs)
+
+
+class PressSource(SafeDeleteModel):
+    pass
+
+
+class PressQuote(models.Model):
+    source = models.ForeignKey(PressSource, on_delete=models.PROTECT)
+
+
 class SimpleTest(TestCase):
 
     def setUp(self):
@@ -121,3 +145,73 @@ class SimpleTest(TestCase):
         self.assertEqual(Article.objects.count(), 3)
         self.assertEqual(Category.objects.count(), 3)
         self.assertEqual(Press.objects.count(), 1)
+
+    def test_soft_delete_cascade_without_receivers(self):
+        with mock.patch.object(pre_softdelete, 'send') as mock_presoftdelete, self.assertNumQueries(8):
+            # - 2 for the transaction (savepoint and release savepoint)
+            # - 1 update for the author
+            # - 1 select of the articles to collect their related objects
+            # - 1 update for the presses and 1 for the article views: nothing listens to their signals
+            # - 1 select of the press reviews, they override delete
+            # - 1 update for the articles
+            result = self.authors[2].delete(force_policy=SOFT_DELETE_CASCADE)
+        self.assertEqual(result, (3, {"safedelete.Author": 1, "safedelete.Article": 1, "safedelete.Press": 1}))
+        mock_presoftdelete.assert_called_once_with(sender=Author, instance=self.authors[2], using='default')
+        self.assertEqual(Press.objects.count(), 0)
+
+    def test_soft_delete_cascade_with_receivers(self):
+        for signal, author, article in ((post_softdelete, self.authors[1], self.articles[0]),
+                                        (pre_save, self.authors[2], self.articles[2])):
+            receiver = mock.Mock()
+            signal.connect(receiver, sender=Article)
+            self.addCleanup(signal.disconnect, receiver, sender=Article)
+            author.delete(force_policy=SOFT_DELETE_CASCADE)
+            self.assertIn(article.pk, [call[1]['instance'].pk for call in receiver.call_args_list])
+            self.assertEqual(Article.objects.filter(author=author).count(), 0)
+
+    def test_soft_delete_cascade_with_custom_delete(self):
+        PressReview.deleted_pks = []
+        reviews = [PressReview.objects.create(article=self.articles[1]) for _ in range(2)]
+        self.authors[1].delete(force_policy=SOFT_DELETE_CASCADE)
+        self.assertEqual(sorted(PressReview.deleted_pks), [review.pk for review in reviews])
+        self.assertEqual(PressReview.objects.count(), 0)
+
+    def test_soft_delete_cascade_without_savepoints(self):
+        PressReview.deleted_pks = []
+        reviews = [PressReview.objects.create(article=self.articles[2]) for _ in range(3)]
+        with self.assertNumQueries(11):
+            # - 2 for the transaction (savepoint and release savepoint), the deletes of the reviews join it
+            # - 1 update for the author
+            # - 1 select of the articles to collect their related objects
+            # - 1 update for the presses and 1 for the article views
+            # - 1 select of the press reviews, they override delete
+            # - 1 update for each review
+            # - 1 update for the articles
+            self.authors[2].delete(force_policy=SOFT_DELETE_CASCADE)
+        self.assertEqual(sorted(PressReview.deleted_pks), [review.pk for review in reviews])
+
+    def test_soft_delete_cascade_rollback(self):
+        PressReview.objects.create(article=self.articles[2])
+        with mock.patch.object(PressReview, 'delete', side_effect=ValueError):
+            self.assertRaises(ValueError, self.authors[2].delete, force_policy=SOFT_DELETE_CASCADE)
+        # Nothing was deleted
+        self.assertEqual(Author.objects.count(), 3)
+        self.assertEqual(Press.objects.count(), 1)
+
+    def test_soft_delete_cascade_with_failing_receiver(self):
+        source = PressSource.objects.create()
+        PressQuote.objects.create(source=source)
+
+        def receiver(instance, **kwargs):
+            # Its own delete fails, it must not break the delete that sent the signal
+            try:
+                source.delete(force_policy=HARD_DELETE)
+            except ProtectedError:
+                pass
+
+        pre_softdelete.connect(receiver, sender=Press)
+        self.addCleanup(pre_softdelete.disconnect, receiver, sender=Press)
+        self.authors[2].delete(force_policy=SOFT_DELETE_CASCADE)
+        self.assertEqual(Press.objects.count(), 0)
+        self.assertEqual(Article.objects.filter(author=self.authors[2]).count(), 0)
+        self.assertEqual(PressSource.objects.count(), 1)
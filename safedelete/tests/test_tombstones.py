@@ -0,0 +1,283 @@
+from datetime import datetime
+
+from django.core.management import CommandError, call_command
+from django.db import connection, models
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.six import StringIO
+
+from ..config import DEFAULT_DELETED, SOFT_DELETE_CASCADE
+from ..models import SafeDeleteModel
+from ..registry import get_model_info
+from ..tombstones import (BooleanTombstone, DualWriteTombstone, EpochTombstone, NullTombstone, SentinelTombstone,
+                          convert_tombstones, get_tombstone, get_tombstone_for_field)
+from ..utils import is_deleted
+
+
+class NullFolder(SafeDeleteModel):
+    _safedelete_policy = SOFT_DELETE_CASCADE
+    deleted = NullTombstone().field()
+
+
+class NullFile(SafeDeleteModel):
+    deleted = NullTombstone().field()
+    folder = models.ForeignKey(NullFolder, on_delete=models.CASCADE)
+    name = models.CharField(max_length=100, unique=True)
+
+
+class BooleanFolder(SafeDeleteModel):
+    _safedelete_policy = SOFT_DELETE_CASCADE
+    deleted = BooleanTombstone().field()
+
+
+class BooleanFile(SafeDeleteModel):
+    deleted = BooleanTombstone().field()
+    folder = models.ForeignKey(BooleanFolder, on_delete=models.CASCADE)
+    name = models.CharField(max_length=100, unique=True)
+
+
+class EpochFolder(SafeDeleteModel):
+    _safedelete_policy = SOFT_DELETE_CASCADE
+    deleted = EpochTombstone().field()
+
+
+class EpochFile(SafeDeleteModel):
+    deleted = EpochTombstone().field()
+    folder = models.ForeignKey(EpochFolder, on_delete=models.CASCADE)
+    name = models.CharField(max_length=100, unique=True)
+
+
+class ExplicitTombstoneModel(SafeDeleteModel):
+    _safedelete_tombstone = NullTombstone()
+    deleted = models.DateTimeField(null=True, blank=True)
+
+
+class ConvertedFolder(SafeDeleteModel):
+    _safedelete_policy = SOFT_DELETE_CASCADE
+    _safedelete_tombstone = DualWriteTombstone(SentinelTombstone(), EpochTombstone('deleted_epoch'))
+    deleted_epoch = EpochTombstone().field()
+
+
+class ConvertedFile(SafeDeleteModel):
+    _safedelete_tombstone = DualWriteTombstone(BooleanTombstone('deleted_flag'), NullTombstone())
+    deleted = NullTombstone().field()
+    deleted_flag = BooleanTombstone().field()
+    folder = models.ForeignKey(ConvertedFolder, on_delete=models.CASCADE)
+
+
+class ConvertedNote(SafeDeleteModel):
+    _safedelete_tombstone = DualWriteTombstone(SentinelTombstone(), NullTombstone('deleted_at'))
+    deleted_at = NullTombstone().field()
+
+
+class TombstoneTestCase(TestCase):
+
+    def test_tombstone_for_field(self):
+        self.assertIsInstance(get_tombstone_for_field(models.DateTimeField(default=DEFAULT_DELETED)), SentinelTombstone)
+        self.assertIsInstance(get_tombstone_for_field(models.DateTimeField(null=True)), NullTombstone)
+        self.assertIsInstance(get_tombstone_for_field(models.BooleanField(default=False)), BooleanTombstone)
+        self.assertIsInstance(get_tombstone_for_field(models.PositiveIntegerField(default=0)), EpochTombstone)
+
+    def test_get_tombstone(self):
+        self.assertEqual(get_tombstone(NullFolder), NullTombstone())
+        self.assertEqual(get_tombstone(ExplicitTombstoneModel), NullTombstone())
+        self.assertEqual(get_model_info(EpochFile).tombstone, EpochTombstone())
+
+    def test_epoch(self):
+        self.assertEqual(EpochTombstone().deleted_value(datetime(1970, 1, 2)), 86400)
+
+
+class TombstoneEncodingMixin(object):
+    folder_model = None
+    file_model = None
+
+    def setUp(self):
+        self.tombstone = get_tombstone(self.folder_model)
+        self.folders = [self.folder_model.objects.create() for _ in range(2)]
+        self.files = [
+            self.file_model.objects.create(folder=folder, name='{}-{}'.format(folder.pk, i))
+            for folder in self.folders for i in range(2)
+        ]
+
+    def test_delete(self):
+        self.folders[0].delete()
+        self.assertTrue(is_deleted(self.folders[0]))
+        self.assertEqual(self.folder_model.objects.count(), 1)
+        self.assertEqual(self.folder_model.deleted_objects.count(), 1)
+        self.assertEqual(self.folder_model.all_objects.count(), 2)
+        self.assertEqual(self.file_model.objects.count(), 2)
+        self.assertEqual(self.file_model.deleted_objects.count(), 2)
+
+    def test_queryset_delete(self):
+        self.assertEqual(self.folder_model.objects.filter(pk=self.folders[0].pk).delete()[0], 3)
+        self.assertEqual(self.file_model.objects.count(), 2)
+        self.folder_model.objects.all().delete(set_based=True)
+        self.assertEqual(self.file_model.objects.count(), 0)
+        self.assertEqual(self.file_model.deleted_objects.count(), 4)
+
+    def test_undelete(self):
+        self.folder_model.objects.all().delete()
+        self.folder_model.deleted_objects.filter(pk=self.folders[0].pk).undelete()
+        self.assertEqual(self.file_model.objects.count(), 2)
+        self.folder_model.deleted_objects.all().undelete(set_based=True)
+        self.assertEqual(self.file_model.objects.count(), 4)
+        self.assertEqual(self.file_model.deleted_objects.count(), 0)
+        folder = self.folder_model.objects.get(pk=self.folders[0].pk)
+        self.assertFalse(is_deleted(folder))
+        self.assertEqual(folder.deleted, self.tombstone.live_value)
+
+    def test_instance_undelete(self):
+        self.folders[0].delete()
+        self.folders[0].undelete()
+        self.assertFalse(is_deleted(self.folders[0]))
+        self.assertEqual(self.file_model.objects.count(), 4)
+
+    def test_update_or_create(self):
+        self.files[0].delete()
+        obj, created = self.file_model.objects.update_or_create(name=self.files[0].name)
+        self.assertFalse(created)
+        self.assertEqual(obj.pk, self.files[0].pk)
+        self.assertFalse(is_deleted(obj))
+
+    def test_related_manager(self):
+        self.files[0].delete()
+        related_manager = getattr(self.folders[0], self.file_model._meta.model_name + '_set')
+        self.assertEqual(list(related_manager.all()), [self.files[1]])
+
+
+class NullTombstoneTestCase(TombstoneEncodingMixin, TestCase):
+    folder_model = NullFolder
+    file_model = NullFile
+
+    def test_is_null(self):
+        self.assertIsNone(self.folders[0].deleted)
+        self.folders[0].delete()
+        self.assertIsNotNone(NullFolder.all_objects.get(pk=self.folders[0].pk).deleted)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(len(NullFolder.objects.all()), 1)
+        self.assertIn('IS NULL', context.captured_queries[0]['sql'])
+
+    def test_undelete_operation(self):
+        self.folders[0].delete()
+        folder = NullFolder.deleted_objects.get(pk=self.folders[0].pk)
+        self.assertEqual(NullFolder.undelete_operation(folder.deleted)[0], 3)
+
+
+class BooleanTombstoneTestCase(TombstoneEncodingMixin, TestCase):
+    folder_model = BooleanFolder
+    file_model = BooleanFile
+
+    def test_flag(self):
+        self.folders[0].delete()
+        self.assertIs(BooleanFolder.all_objects.get(pk=self.folders[0].pk).deleted, True)
+
+    def test_undelete_operation(self):
+        self.folders[0].delete()
+        # The deletion time is not recorded
+        self.assertRaises(ValueError, BooleanFolder.undelete_operation, True)
+
+
+class EpochTombstoneTestCase(TombstoneEncodingMixin, TestCase):
+    folder_model = EpochFolder
+    file_model = EpochFile
+
+    def test_epoch(self):
+        self.folders[0].delete()
+        deleted = EpochFolder.all_objects.get(pk=self.folders[0].pk).deleted
+        self.assertGreater(deleted, 0)
+        self.assertEqual(EpochFile.deleted_objects.filter(deleted=deleted).count(), 2)
+
+    def test_undelete_operation(self):
+        self.folders[0].delete()
+        folder = EpochFolder.deleted_objects.get(pk=self.folders[0].pk)
+        # The deletes of the same second share the same value
+        self.assertRaises(ValueError, EpochFolder.undelete_operation, folder.deleted)
+        self.assertEqual(EpochFolder.deleted_objects.count(), 1)
+
+
+class DualWriteTombstoneTestCase(TestCase):
+
+    def setUp(self):
+        self.folders = [ConvertedFolder.objects.create() for _ in range(5)]
+        self.files = [ConvertedFile.objects.create(folder=folder) for folder in self.folders]
+
+    def test_dual_write(self):
+        self.folders[0].delete()
+        folder = ConvertedFolder.all_objects.get(pk=self.folders[0].pk)
+        self.assertNotEqual(folder.deleted, DEFAULT_DELETED)
+        self.assertEqual(folder.deleted_epoch, EpochTombstone().deleted_value(folder.deleted))
+        self.assertEqual(ConvertedFile.deleted_objects.get().pk, self.files[0].pk)
+        self.assertEqual(ConvertedFile.all_objects.filter(deleted_flag=True, deleted__isnull=False).count(), 1)
+
+        ConvertedFolder.deleted_objects.all().undelete()
+        folder = ConvertedFolder.objects.get(pk=self.folders[0].pk)
+        self.assertEqual((folder.deleted, folder.deleted_epoch), (DEFAULT_DELETED, 0))
+        self.assertEqual(ConvertedFile.all_objects.filter(deleted_flag=False, deleted__isnull=True).count(), 5)
+
+    def test_read_old(self):
+        # Not backfilled yet
+        ConvertedFolder.all_objects.update(deleted_epoch=123)
+        self.assertEqual(ConvertedFolder.objects.count(), 5)
+        self.assertEqual(get_tombstone(ConvertedFolder).field_names, ['deleted', 'deleted_epoch'])
+
+    def test_convert(self):
+        ConvertedFolder.objects.filter(pk__in=[self.folders[1].pk, self.folders[3].pk]).delete()
+        ConvertedFolder.all_objects.update(deleted_epoch=0)
+        ConvertedFile.all_objects.update(deleted=None)
+        callbacks = []
+        with self.assertNumQueries(18):
+            # Per chunk, 1 select for the keys, 2 for the transaction, 1 update for the live objects, 1 select for
+            # the deletion times and 1 update for the deleted objects (none in the last one), then 1 select for the keys
+            self.assertEqual(convert_tombstones(ConvertedFolder, batch_size=2,
+                                                batch_callback=lambda *args: callbacks.append(args)), 5)
+        self.assertEqual(callbacks, [(self.folders[1].pk, 2), (self.folders[3].pk, 4), (self.folders[4].pk, 5)])
+        new = DualWriteTombstone(SentinelTombstone(), EpochTombstone('deleted_epoch'), read_new=True)
+        self.assertEqual(
+            sorted(ConvertedFolder.all_objects.filter(new.live_q()).values_list('pk', flat=True)),
+            sorted(ConvertedFolder.objects.values_list('pk', flat=True))
+        )
+        deleted = ConvertedFolder.deleted_objects.values_list('deleted', 'deleted_epoch')
+        self.assertEqual([EpochTombstone().deleted_value(when) for when, _ in deleted], [epoch for _, epoch in deleted])
+
+        # Without the deletion time, the time of the conversion is used
+        self.assertEqual(convert_tombstones(ConvertedFile), 5)
+        self.assertEqual(ConvertedFile.all_objects.filter(deleted__isnull=False).count(), 2)
+
+    def test_convert_deletion_times(self):
+        for folder in self.folders[:3]:
+            folder.delete()
+        ConvertedFolder.all_objects.update(deleted_epoch=0)
+        with self.assertNumQueries(7):
+            # 1 select for the keys, 2 for the transaction, 1 update for the live objects, 1 select for the deletion
+            # times and 1 update for all of them, then 1 select for the keys
+            self.assertEqual(convert_tombstones(ConvertedFolder), 5)
+        deleted = ConvertedFolder.deleted_objects.values_list('deleted', 'deleted_epoch')
+        self.assertEqual(len(deleted), 3)
+        self.assertEqual([EpochTombstone().deleted_value(when) for when, _ in deleted], [epoch for _, epoch in deleted])
+
+    def test_convert_copy(self):
+        notes = [ConvertedNote.objects.create() for _ in range(4)]
+        for note in notes[:3]:
+            note.delete()
+        ConvertedNote.all_objects.update(deleted_at=None)
+        with self.assertNumQueries(6):
+            # Both fields store a datetime, the deleted objects are converted without looking at their deletion times
+            self.assertEqual(convert_tombstones(ConvertedNote), 4)
+        self.assertEqual(ConvertedNote.all_objects.filter(deleted_at__isnull=True).count(), 1)
+        for note in ConvertedNote.deleted_objects.all():
+            self.assertEqual(note.deleted_at, note.deleted)
+
+    def test_resume(self):
+        ConvertedFolder.all_objects.update(deleted_epoch=1)
+        self.assertEqual(convert_tombstones(ConvertedFolder, start_after=self.folders[2].pk), 2)
+        self.assertEqual(ConvertedFolder.all_objects.filter(deleted_epoch=1).count(), 3)
+
+    def test_command(self):
+        self.folders[0].delete()
+        ConvertedFolder.all_objects.update(deleted_epoch=0)
+        out = StringIO()
+        call_command('safedelete_convert_tombstones', 'safedelete.ConvertedFolder', batch_size=3, stdout=out)
+        self.assertIn('3 objects converted', out.getvalue())
+        self.assertIn('5 objects of safedelete.ConvertedFolder converted.', out.getvalue())
+        self.assertEqual(ConvertedFolder.all_objects.filter(deleted_epoch=0).count(), 4)
+        self.assertRaises(CommandError, call_command, 'safedelete_convert_tombstones', 'safedelete.NullFolder')
@@ -0,0 +1,74 @@
+from django.db import models
+from django.test import TestCase
+
+from ..config import SOFT_DELETE_CASCADE
+from ..models import SafeDeleteModel
+
+
+class Account(SafeDeleteModel):
+    _safedelete_policy = SOFT_DELETE_CASCADE
+
+
+class Project(SafeDeleteModel):
+    _safedelete_policy = SOFT_DELETE_CASCADE
+    account = models.ForeignKey(Account, on_delete=models.CASCADE)
+
+
+class Task(SafeDeleteModel):
+    project = models.ForeignKey(Project, on_delete=models.CASCADE)
+
+
+class UndeleteOperationTestCase(TestCase):
+
+    def setUp(self):
+        self.accounts = [Account.objects.create() for _ in range(2)]
+        self.projects = [Project.objects.create(account=account) for account in self.accounts for _ in range(2)]
+        self.tasks = [Task.objects.create(project=project) for project in self.projects for _ in range(2)]
+
+    def assertSameDeletionTime(self):
+        deletion_times = set()
+        for model in (Account, Project, Task):
+            deletion_times.update(model.deleted_objects.values_list('deleted', flat=True))
+        self.assertEqual(len(deletion_times), 1)
+
+    def test_instance_delete_shares_the_deletion_time(self):
+        self.accounts[0].delete()
+        self.assertEqual(Task.deleted_objects.count(), 4)
+        self.assertSameDeletionTime()
+
+    def test_queryset_delete_shares_the_deletion_time(self):
+        Account.objects.all().delete()
+        self.assertEqual(Task.deleted_objects.count(), 8)
+        self.assertSameDeletionTime()
+
+    def test_set_based_delete_shares_the_deletion_time(self):
+        Account.objects.all().delete(set_based=True)
+        self.assertEqual(Task.deleted_objects.count(), 8)
+        self.assertSameDeletionTime()
+
+    def test_batch_delete_shares_the_deletion_time(self):
+        Account.objects.all().delete(batch_size=1)
+        self.assertEqual(Task.deleted_objects.count(), 8)
+        self.assertSameDeletionTime()
+
+    def test_undelete_operation(self):
+        # Deleted before the account, it has to stay deleted
+        self.tasks[0].delete()
+        self.accounts[0].delete()
+        self.accounts[1].delete()
+        account = Account.deleted_objects.get(pk=self.accounts[0].pk)
+        with self.assertNumQueries(5):
+            # - 2 for the transaction (savepoint and release savepoint)
+            # - 1 update per model
+            result = Account.undelete_operation(account.deleted)
+        self.assertEqual(result, (6, {'safedelete.Account': 1, 'safedelete.Project': 2, 'safedelete.Task': 3}))
+        self.assertEqual(list(Account.objects.all()), [self.accounts[0]])
+        self.assertEqual(Project.objects.count(), 2)
+        self.assertEqual(sorted(Task.objects.values_list('pk', flat=True)), [task.pk for task in self.tasks[1:4]])
+
+    def test_undelete_operation_from_a_related_model(self):
+        self.accounts[0].delete()
+        project = Project.deleted_objects.get(pk=self.projects[0].pk)
+        result = Project.undelete_operation(project.deleted)
+        self.assertEqual(result, (6, {'safedelete.Project': 2, 'safedelete.Task': 4}))
+        self.assertEqual(Account.objects.count(), 1)
@@ -0,0 +1,422 @@
+"""
+How the ``deleted`` field of a model records that an object is deleted.
+
+By default the ``deleted`` field is a ``DateTimeField`` set to ``1970-01-01`` (``DEFAULT_DELETED``) for the objects
+that are not deleted. A model can use another encoding by overriding its ``deleted`` field:
+
+>>> class Article(SafeDeleteModel):
+...     deleted = NullTombstone().field()
+
+=============================  =========================================  ============================================
+Tombstone                      ``deleted`` field                          Not deleted
+=============================  =========================================  ============================================
+:class:`SentinelTombstone`     ``DateTimeField``                          ``deleted = '1970-01-01'``
+:class:`NullTombstone`         ``DateTimeField(null=True)``               ``deleted IS NULL``
+:class:`BooleanTombstone`      ``BooleanField``                           ``deleted = false``
+:class:`EpochTombstone`        ``IntegerField`` (seconds since epoch)     ``deleted = 0``
+=============================  =========================================  ============================================
+
+The tombstone is found from the type of the ``deleted`` field, or can be set explicitly with the
+``_safedelete_tombstone`` attribute of the model. The boolean flag is the most compact but does not record when the
+objects were deleted, and the epoch only records it to the second: two delete operations can share the same value, so
+:py:func:`safedelete.models.SafeDeleteModel.undelete_operation` cannot be used with either of them.
+
+An existing table can be converted to another encoding without downtime:
+
+1. Add a field with the new encoding next to the ``deleted`` field and make the model write both of them with a
+   :class:`DualWriteTombstone`:
+
+   >>> class Article(SafeDeleteModel):
+   ...     _safedelete_tombstone = DualWriteTombstone(SentinelTombstone(), NullTombstone('deleted_new'))
+   ...     deleted_new = NullTombstone().field()
+
+2. Backfill the new field with the ``safedelete_convert_tombstones`` management command (or
+   :func:`convert_tombstones`), it can be interrupted and resumed.
+3. Read the new field (``DualWriteTombstone(..., read_new=True)``) and check the application.
+4. Drop the old ``deleted`` field, rename the new one ``deleted`` and remove the ``DualWriteTombstone``.
+"""
+import calendar
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db import models, router, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from .config import DEFAULT_DELETED
+
+
+class Tombstone(object):
+    """
+    Base class of the tombstones.
+
+    The tombstones stored in a single field also define ``field()``, which returns a new ``deleted`` field for them
+    (:class:`DualWriteTombstone` does not, it writes the fields of two other tombstones).
+
+    :attribute live_value: the value of the ``deleted`` field of the objects that are not deleted.
+    :attribute records_time: whether the ``deleted`` field records when the objects were deleted.
+    :attribute identifies_operations: whether the value of the ``deleted`` field identifies the delete operation
+        (see :py:func:`safedelete.models.SafeDeleteModel.undelete_operation`).
+
+    Args:
+        field_name: The name of the field storing the tombstone. (default: {'deleted'})
+    """
+    live_value = None
+    records_time = True
+    identifies_operations = True
+
+    def __init__(self, field_name='deleted'):
+        self.field_name = field_name
+
+    @property
+    def field_names(self):
+        """
+        The names of the fields written by this tombstone.
+        """
+        return [self.field_name]
+
+    def live_q(self, prefix=''):
+        """
+        Return the ``Q`` selecting the objects that are not deleted (``prefix`` is prepended to the lookups to filter
+        through a relation, for example ``'membership__'``).
+        """
+        return Q(**{prefix + self.field_name: self.live_value})
+
+    def deleted_q(self, prefix=''):
+        """
+        Return the ``Q`` selecting the deleted objects.
+        """
+        return ~self.live_q(prefix)
+
+    def deleted_at_q(self, value):
+        """
+        Return the ``Q`` selecting the objects whose ``deleted`` field is `value`.
+        """
+        return Q(**{self.field_name: value})
+
+    def deleted_before_q(self, when):
+        """
+        Return the ``Q`` selecting the objects deleted before `when` (a datetime).
+        """
+        return self.deleted_q() & Q(**{self.field_name + '__lt': self.deleted_value(when)})
+
+    def deleted_value(self, when):
+        """
+        Return the value of the ``deleted`` field of the objects deleted at `when` (a datetime).
+        """
+        return when
+
+    def deletion_time(self, value):
+        """
+        Return the datetime a ``deleted`` field set to `value` records, ``None`` if it does not record it.
+        """
+        return value
+
+    def delete_kwargs(self, when):
+        """
+        Return the keyword arguments of ``QuerySet.update`` to delete the objects at `when`.
+        """
+        return {self.field_name: self.deleted_value(when)}
+
+    def undelete_kwargs(self):
+        """
+        Return the keyword arguments of ``QuerySet.update`` to undelete the objects.
+        """
+        return {self.field_name: self.live_value}
+
+    def set_deleted(self, obj, when):
+        """
+        Mark `obj` as deleted at `when`, without saving it.
+        """
+        for field_name, value in self.delete_kwargs(when).items():
+            setattr(obj, field_name, value)
+
+    def set_live(self, obj):
+        """
+        Mark `obj` as not deleted, without saving it.
+        """
+        for field_name, value in self.undelete_kwargs().items():
+            setattr(obj, field_name, value)
+
+    def is_deleted(self, obj):
+        return getattr(obj, self.field_name) != self.live_value
+
+    def __eq__(self, other):
+        return self.__class__ is other.__class__ and self.__dict__ == other.__dict__
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.__class__,) + tuple(sorted(self.__dict__.items())))
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.field_name)
+
+
+class SentinelTombstone(Tombstone):
+    """
+    The ``deleted`` field is set to ``1970-01-01`` for the objects that are not deleted (the default).
+    """
+    live_value = DEFAULT_DELETED
+
+    def field(self):
+        return models.DateTimeField(editable=False, default=DEFAULT_DELETED, db_index=True)
+
+
+class NullTombstone(Tombstone):
+    """
+    The ``deleted`` field is ``NULL`` for the objects that are not deleted.
+    """
+    live_value = None
+
+    def live_q(self, prefix=''):
+        return Q(**{prefix + self.field_name + '__isnull': True})
+
+    def deleted_q(self, prefix=''):
+        return Q(**{prefix + self.field_name + '__isnull': False})
+
+    def is_deleted(self, obj):
+        return getattr(obj, self.field_name) is not None
+
+    def field(self):
+        return models.DateTimeField(editable=False, null=True, blank=True, db_index=True)
+
+
+class BooleanTombstone(Tombstone):
+    """
+    The ``deleted`` field is a boolean flag.
+    """
+    live_value = False
+    records_time = False
+    identifies_operations = False
+
+    def deleted_value(self, when):
+        return True
+
+    def deletion_time(self, value):
+        return None
+
+    def deleted_q(self, prefix=''):
+        return Q(**{prefix + self.field_name: True})
+
+    def is_deleted(self, obj):
+        return bool(getattr(obj, self.field_name))
+
+    def field(self):
+        return models.BooleanField(editable=False, default=False, db_index=True)
+
+
+class EpochTombstone(Tombstone):
+    """
+    The ``deleted`` field is the number of seconds since the epoch when the objects were deleted, 0 for the objects
+    that are not deleted.
+
+    The delete operations done in the same second share the same value, so they cannot be told apart.
+    """
+    live_value = 0
+    identifies_operations = False
+
+    def deleted_value(self, when):
+        return calendar.timegm(when.utctimetuple())
+
+    def deletion_time(self, value):
+        when = datetime.utcfromtimestamp(value)
+        return timezone.make_aware(when, timezone.utc) if settings.USE_TZ else when
+
+    def field(self):
+        return models.IntegerField(editable=False, default=0, db_index=True)
+
+
+class DualWriteTombstone(Tombstone):
+    """
+    Write two tombstones, to convert a table from the encoding of `old` to the encoding of `new` while the
+    application is running (see :func:`convert_tombstones`).
+
+    The objects are deleted and undeleted in both fields, and the visibility is read from the field of `old`, or from
+    the field of `new` with ``read_new``.
+
+    Args:
+        old: The current tombstone of the model.
+        new: The tombstone to convert to, its field must have another name than the field of `old`.
+        read_new: Read the visibility from `new` (once it has been backfilled). (default: {False})
+    """
+
+    def __init__(self, old, new, read_new=False):
+        assert old.field_name != new.field_name, "The tombstones must be stored in different fields."
+        self.old = old
+        self.new = new
+        self.read_new = read_new
+
+    @property
+    def read(self):
+        return self.new if self.read_new else self.old
+
+    @property
+    def field_name(self):
+        return self.read.field_name
+
+    @property
+    def field_names(self):
+        return self.old.field_names + self.new.field_names
+
+    @property
+    def live_value(self):
+        return self.read.live_value
+
+    @property
+    def records_time(self):
+        return self.read.records_time
+
+    @property
+    def identifies_operations(self):
+        return self.read.identifies_operations
+
+    def live_q(self, prefix=''):
+        return self.read.live_q(prefix)
+
+    def deleted_q(self, prefix=''):
+        return self.read.deleted_q(prefix)
+
+    def deleted_at_q(self, value):
+        return self.read.deleted_at_q(value)
+
+    def deleted_before_q(self, when):
+        return self.read.deleted_before_q(when)
+
+    def deleted_value(self, when):
+        return self.read.deleted_value(when)
+
+    def deletion_time(self, value):
+        return self.read.deletion_time(value)
+
+    def delete_kwargs(self, when):
+        kwargs = self.old.delete_kwargs(when)
+        kwargs.update(self.new.delete_kwargs(when))
+        return kwargs
+
+    def undelete_kwargs(self):
+        kwargs = self.old.undelete_kwargs()
+        kwargs.update(self.new.undelete_kwargs())
+        return kwargs
+
+    def is_deleted(self, obj):
+        return self.read.is_deleted(obj)
+
+    def __repr__(self):
+        return 'DualWriteTombstone({!r}, {!r}, read_new={!r})'.format(self.old, self.new, self.read_new)
+
+
+SENTINEL = SentinelTombstone()
+
+_tombstones = {}  # {model: Tombstone}
+
+
+def get_tombstone_for_field(field):
+    """
+    Return the tombstone matching the type of a ``deleted`` field.
+    """
+    if isinstance(field, (models.BooleanField, models.NullBooleanField)):
+        return BooleanTombstone(field.name)
+    if isinstance(field, models.IntegerField):
+        return EpochTombstone(field.name)
+    if field.null:
+        return NullTombstone(field.name)
+    return SENTINEL if field.name == SENTINEL.field_name else SentinelTombstone(field.name)
+
+
+def get_tombstone(model):
+    """
+    Return the tombstone of `model`: its ``_safedelete_tombstone`` or the one matching its ``deleted`` field.
+    The result is memoized.
+    """
+    try:
+        return _tombstones[model]
+    except KeyError:
+        pass
+    tombstone = getattr(model, '_safedelete_tombstone', None)
+    if tombstone is None:
+        tombstone = get_tombstone_for_field(model._meta.get_field('deleted'))
+    _tombstones[model] = tombstone
+    return tombstone
+
+
+def _converted_values(model, old, new, batch_qs, conversion_time):
+    """
+    Return the keyword arguments of ``QuerySet.update`` writing the field of `new` of the deleted objects of
+    `batch_qs` from the field of `old`, so they are all converted with a single ``UPDATE``.
+    """
+    datetime_tombstones = (SentinelTombstone, NullTombstone)
+    if isinstance(old, datetime_tombstones) and isinstance(new, datetime_tombstones):
+        # Both fields store the deletion time as is, it is copied
+        return {new.field_name: F(old.field_name)}
+    if not new.records_time:
+        return new.delete_kwargs(conversion_time)
+    # The objects deleted by the same operation share the same deletion time, so there are few values
+    values = list(batch_qs.values_list(old.field_name, flat=True).distinct())
+    if len(values) == 0:
+        return {}
+    return {
+        new.field_name: Case(
+            *[When(old.deleted_at_q(value), then=Value(new.deleted_value(old.deletion_time(value) or conversion_time)))
+              for value in values],
+            output_field=model._meta.get_field(new.field_name)
+        )
+    }
+
+
+def convert_tombstones(model, batch_size=1000, sleep=0, start_after=None, using=None, batch_callback=None):
+    """
+    Backfill the new field of the :class:`DualWriteTombstone` of `model` from its old field.
+
+    The objects are converted by chunks of ``batch_size`` objects ordered by primary key, each chunk in its own
+    transaction, so the table is never locked for long. As the model writes both fields meanwhile, the application
+    can keep running.
+
+    The objects deleted with a tombstone which does not record the deletion time get the time of the conversion.
+    Each chunk is converted with two ``UPDATE``: one for the objects that are not deleted and one for the deleted ones
+    (copying the old field when both tombstones store a datetime, or mapping each deletion time otherwise).
+
+    Args:
+        model: The model to convert.
+        batch_size: The number of objects converted per transaction. (default: {1000})
+        sleep: The number of seconds to wait between two chunks, to throttle the conversion. (default: {0})
+        start_after: Only convert the objects with a primary key greater than this one. This allows to resume an
+            interrupted conversion. (default: {None})
+        using: The database to use. (default: {None})
+        batch_callback: Called after each chunk has been converted with the primary key of the last object of the
+            chunk and the number of objects converted so far. (default: {None})
+
+    Returns the number of converted objects.
+    """
+    tombstone = get_tombstone(model)
+    if not isinstance(tombstone, DualWriteTombstone):
+        raise ValueError("{} does not use a DualWriteTombstone.".format(model.__name__))
+    old, new = tombstone.old, tombstone.new
+    using = using or router.db_for_write(model)
+    queryset = model._base_manager.using(using)
+    conversion_time = timezone.now()
+    nb_objects = 0
+    last_pk = start_after
+    while True:
+        remaining_qs = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        pks = list(remaining_qs.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if len(pks) == 0:
+            break
+        with transaction.atomic(using=using):
+            # Filter on the keys range, this is cheaper than a long `IN` and the objects created since then are
+            # already written in both fields
+            batch_qs = queryset.filter(pk__gte=pks[0], pk__lte=pks[-1])
+            batch_qs.filter(old.live_q()).update(**new.undelete_kwargs())
+            deleted_qs = batch_qs.filter(old.deleted_q())
+            converted_values = _converted_values(model, old, new, deleted_qs, conversion_time)
+            if converted_values:
+                deleted_qs.update(**converted_values)
+        nb_objects += len(pks)
+        last_pk = pks[-1]
+        if batch_callback is not None:
+            batch_callback(last_pk, nb_objects)
+        if sleep:
+            time.sleep(sleep)
+    return nb_objects
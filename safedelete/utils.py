@@ -4,22 +4,19 @@ import warnings
 
 from collections import OrderedDict
 
-from .collector import get_collector
-from .config import DEFAULT_DELETED
-
-logger = logging.getLogger(__name__)
+from django.db import connections, router, transaction
+from django.db.models import Q, sql
+from django.db.models.deletion import CASCADE, PROTECT, ProtectedError
 
+from .archive import archive_objects, get_archived_pks, is_archived, restore_objects
+from .collector import get_cascade_plan, get_collector
+from .compat import QUERY_HAS_CHAIN
+from .registry import is_safedelete_cls
+from .dispatch import collect_signals, send_post_softdelete, send_post_undelete
+from .signals import post_bulk_softdelete, post_bulk_undelete, pre_bulk_softdelete
+from .tombstones import get_tombstone
 
-def is_safedelete_cls(cls):
-    for base in cls.__bases__:
-        # This used to check if it startswith 'safedelete', but that masks
-        # the issue inside of a test. Other clients create models that are
-        # outside of the safedelete package.
-        if base.__module__.startswith('safedelete.models'):
-            return True
-        if is_safedelete_cls(base):
-            return True
-    return False
+logger = logging.getLogger(__name__)
 
 
 def is_safedelete(related):
@@ -30,28 +27,44 @@ def is_safedelete(related):
 
 
 def is_deleted(obj):
-    return obj.deleted != DEFAULT_DELETED
+    return get_tombstone(obj.__class__).is_deleted(obj)
 
 
-def get_objects_to_delete(objs, return_deleted=False):
+def operation_atomic(using, nested=False):
     """
-    Return a dictionary of objects that meed to be deleted if we want to delete the objects provided as input.
+    Return the atomic block of a delete or an undelete on `using`.
 
-    We exclude the input objects from this dictionary (we make the assumption that all objects provided as input are
-    of the same type).
+    The deletes and undeletes that safedelete does itself inside another one on the same database (`nested`, for
+    example for its cascade) are already in its atomic block: they join it instead of each creating a savepoint, which
+    costs a ``SAVEPOINT`` and a ``RELEASE SAVEPOINT`` query per object. If one of them fails, the whole operation is
+    rolled back. The ones done by custom code (for example by a signal receiver) get their own savepoint, so they can
+    fail without breaking the current operation.
+    """
+    return transaction.atomic(using=using, savepoint=not nested)
 
-    If return_deleted is set to False it will exclude the already deleted objects.
 
-    Note that the fast deletes are not returned as a dict because you can have multiple entries for the same model.
+def get_related_changes(objs, return_deleted=False, pks_only=False):
     """
-    collector = get_collector(objs)
+    Collect, in a single pass, everything that deleting the objects provided as input implies.
+
+    Return a tuple with:
+    - the fast deletes and the objects that need to be deleted (see :func:`get_objects_to_delete`)
+    - the updates that need to be done (see :func:`perform_updates`) as a list of `(model, field, value, pks)`
+
+    If pks_only is set, only the keys of the related objects are loaded and the objects that need to be deleted are
+    returned as lists of primary keys instead of lists of instances.
+    """
+    if not get_cascade_plan(objs[0].__class__).needs_collector:
+        # Nothing is related to those objects, no need to collect anything
+        return [], OrderedDict(), []
+    collector = get_collector(objs, skip_deleted=not return_deleted, only_keys=pks_only)
     fast_deletes = []
     for fast_delete_qs in collector.fast_deletes:
         model = fast_delete_qs.model
         if model is objs[0].__class__:
             fast_delete_qs = fast_delete_qs.exclude(pk__in=[o.pk for o in objs])
         if is_safedelete_cls(model) and not return_deleted:
-            fast_delete_qs = fast_delete_qs.filter(deleted=DEFAULT_DELETED)
+            fast_delete_qs = fast_delete_qs.filter(get_tombstone(model).live_q())
         fast_deletes.append(fast_delete_qs)
     objects_to_delete = OrderedDict()
     for model in collector.data:
@@ -64,37 +77,469 @@ def get_objects_to_delete(objs, return_deleted=False):
         if is_safedelete_cls(model) and not return_deleted:
             instances = [instance for instance in instances if not is_deleted(instance)]
         if len(instances) != 0:
-            objects_to_delete[model] = instances
-    return fast_deletes, objects_to_delete
-
-
-def perform_updates(objs):
-    """
-    After the deletes have been done we need to perform the updates if there are any.
-    Note that we don't need to do the updates for the already deleted objects.
-    """
-    collector = get_collector(objs)
+            objects_to_delete[model] = [instance.pk for instance in instances] if pks_only else instances
+    field_updates = []
     for model, updates in collector.field_updates.items():
         for (field, value), objects in updates.items():
+            # Note that we don't need to do the updates for the already deleted objects.
             if is_safedelete_cls(model):
                 pks = [o.pk for o in objects if not is_deleted(o)]
             else:
                 pks = [o.pk for o in objects]
             if len(pks) != 0:
-                logger.info("  > cascade update {} {} ({}={})".format(len(objects), model.__name__, field.name, value))
-                logger.debug("       {}".format([o.pk for o in objects]))
-            # bulk update the field (this means that we dont)
-            model.objects.filter(pk__in=[o.pk for o in objects]).update(**{field.name: value})
+                field_updates.append((model, field, value, pks))
+    return fast_deletes, objects_to_delete, field_updates
+
+
+def get_objects_to_delete(objs, return_deleted=False):
+    """
+    Return a dictionary of objects that meed to be deleted if we want to delete the objects provided as input.
+
+    We exclude the input objects from this dictionary (we make the assumption that all objects provided as input are
+    of the same type).
+
+    If return_deleted is set to False it will exclude the already deleted objects.
+
+    Note that the fast deletes are not returned as a dict because you can have multiple entries for the same model.
+    """
+    fast_deletes, objects_to_delete, _ = get_related_changes(objs, return_deleted=return_deleted)
+    return fast_deletes, objects_to_delete
+
+
+def perform_updates(objs, field_updates=None):
+    """
+    After the deletes have been done we need to perform the updates if there are any.
+    Note that we don't need to do the updates for the already deleted objects, including the ones that have just been
+    deleted by cascade.
+
+    `field_updates` is the list returned by :func:`get_related_changes`, if it is not provided the objects are
+    collected again.
+    """
+    if field_updates is None:
+        if not get_cascade_plan(objs[0].__class__).has_field_updates:
+            return
+        _, _, field_updates = get_related_changes(objs)
+    for model, field, value, pks in field_updates:
+        logger.info("  > cascade update {} {} ({}={})".format(len(pks), model.__name__, field.name, value))
+        logger.debug("       {}".format(pks))
+        # bulk update the field (this means that we don't call the save of each object)
+        related_objects_qs = model._base_manager.filter(pk__in=pks)
+        if is_safedelete_cls(model):
+            related_objects_qs = related_objects_qs.filter(get_tombstone(model).live_q())
+        related_objects_qs.update(**{field.name: value})
+
+
+class FieldUpdateRecorder(object):
+    """
+    Minimal stand-in for Django's `Collector` used to find out which value an `on_delete` handler (`SET_NULL`,
+    `SET_DEFAULT`, `SET(...)`) would write, without collecting anything.
+    """
+
+    def __init__(self):
+        self.field_updates = []
+
+    def add_field_update(self, field, value, objs):
+        self.field_updates.append((field, value))
+
+
+def get_related_scope(related, scope, using):
+    """
+    Return a queryset (that is not evaluated) of the objects related to the objects of `scope` through `related`.
+    `scope` is a queryset or a list of primary keys.
+    """
+    return related.related_model._base_manager.using(using).filter(**{"%s__in" % related.field.name: scope})
+
+
+def supports_update_returning(connection):
+    """
+    Return whether the database of `connection` supports `UPDATE ... RETURNING` (PostgreSQL and SQLite 3.35+).
+    """
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35, 0)
+    return False
+
+
+def update_returning_pks(queryset, **values):
+    """
+    Update the objects of `queryset` with `values` and return the primary keys of the updated objects.
+
+    This is a single `UPDATE ... RETURNING` when the database supports it. Otherwise the primary keys are selected
+    first (locked with `SELECT ... FOR UPDATE` where the database supports it) and the objects are updated by primary
+    key, so the primary keys are still exactly the updated ones.
+    """
+    queryset._for_write = True
+    using = queryset.db
+    connection = connections[using]
+    if QUERY_HAS_CHAIN:
+        query = queryset.query.chain(sql.UpdateQuery)
+    else:
+        query = queryset.query.clone(klass=sql.UpdateQuery)
+    query.add_update_values(values)
+    # Like QuerySet.update, the annotations must not be in the subqueries
+    query._annotations = None
+    if not supports_update_returning(connection) or query.related_updates:
+        # The fields of the parents of a multi-table inheritance are updated by other queries
+        with transaction.atomic(using=using):
+            pks = list(queryset.select_for_update().values_list('pk', flat=True))
+            if pks:
+                queryset.model._base_manager.using(using).filter(pk__in=pks).update(**values)
+        return pks
+    compiler = query.get_compiler(using)
+    compiler.pre_sql_setup()
+    update_sql, params = compiler.as_sql()
+    if not update_sql:
+        return []
+    pk_field = queryset.model._meta.pk
+    with transaction.atomic(using=using, savepoint=False), connection.cursor() as cursor:
+        cursor.execute('{} RETURNING {}'.format(update_sql, connection.ops.quote_name(pk_field.column)), params)
+        return [pk_field.to_python(row[0]) for row in cursor.fetchall()]
+
+
+def soft_delete_scope(scope, deleted, return_pks=False):
+    """
+    Soft-delete the objects of `scope` with a single `UPDATE`, or move them to the archive table of an archived model
+    (see :mod:`safedelete.archive`).
+
+    The `pre_bulk_softdelete` signal is sent with `scope` (that is not evaluated) and the `post_bulk_softdelete` signal
+    with the primary keys of the deleted objects. The primary keys are only loaded if something listens to it, with
+    the `UPDATE ... RETURNING` where the database supports it.
+
+    Return the number of deleted objects, or their primary keys with `return_pks`.
+    """
+    model = scope.model
+    if is_archived(model):
+        pks = list(scope.values_list('pk', flat=True))
+        nb_objects = archive_objects(model, pks, deleted, scope.db)[0]
+        return pks if return_pks else nb_objects
+    using = scope.db
+    if pre_bulk_softdelete.has_listeners(model):
+        pre_bulk_softdelete.send(sender=model, queryset=scope.all(), using=using)
+    if not return_pks and not post_bulk_softdelete.has_listeners(model):
+        return scope.update(**get_tombstone(model).delete_kwargs(deleted))
+    pks = update_returning_pks(scope, **get_tombstone(model).delete_kwargs(deleted))
+    if pks:
+        send_post_softdelete(model, using, pks=pks)
+    return pks if return_pks else len(pks)
+
+
+def materialize_scope(model, scope, seen=None):
+    """
+    Fetch the primary keys of the objects in `scope` and return a queryset filtering on them.
+    This is needed when `scope` is built on the table we want to update (some databases do not allow it) or when the
+    relation graph loops on itself. Only the primary keys are loaded.
+    If `seen` is given, the primary keys already in it are excluded and the new ones are added to it.
+    """
+    pks = set(scope.values_list('pk', flat=True))
+    if seen is not None:
+        pks -= seen
+        seen |= pks
+    return model._base_manager.using(scope.db).filter(pk__in=pks), len(pks)
+
+
+def _cascade_soft_delete_in_sql(model, scope, path, deleted, using, seen, delete_returns, field_updates):
+    """
+    Walk the relations of `model` and soft-delete the related objects of `scope` (see
+    :func:`soft_delete_cascade_in_sql`).
+    `path` is the tuple of models `scope` is built on.
+    """
+    for edge in get_cascade_plan(model).edges:
+        related, related_model, on_delete = edge.related, edge.model, edge.on_delete
+        if related.field.remote_field.parent_link:
+            continue
+        related_scope = get_related_scope(related, scope, using)
+        related_path = path + (related_model,)
+        if related_model in path:
+            # The subquery would be built on the table we update, we need to load the primary keys instead
+            related_scope, nb_related = materialize_scope(
+                related_model, related_scope, seen.setdefault(related_model, set()) if on_delete == CASCADE else None)
+            if nb_related == 0:
+                continue
+            related_path = (related_model,)
+        live_scope = related_scope
+        if edge.is_safedelete:
+            live_scope = related_scope.filter(get_tombstone(related_model).live_q())
+        if on_delete == CASCADE and edge.is_safedelete and is_archived(related_model):
+            # The rows leave the table: the walk carries on with their primary keys, and they are archived once the
+            # objects related to them are found
+            related_pks = list(live_scope.values_list('pk', flat=True))
+            if len(related_pks) == 0:
+                continue
+            _cascade_soft_delete_in_sql(
+                related_model, related_pks, (related_model,), deleted, using, seen, delete_returns, field_updates)
+            nb_objects = archive_objects(related_model, related_pks, deleted, using)[0]
+            if nb_objects:
+                logger.info("  > cascade archive {} {}".format(nb_objects, related_model.__name__))
+                delete_returns.append((nb_objects, {related_model._meta.label: nb_objects}))
+        elif on_delete == CASCADE:
+            if edge.is_safedelete:
+                nb_objects = soft_delete_scope(live_scope, deleted)
+                if nb_objects:
+                    logger.info("  > cascade delete {} {}".format(nb_objects, related_model.__name__))
+                    delete_returns.append((nb_objects, {related_model._meta.label: nb_objects}))
+            # We carry on the walk even if it is not a safedelete model (we don't delete it, that means that we can
+            # leave some dangling objects) as its related objects would have been deleted by a hard delete
+            _cascade_soft_delete_in_sql(
+                related_model, related_scope, related_path, deleted, using, seen, delete_returns, field_updates)
+        elif on_delete == PROTECT:
+            if live_scope.exists():
+                raise ProtectedError(
+                    "Cannot delete some instances of model '{}' because they are referenced through a protected "
+                    "foreign key: '{}.{}'".format(model.__name__, related_model.__name__, related.field.name),
+                    live_scope
+                )
+        else:
+            recorder = FieldUpdateRecorder()
+            on_delete(recorder, related.field, related_scope, using)
+            for field, value in recorder.field_updates:
+                field_updates.append((live_scope, field, value))
+
+
+def soft_delete_cascade_in_sql(queryset, deleted, return_pks=False):
+    """
+    Soft-delete the objects of `queryset` and cascade the soft-delete to their related objects without loading any of
+    them in memory.
+
+    The relation graph is walked from the queryset model and each relation that needs to be cascaded results in a
+    single `UPDATE related SET deleted=... WHERE fk IN (SELECT ... FROM parent WHERE ...)`, the subqueries being chained
+    along the graph. The updates implied by the delete (for example in case of a relation `on_delete=models.SET_NULL`)
+    are done the same way, and the objects of `queryset` are soft-deleted last since all the subqueries depend on them.
+
+    Self-referencing relations cannot be expressed as a finite chain of subqueries: for those only the primary keys are
+    loaded, level by level, until no new related object is found.
+
+    As with the other cascades we don't do anything on the related objects that are not safedelete models.
+
+    Return the same value as a delete: the total number of objects deleted and a dict with the number of objects
+    deleted per model, followed by the primary keys of the deleted objects of `queryset` with `return_pks`.
+    """
+    model = queryset.model
+    using = queryset.db
+    delete_returns = []
+    field_updates = []
+    scope = queryset
+    if is_archived(model):
+        # The rows leave the table, the subqueries cannot be built on it
+        scope = list(queryset.values_list('pk', flat=True))
+    _cascade_soft_delete_in_sql(model, scope, (model,), deleted, using, {}, delete_returns, field_updates)
+    for live_scope, field, value in field_updates:
+        nb_objects = live_scope.update(**{field.name: value})
+        if nb_objects:
+            logger.info("  > cascade update {} {} ({}={})".format(
+                nb_objects, live_scope.model.__name__, field.name, value))
+    pks = None
+    if is_archived(model):
+        nb_objects = archive_objects(model, scope, deleted, using)[0]
+        pks = scope
+    elif return_pks:
+        pks = soft_delete_scope(queryset, deleted, return_pks=True)
+        nb_objects = len(pks)
+    else:
+        nb_objects = soft_delete_scope(queryset, deleted)
+    if nb_objects:
+        delete_returns.insert(0, (nb_objects, {model._meta.label: nb_objects}))
+    else:
+        delete_returns = []
+    if return_pks:
+        return concatenate_delete_returns(*delete_returns) + (pks,)
+    return concatenate_delete_returns(*delete_returns)
+
+
+def undelete_scope(scope):
+    """
+    Undelete the objects of `scope` (that must only contain deleted objects) with a single `UPDATE` and send the
+    `post_bulk_undelete` signal.
+    The primary keys are only loaded if something listens to the signal.
+
+    Return the same value as :func:`soft_delete_cascade_in_sql`.
+    """
+    model = scope.model
+    if post_bulk_undelete.has_listeners(model):
+        pks = list(scope.values_list('pk', flat=True))
+        if len(pks) == 0:
+            return (0, {})
+        nb_objects = model._base_manager.using(scope.db).filter(pk__in=pks).update(
+            **get_tombstone(model).undelete_kwargs())
+        send_post_undelete(model, scope.db, pks=pks)
+    else:
+        nb_objects = scope.update(**get_tombstone(model).undelete_kwargs())
+    if nb_objects == 0:
+        return (0, {})
+    return (nb_objects, {model._meta.label: nb_objects})
+
+
+def _cascade_undelete_in_sql(model, scope, path, using, seen, undelete_returns):
+    """
+    Walk the cascade relations of `model` and undelete the related objects of `scope` (see
+    :func:`undelete_related_in_sql`).
+    `path` is the tuple of models `scope` is built on.
+    """
+    for edge in get_cascade_plan(model).cascade_edges:
+        related, related_model = edge.related, edge.model
+        if related.field.remote_field.parent_link:
+            continue
+        related_scope = get_related_scope(related, scope, using)
+        related_path = path + (related_model,)
+        if related_model in path:
+            # The subquery would be built on the table we update, we need to load the primary keys instead
+            related_scope, nb_related = materialize_scope(
+                related_model, related_scope, seen.setdefault(related_model, set()))
+            if nb_related == 0:
+                continue
+            related_path = (related_model,)
+        if edge.is_safedelete and is_archived(related_model):
+            # The archived objects are moved back to the table, where the walk finds them
+            keys = scope
+            if not isinstance(scope, list):
+                keys = list(scope.values_list(related.field.target_field.attname, flat=True))
+            undelete_return = restore_objects(
+                related_model, get_archived_pks(related_model, using, **{related.field.attname + '__in': keys}), using)
+            if undelete_return[0]:
+                logger.info("  > cascade restore {} {}".format(undelete_return[0], related_model.__name__))
+                undelete_returns.append(undelete_return)
+        elif edge.is_safedelete:
+            undelete_return = undelete_scope(related_scope.filter(get_tombstone(related_model).deleted_q()))
+            if undelete_return[0]:
+                logger.info("  > cascade undelete {} {}".format(undelete_return[0], related_model.__name__))
+                undelete_returns.append(undelete_return)
+        # Like the delete, we carry on the walk through the models that are not safedelete models
+        _cascade_undelete_in_sql(related_model, related_scope, related_path, using, seen, undelete_returns)
+
+
+def undelete_related_in_sql(queryset):
+    """
+    Undelete the objects related by cascade to the objects of `queryset` without loading any of them in memory (the
+    objects of `queryset` themselves are not undeleted).
+
+    This is the reverse of :func:`soft_delete_cascade_in_sql`: each relation that cascades results in a single
+    `UPDATE related SET deleted='1970-01-01' WHERE deleted != '1970-01-01' AND fk IN (SELECT ...)`. The scopes do
+    not depend on the `deleted` field of the related objects, but they are built on `queryset`: if it only selects
+    deleted objects, they have to be undeleted after calling this.
+
+    Like the other cascade undeletes, all the deleted objects related by cascade are undeleted, even the ones that
+    were deleted before the objects of `queryset`.
+
+    Return the same value as a delete: the total number of objects undeleted and a dict with the number of objects
+    undeleted per model.
+    """
+    model = queryset.model
+    undelete_returns = []
+    _cascade_undelete_in_sql(model, queryset, (model,), queryset.db, {}, undelete_returns)
+    return concatenate_delete_returns(*undelete_returns)
+
+
+def undelete_operation(model, deleted, using):
+    """
+    Undelete the objects of `model` and of the models it cascades to that were deleted at `deleted` (see
+    :py:func:`safedelete.models.SafeDeleteModel.undelete_operation`).
+
+    `deleted` is the value of the `deleted` field, so all the models must use the same tombstone (see
+    :mod:`safedelete.tombstones`) and it must identify the delete operations.
+    """
+    tombstone = get_tombstone(model)
+    cascade_models = [
+        cascade_model for cascade_model in get_cascade_plan(model).cascade_models if is_safedelete_cls(cascade_model)
+    ]
+    for cascade_model in cascade_models:
+        if not get_tombstone(cascade_model).identifies_operations or get_tombstone(cascade_model) != tombstone:
+            raise ValueError(
+                "Cannot undelete the objects deleted with {} by their deletion time: {} does not record it the same "
+                "way.".format(model.__name__, cascade_model.__name__)
+            )
+    undelete_returns = []
+    with operation_atomic(using), collect_signals(using):
+        for cascade_model in cascade_models:
+            if is_archived(cascade_model):
+                undelete_returns.append(restore_objects(
+                    cascade_model, get_archived_pks(cascade_model, using, tombstone.deleted_at_q(deleted)), using))
+            else:
+                undelete_returns.append(
+                    undelete_scope(cascade_model._base_manager.using(using).filter(tombstone.deleted_at_q(deleted)))
+                )
+    return concatenate_delete_returns(*undelete_returns)
+
+
+def _kept_q(model, purge_time):
+    """
+    Return the ``Q`` selecting the objects of `model` the purge at `purge_time` keeps: the objects that are not deleted
+    and the ones deleted for less than the retention of `model`. Return None if it keeps all of them (the model has no
+    retention or does not record the deletion time).
+    """
+    tombstone = get_tombstone(model)
+    retention = getattr(model, '_safedelete_retention', None)
+    if retention is None or not tombstone.records_time:
+        return None
+    return ~tombstone.deleted_before_q(purge_time - retention)
+
+
+def _dependent_scopes(model, using, path=(), purge_time=None):
+    """
+    Yield, for each relation cascading from `model`, the relation and a queryset (that is not evaluated) of the related
+    objects a hard delete would delete and that are not deleted yet: the objects that are not deleted and the deleted
+    ones that have such objects themselves (through their own relations).
+    `path` is the tuple of the relations followed to get to `model`: when the relations loop, all the related objects
+    are taken (deleted or not) instead of following the loop again.
+
+    With `purge_time`, the related objects that the purge at that time must not hard delete are taken: the deleted
+    objects are taken too unless their own retention has expired, and so are all the objects related through a
+    ``PROTECT`` relation, deleted or not. The links of the many to many relations are not taken, they are deleted with
+    the objects.
+    """
+    for edge in get_cascade_plan(model).edges:
+        if edge.on_delete == PROTECT and purge_time is not None:
+            yield edge, edge.model._base_manager.using(using)
+            continue
+        if edge.on_delete != CASCADE or (purge_time is not None and edge.model._meta.auto_created):
+            continue
+        related_scope = edge.model._base_manager.using(using)
+        if edge.is_safedelete and edge not in path:
+            if purge_time is None:
+                dependents_q = get_tombstone(edge.model).live_q()
+            else:
+                dependents_q = _kept_q(edge.model, purge_time)
+            if dependents_q is not None:
+                related_dependents_q = get_dependents_q(edge.model, using, path + (edge,), purge_time=purge_time)
+                if related_dependents_q is not None:
+                    dependents_q |= related_dependents_q
+                related_scope = related_scope.filter(dependents_q)
+        yield edge, related_scope
+
+
+def get_dependents_q(model, using, path=(), purge_time=None):
+    """
+    Return the ``Q`` selecting the objects of `model` that a hard delete would delete other objects with (objects that
+    are not deleted yet), or None if nothing cascades from `model`. It is made of one subquery per relation.
+
+    With `purge_time`, it selects the objects the purge at that time must keep for their dependents (see
+    :func:`_dependent_scopes`).
+    """
+    dependents_q = None
+    for edge, related_scope in _dependent_scopes(model, using, path, purge_time=purge_time):
+        # Without the NULL keys, so the Q can be negated (`NOT IN` is never true if the subquery has a NULL)
+        related_keys = related_scope.filter(**{edge.field.attname + '__isnull': False}).values(edge.field.attname)
+        edge_q = Q(**{'{}__in'.format(edge.field.target_field.attname): related_keys})
+        dependents_q = edge_q if dependents_q is None else dependents_q | edge_q
+    return dependents_q
 
 
 def can_hard_delete(obj):
     """
     Check if it would delete other objects.
+
+    Each relation cascading from the model of `obj` is checked with an ``EXISTS`` query, stopping at the first one
+    with a related object. The parents of multi-table inheritance and the generic relations are not relations of the
+    cascade plans, the models that have some are checked by collecting the related objects.
     """
-    fast_deletes, objects_to_delete = get_objects_to_delete([obj])
-    nb_objects_deleted = sum([fast_delete_qs.count() for fast_delete_qs in fast_deletes])
-    nb_objects_deleted += sum([len(instances) for instances in objects_to_delete.values()])
-    return nb_objects_deleted == 0
+    model = obj.__class__
+    if get_cascade_plan(model).has_implicit_relations:
+        fast_deletes, objects_to_delete, _ = get_related_changes([obj], pks_only=True)
+        return not any(fast_delete_qs.exists() for fast_delete_qs in fast_deletes) and not objects_to_delete
+    using = router.db_for_write(model, instance=obj)
+    for edge, related_scope in _dependent_scopes(model, using):
+        if related_scope.filter(**{edge.field.attname: getattr(obj, edge.field.target_field.attname)}).exists():
+            return False
+    return True
 
 
 def concatenate_delete_returns(*args):